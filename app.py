@@ -24,6 +24,10 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "traffic_management_secret")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+# Pool worker processes (regions, model training, batch runs) re-import the app but only compute:
+# in worker mode no init function starts jobs or threads, touches the model registry or creates data
+app.config["WORKER_PROCESS"] = os.environ.get("TRAFFIC_WORKER_PROCESS") == "1"
+
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///traffic_management.db")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
@@ -32,31 +36,105 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Configure the write-behind TrafficData ingest pipeline
+app.config["INGEST_FLUSH_SIZE"] = int(os.environ.get("INGEST_FLUSH_SIZE", 1000))
+app.config["INGEST_FLUSH_INTERVAL"] = float(os.environ.get("INGEST_FLUSH_INTERVAL", 1.0))
+app.config["INGEST_QUEUE_SIZE"] = int(os.environ.get("INGEST_QUEUE_SIZE", 50000))
+app.config["INGEST_PUT_TIMEOUT"] = float(os.environ.get("INGEST_PUT_TIMEOUT", 0.5))
+app.config["INGEST_FLUSH_RETRIES"] = int(os.environ.get("INGEST_FLUSH_RETRIES", 3))
+app.config["INGEST_RETRY_BACKOFF"] = float(os.environ.get("INGEST_RETRY_BACKOFF", 0.5))
+
+# Configure the server-side signal control loop (seconds between passes; 0 disables it)
+app.config["SIGNAL_CONTROL_INTERVAL"] = float(os.environ.get("SIGNAL_CONTROL_INTERVAL", 5))
+# Re-evaluate an intersection when an approach's priority score moves by more than this,
+# and at least every SIGNAL_CONTROL_MAX_IDLE simulated seconds
+app.config["SIGNAL_CONTROL_PRIORITY_DELTA"] = float(os.environ.get("SIGNAL_CONTROL_PRIORITY_DELTA", 0.05))
+app.config["SIGNAL_CONTROL_MAX_IDLE"] = float(os.environ.get("SIGNAL_CONTROL_MAX_IDLE", 60))
+
+# Configure region-parallel control and simulation (0 workers runs everything in-process).
+# Regions default to one per worker; CONTROL_REGION_FILE maps intersection ids to explicit regions
+app.config["CONTROL_WORKERS"] = int(os.environ.get("CONTROL_WORKERS", 0))
+app.config["CONTROL_REGIONS"] = int(os.environ.get("CONTROL_REGIONS", 0))
+app.config["CONTROL_REGION_FILE"] = os.environ.get("CONTROL_REGION_FILE")
+
+# Budget for one simulation tick in seconds, and how to shed work when the seconds due do not fit:
+# any of skip_emit, coalesce_writes and lower_resolution. Up to SIMULATION_MAX_BACKLOG simulated
+# seconds are caught up after slow ticks
+app.config["SIMULATION_TICK_BUDGET"] = float(os.environ.get("SIMULATION_TICK_BUDGET", 0.8))
+app.config["SIMULATION_DEGRADE"] = [mode for mode in os.environ.get(
+    "SIMULATION_DEGRADE", "skip_emit,coalesce_writes,lower_resolution").split(",") if mode]
+app.config["SIMULATION_MAX_BACKLOG"] = int(os.environ.get("SIMULATION_MAX_BACKLOG", 60))
+
+# Periodic model training: "incremental" appends trees fitted on rows added since the last
+# served model version (keeping the newest ML_MAX_TREES), "full" refits on the last 24 hours; 0 minutes disables it
+app.config["ML_TRAINING_MODE"] = os.environ.get("ML_TRAINING_MODE", "incremental")
+app.config["ML_TRAINING_INTERVAL"] = float(os.environ.get("ML_TRAINING_INTERVAL", 15))
+app.config["ML_TREES_PER_UPDATE"] = int(os.environ.get("ML_TREES_PER_UPDATE", 10))
+app.config["ML_MAX_TREES"] = int(os.environ.get("ML_MAX_TREES", 50))
+app.config["ML_INCREMENTAL_MIN_ROWS"] = int(os.environ.get("ML_INCREMENTAL_MIN_ROWS", 100))
+app.config["ML_INCREMENTAL_MAX_ROWS"] = int(os.environ.get("ML_INCREMENTAL_MAX_ROWS", 200000))
+# Models are fitted in a separate worker process (ML_TRAINING_PROCESS=0 fits in the scheduler thread)
+# and published as versions under ML_REGISTRY_DIR, of which the newest ML_REGISTRY_KEEP are kept for rollback
+app.config["ML_TRAINING_PROCESS"] = os.environ.get("ML_TRAINING_PROCESS", "1") == "1"
+app.config["ML_REGISTRY_DIR"] = os.environ.get("ML_REGISTRY_DIR", "model_registry")
+app.config["ML_REGISTRY_KEEP"] = int(os.environ.get("ML_REGISTRY_KEEP", 20))
+
+# Cache prediction results per (intersection, window, model version, newest reading)
+app.config["PREDICTION_CACHE_SIZE"] = int(os.environ.get("PREDICTION_CACHE_SIZE", 10000))
+app.config["PREDICTION_CACHE_TTL"] = float(os.environ.get("PREDICTION_CACHE_TTL", 60))
+
+# Expose Prometheus-format metrics at /metrics (set METRICS_ENABLED=0 to turn off instrumentation)
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Configure retention and the cold-storage archive
+app.config["RETENTION_RAW_DAYS"] = float(os.environ.get("RETENTION_RAW_DAYS", 7))
+app.config["RETENTION_PREDICTION_DAYS"] = float(os.environ.get("RETENTION_PREDICTION_DAYS", 7))
+app.config["RETENTION_ROLLUP_MINUTE_DAYS"] = float(os.environ.get("RETENTION_ROLLUP_MINUTE_DAYS", 30))
+app.config["RETENTION_ROLLUP_QUARTER_HOUR_DAYS"] = float(os.environ.get("RETENTION_ROLLUP_QUARTER_HOUR_DAYS", 180))
+app.config["RETENTION_ARCHIVE_DIR"] = os.environ.get("RETENTION_ARCHIVE_DIR", "archive")
+app.config["RETENTION_BATCH_SIZE"] = int(os.environ.get("RETENTION_BATCH_SIZE", 5000))
+app.config["RETENTION_BATCH_PAUSE"] = float(os.environ.get("RETENTION_BATCH_PAUSE", 0.05))
+app.config["RETENTION_INTERVAL_HOURS"] = float(os.environ.get("RETENTION_INTERVAL_HOURS", 24))
+
 # Initialize the app with extensions
 db.init_app(app)
 socketio.init_app(app, cors_allowed_origins="*")
 
-# Start the scheduler
-scheduler.start()
+# Instrument requests, socket emits and scheduler jobs before any component registers them
+from metrics import init_metrics
+init_metrics(app, socketio, scheduler)
+
+# Start the scheduler (command-line tools set SCHEDULER_AUTOSTART=0 to skip background jobs)
+if os.environ.get("SCHEDULER_AUTOSTART", "1") == "1" and not app.config["WORKER_PROCESS"]:
+    scheduler.start()
 
 # Initialize database
 with app.app_context():
     # Import models to create tables
     import models  # noqa: F401
-    db.create_all()
-    logger.info("Database tables created")
+    if not app.config["WORKER_PROCESS"]:
+        db.create_all()
+        logger.info("Database tables created")
 
-# Import and initialize simulation, ML models, and signal control
+# Import and initialize ingest, simulation, ML models, and signal control
+from ingest import init_ingest
+from rollups import init_rollups
+from retention import init_retention
 from simulation import init_simulation
 from ml_models import init_ml_models
 from signal_control import init_signal_control
+from regions import init_regions
 from scenarios import init_scenarios
 
 with app.app_context():
+    init_ingest(app)
+    init_rollups(app)
+    init_regions(app)
     init_simulation(app, socketio, scheduler)
-    init_ml_models(app)
-    init_signal_control(app, socketio)
+    init_ml_models(app, scheduler)
+    init_signal_control(app, socketio, scheduler)
     init_scenarios(app, socketio, scheduler)
+    init_retention(app, scheduler)
     
     # Import routes
     import routes  # noqa: F401
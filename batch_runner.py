@@ -0,0 +1,187 @@
+import os
+
+if __name__ == "__main__":
+    # Running as a CLI: initialize the app without starting the background jobs
+    os.environ.setdefault("SCHEDULER_AUTOSTART", "0")
+
+import argparse
+import json
+import logging
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def _run_job(job, network_payload, start_time, seed):
+    """Run one scenario headless inside a worker process.
+
+    The network model arrives pickled and is loaded after the app is
+    imported, which resolves the network/app import cycle in the order the
+    server uses; workers run the app in worker mode (regions.worker_context).
+    """
+    import app  # noqa: F401
+    from headless import run_headless
+
+    network = pickle.loads(network_payload)
+
+    result = run_headless(network, job["duration"], config=job["config"],
+                          start_time=start_time, seed=seed)
+    result.update({"name": job["name"], "scenario_id": job.get("scenario_id")})
+    return result
+
+
+def load_jobs(scenario_ids=None, config_path=None):
+    """Build run descriptions from Scenario rows and/or a JSON file of scenario configs"""
+    from models import Scenario
+
+    jobs = []
+    if config_path:
+        with open(config_path) as f:
+            entries = json.load(f)
+        for entry in entries if isinstance(entries, list) else [entries]:
+            config = entry.get("config", {})
+            jobs.append({
+                "name": entry.get("name", "Unnamed scenario"),
+                "description": entry.get("description"),
+                "duration": int(entry.get("duration", 180)),
+                "config": json.loads(config) if isinstance(config, str) else config,
+            })
+
+    if scenario_ids is not None or not config_path:
+        query = Scenario.query
+        if scenario_ids:
+            query = query.filter(Scenario.id.in_(scenario_ids))
+        for scenario in query.order_by(Scenario.id).all():
+            jobs.append({
+                "scenario_id": scenario.id,
+                "name": scenario.name,
+                "duration": scenario.duration,
+                "config": json.loads(scenario.config) if scenario.config else {},
+            })
+    return jobs
+
+
+def _resolve_scenario_ids(jobs):
+    """Attach Scenario ids to file-based jobs, creating Scenario rows for new names"""
+    from app import db
+    from models import Scenario
+
+    for job in jobs:
+        if job.get("scenario_id"):
+            continue
+        scenario = Scenario.query.filter_by(name=job["name"]).first()
+        if scenario is None:
+            scenario = Scenario(
+                name=job["name"],
+                description=job.get("description"),
+                duration=job["duration"],
+                config=json.dumps(job["config"])
+            )
+            db.session.add(scenario)
+            db.session.flush()
+        job["scenario_id"] = scenario.id
+    db.session.commit()
+
+
+def write_metrics(results, start_time):
+    """Write one PerformanceMetric row per completed run with a single bulk insert"""
+    from sqlalchemy import insert
+    from app import db
+    from models import PerformanceMetric
+
+    rows = [{
+        "scenario_id": r["scenario_id"],
+        "start_time": start_time,
+        "end_time": start_time + timedelta(seconds=r["simulated_seconds"]),
+        "avg_wait_time": r["avg_wait_time"],
+        "throughput": r["throughput"],
+        "congestion_duration": r["congestion_duration"],
+        "emergency_response_time": r["emergency_response_time"],
+    } for r in results if "error" not in r]
+
+    if rows:
+        db.session.execute(insert(PerformanceMetric), rows)
+        db.session.commit()
+    return len(rows)
+
+
+def run_batch(jobs, network, workers=None, start_time=None, seed=None):
+    """Run every job on its own worker process and collect results in job order"""
+    from regions import worker_context
+
+    start_time = start_time or datetime.now()
+    workers = workers or os.cpu_count() or 1
+    results = [None] * len(jobs)
+
+    network_payload = pickle.dumps(network)
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(jobs))), mp_context=worker_context) as executor:
+        futures = {
+            executor.submit(_run_job, job, network_payload, start_time,
+                            None if seed is None else seed + i): i
+            for i, job in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                logger.error(f"Error running scenario {jobs[i]['name']}: {str(e)}")
+                results[i] = {"name": jobs[i]["name"], "scenario_id": jobs[i].get("scenario_id"),
+                              "error": str(e)}
+    return results
+
+
+def main():
+    from app import app
+    from network import get_network
+
+    parser = argparse.ArgumentParser(description="Run traffic scenarios headless in parallel")
+    parser.add_argument("--scenario-id", type=int, action="append", dest="scenario_ids",
+                        help="Scenario id to run (repeatable); defaults to all scenarios")
+    parser.add_argument("--config", help="JSON file with scenario configs shaped like DEFAULT_SCENARIOS")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores)")
+    parser.add_argument("--duration", type=int, help="Override every scenario's duration in seconds")
+    parser.add_argument("--start", help="Simulated start time (ISO format), which drives time-of-day patterns")
+    parser.add_argument("--seed", type=int, help="Base random seed for reproducible runs")
+    parser.add_argument("--no-write", action="store_true", help="Do not write PerformanceMetric rows")
+    args = parser.parse_args()
+
+    start_time = datetime.fromisoformat(args.start) if args.start else datetime.now().replace(microsecond=0)
+
+    with app.app_context():
+        jobs = load_jobs(args.scenario_ids, args.config)
+        if not jobs:
+            print(json.dumps({"error": "No scenarios to run"}))
+            return 1
+        if args.duration:
+            for job in jobs:
+                job["duration"] = args.duration
+        network = get_network()
+
+    started = time.perf_counter()
+    results = run_batch(jobs, network, workers=args.workers, start_time=start_time, seed=args.seed)
+    elapsed = time.perf_counter() - started
+
+    written = 0
+    if not args.no_write:
+        with app.app_context():
+            _resolve_scenario_ids(jobs)
+            for job, result in zip(jobs, results):
+                result["scenario_id"] = job["scenario_id"]
+            written = write_metrics(results, start_time)
+
+    print(json.dumps({
+        "scenarios": len(jobs),
+        "failed": sum(1 for r in results if "error" in r),
+        "metrics_written": written,
+        "elapsed": round(elapsed, 2),
+        "results": results
+    }, indent=2, default=str))
+    return 0 if all("error" not in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
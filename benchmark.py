@@ -0,0 +1,309 @@
+import os
+
+if __name__ == "__main__":
+    # Running as a CLI: initialize the app without starting the background jobs
+    os.environ.setdefault("SCHEDULER_AUTOSTART", "0")
+
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import subprocess
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (5, 500, 5000)
+
+# Latency metrics compared against a baseline run
+COMPARED_METRICS = ("p50_ms", "p99_ms")
+
+
+def _init_worker(database_url):
+    """Point a fresh worker process at the benchmark database with no background jobs"""
+    os.environ["SCHEDULER_AUTOSTART"] = "0"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["RETENTION_INTERVAL_HOURS"] = "0"
+    logging.disable(logging.INFO)
+
+    import app  # noqa: F401
+
+
+def _reset_database(size, seed):
+    """Recreate all tables and load a generated network of `size` intersections"""
+    from app import db
+    from latest_state import latest_state
+    from network import get_network, invalidate_network
+    from network_generator import bulk_load, generate_network
+
+    db.drop_all()
+    db.create_all()
+    latest_state.clear()
+    invalidate_network()
+
+    result = bulk_load(generate_network(size, layout="random", seed=seed))
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return get_network()
+
+
+def _prefill_history(network, history_minutes, sample_seconds, seed, chunk_size=20000):
+    """Write `history_minutes` of TrafficData with rollups, plus predictions ready for evaluation"""
+    from sqlalchemy import insert
+    from app import db
+    from latest_state import latest_state
+    from models import PredictionResult, TrafficData
+    from rollups import apply_rollups
+    from sim_clock import sim_clock
+    from simulation import TRAFFIC_PATTERNS, select_pattern_key
+    from simulation_engine import SimulationEngine
+
+    engine = SimulationEngine(network.approach_intersection_ids, network.approach_directions, seed=seed)
+    now = sim_clock.now()
+    steps = max(1, int(history_minutes * 60 // sample_seconds))
+
+    rows = []
+    written = 0
+    for step in range(steps, -1, -1):
+        timestamp = now - timedelta(seconds=step * sample_seconds)
+        batch = engine.to_rows(engine.tick(TRAFFIC_PATTERNS[select_pattern_key(timestamp)]), timestamp)
+        rows.extend(batch)
+        if len(rows) >= chunk_size or step == 0:
+            db.session.execute(insert(TrafficData), rows)
+            db.session.commit()
+            apply_rollups(rows)
+            written += len(rows)
+            rows = []
+    latest_state.update(batch)
+
+    # One 15-minute prediction per approach, made 20 minutes ago, so every one has materialized
+    predicted_at = now - timedelta(minutes=20)
+    predictions = [{
+        "intersection_id": a.intersection_id,
+        "direction": a.direction,
+        "timestamp": predicted_at,
+        "prediction_window": 15,
+        "predicted_vehicle_count": 20,
+        "predicted_congestion": False,
+        "confidence": 0.5,
+    } for a in network.approaches]
+    for start in range(0, len(predictions), chunk_size):
+        db.session.execute(insert(PredictionResult), predictions[start:start + chunk_size])
+    db.session.commit()
+    return written
+
+
+def _build_cases(network):
+    """Map case names to zero-argument callables exercising each hot path"""
+    from ml_models import evaluate_model_accuracy, predict_network, predict_traffic, prediction_cache
+    from scenarios import _update_scenario_metrics
+    from signal_control import control_tracker, update_traffic_signals
+    from simulation import get_traffic_data, set_simulation_state, update_simulation
+
+    set_simulation_state(running=True, speed=1.0)
+    intersection_ids = [node.id for node in network.intersections]
+    cursor = {"i": 0}
+
+    def next_intersection():
+        cursor["i"] = (cursor["i"] + 1) % len(intersection_ids)
+        return intersection_ids[cursor["i"]]
+
+    def run_full_signal_control():
+        # Re-evaluate every intersection, not just the ones whose inputs changed
+        control_tracker.reset()
+        return update_traffic_signals()
+
+    def run_uncached_network_prediction():
+        # Measure inference and the bulk write rather than cache hits
+        prediction_cache.clear()
+        return predict_network()
+
+    return {
+        "update_simulation": lambda: update_simulation(emit=False),
+        "update_traffic_signals": update_traffic_signals,
+        "update_traffic_signals_full": run_full_signal_control,
+        "predict_traffic": lambda: predict_traffic(next_intersection()),
+        "predict_network": run_uncached_network_prediction,
+        "predict_network_cached": lambda: predict_network(),
+        "get_traffic_data": lambda: get_traffic_data(next_intersection(), minutes=5),
+        "get_traffic_data_network": lambda: get_traffic_data(None, minutes=60),
+        "_update_scenario_metrics": _update_scenario_metrics,
+        "evaluate_model_accuracy": evaluate_model_accuracy,
+    }
+
+
+def _time_case(func, iterations, max_seconds, min_iterations=3):
+    """Time one warm-up call plus up to `iterations` calls within a time budget"""
+    warmup = func()
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < iterations:
+        t0 = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        if len(latencies) >= min_iterations and time.perf_counter() - started > max_seconds:
+            break
+
+    samples = np.array(latencies)
+    p50, p99 = np.percentile(samples, [50, 99])
+    stats = {
+        "iterations": len(latencies),
+        "p50_ms": round(float(p50), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(samples.mean()), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+    # Flag cases that only timed their error path
+    if isinstance(warmup, dict) and "error" in warmup:
+        stats["error"] = warmup["error"]
+    return stats
+
+
+def _run_size(size, options):
+    """Benchmark every hot path at one network size inside a worker process"""
+    from app import app, db
+
+    with app.app_context():
+        started = time.perf_counter()
+        network = _reset_database(size, options["seed"])
+        history_rows = _prefill_history(network, options["history_minutes"],
+                                        options["sample_seconds"], options["seed"])
+        setup_seconds = time.perf_counter() - started
+
+        results = {}
+        for name, func in _build_cases(network).items():
+            if options["cases"] and name not in options["cases"]:
+                continue
+            results[name] = _time_case(func, options["iterations"], options["max_case_seconds"])
+            db.session.remove()
+
+        return {
+            "intersections": len(network.intersections),
+            "approaches": len(network.approaches),
+            "history_rows": history_rows,
+            "setup_seconds": round(setup_seconds, 2),
+            "cases": results,
+        }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, database_url=None, iterations=30, max_case_seconds=30.0,
+                   history_minutes=60, sample_seconds=60, cases=None, seed=42):
+    """Run the suite, one fresh worker process and database per network size"""
+    options = {
+        "iterations": iterations,
+        "max_case_seconds": max_case_seconds,
+        "history_minutes": history_minutes,
+        "sample_seconds": sample_seconds,
+        "cases": set(cases or ()),
+        "seed": seed,
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="traffic-bench-") as tmpdir:
+        for size in sizes:
+            url = database_url or f"sqlite:///{os.path.join(tmpdir, f'bench_{size}.db')}"
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context,
+                                     initializer=_init_worker, initargs=(url,)) as executor:
+                results[str(size)] = executor.submit(_run_size, size, options).result()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "revision": _git_revision(),
+            "database": (database_url or "sqlite").split(":", 1)[0],
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "history_minutes": history_minutes,
+            "sample_seconds": sample_seconds,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare_results(current, baseline, threshold=0.2):
+    """List every case whose p50 or p99 latency grew by more than `threshold` over the baseline"""
+    regressions = []
+    for size, size_result in current["results"].items():
+        baseline_cases = baseline.get("results", {}).get(size, {}).get("cases", {})
+        for case, stats in size_result["cases"].items():
+            previous = baseline_cases.get(case)
+            if not previous:
+                continue
+            for metric in COMPARED_METRICS:
+                before, after = previous.get(metric), stats.get(metric)
+                if before and after is not None and after > before * (1 + threshold):
+                    regressions.append({
+                        "size": size,
+                        "case": case,
+                        "metric": metric,
+                        "baseline": before,
+                        "current": after,
+                        "change": round(after / before - 1, 3),
+                    })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation, control, prediction and query hot paths")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated network sizes in intersections")
+    parser.add_argument("--database-url",
+                        help="Benchmark database, e.g. a scratch PostgreSQL database (default: temporary SQLite). "
+                             "All tables in it are dropped.")
+    parser.add_argument("--iterations", type=int, default=30, help="Timed calls per case")
+    parser.add_argument("--max-case-seconds", type=float, default=30.0,
+                        help="Stop timing a case after this long (at least 3 calls are always timed)")
+    parser.add_argument("--history-minutes", type=int, default=60, help="Minutes of pre-filled TrafficData")
+    parser.add_argument("--sample-seconds", type=int, default=60, help="Spacing of pre-filled readings")
+    parser.add_argument("--case", action="append", dest="cases", help="Only run this case (repeatable)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative p50/p99 increase over the baseline before failing")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = run_benchmarks(sizes, args.database_url, args.iterations, args.max_case_seconds,
+                            args.history_minutes, args.sample_seconds, args.cases, args.seed)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for size, size_result in report["results"].items():
+        print(f"{size} intersections ({size_result['approaches']} approaches, "
+              f"{size_result['history_rows']} history rows)")
+        for case, stats in size_result["cases"].items():
+            print(f"  {case:<28} p50 {stats['p50_ms']:>10.2f} ms   p99 {stats['p99_ms']:>10.2f} ms   "
+                  f"n={stats['iterations']}" + (f"   error: {stats['error']}" if "error" in stats else ""))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(report, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['size']} {r['case']} {r['metric']}: "
+                  f"{r['baseline']} -> {r['current']} ms (+{r['change'] * 100:.0f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions above {args.threshold * 100:.0f}% against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
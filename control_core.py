@@ -0,0 +1,104 @@
+import numpy as np
+
+# Signal states as stored in approach arrays
+RED, YELLOW, GREEN = 0, 1, 2
+SIGNAL_STATES = ("red", "yellow", "green")
+STATE_CODES = {name: code for code, name in enumerate(SIGNAL_STATES)}
+
+
+def priority_scores(readings, emergency):
+    """Priority score (0-1) per approach from normalized wait (120 s), queue (20 vehicles)
+    and slowness (60 km/h); emergency vehicles get the highest priority, and approaches
+    without a reading are NaN"""
+    with np.errstate(invalid='ignore'):
+        priority = (0.4 * np.minimum(1.0, readings["wait_time"] / 120.0)
+                    + 0.4 * np.minimum(1.0, readings["queue_length"] / 20.0)
+                    + 0.2 * (1.0 - np.minimum(1.0, readings["average_speed"] / 60.0)))
+    return np.where(emergency & ~np.isnan(readings["wait_time"]), 1.0, priority)
+
+
+def control_network(network, state, cycle_time, last_updated, readings, emergency, now, control_state,
+                    intersections=None):
+    """Apply the adaptive control rules to every intersection at once.
+    
+    Signal state is given as approach-ordered arrays (state codes, cycle times
+    and last_updated as datetime64) and is updated in place. `readings` holds
+    approach arrays of the newest average_speed, queue_length and wait_time,
+    with NaN for approaches without a fresh reading; intersections without any
+    reading are left alone, as are those outside the optional boolean
+    `intersections` mask. Returns a boolean array of the changed approaches.
+    """
+    size = len(network.approaches)
+    changed = np.zeros(size, dtype=bool)
+    if size == 0:
+        return changed
+    
+    n_intersections = len(network.intersections)
+    intersection = network.approach_intersection_index
+    has_reading = ~np.isnan(readings["wait_time"])
+    emergency = emergency & has_reading
+    priority = priority_scores(readings, emergency)
+    
+    active = np.bincount(intersection, weights=has_reading, minlength=n_intersections) > 0
+    if intersections is not None:
+        active &= intersections
+    has_emergency = active & (np.bincount(intersection, weights=emergency, minlength=n_intersections) > 0)
+    
+    # Emergency handling - give green to the emergency directions, all others red, on a shorter cycle
+    if has_emergency.any():
+        control_state["emergency_priority"] = True
+    in_emergency = has_emergency[intersection]
+    target_state = np.where(emergency, GREEN, RED).astype(np.int8)
+    target_cycle = np.full(size, 30, dtype=np.int64)
+    
+    # Normal operation - the highest-priority approach (first one on ties) of each intersection
+    top = np.full(n_intersections, -1, dtype=np.int64)
+    candidates = np.flatnonzero(has_reading)
+    ordered = candidates[np.lexsort((candidates, -priority[candidates], intersection[candidates]))]
+    groups, first = np.unique(intersection[ordered], return_index=True)
+    top[groups] = ordered[first]
+    
+    # The first green signal of each intersection and whether its cycle has run out
+    first_green = np.full(n_intersections, -1, dtype=np.int64)
+    green = np.flatnonzero(state == GREEN)
+    groups, first = np.unique(intersection[green], return_index=True)
+    first_green[groups] = green[first]
+    
+    has_green = first_green >= 0
+    elapsed = (np.datetime64(now, 'us') - last_updated[np.maximum(first_green, 0)]) / np.timedelta64(1, 's')
+    with np.errstate(invalid='ignore'):
+        expired = has_green & (elapsed > cycle_time[np.maximum(first_green, 0)])
+    top_is_green = (top >= 0) & (state[np.maximum(top, 0)] == GREEN)
+    change_needed = active & ~has_emergency & (top >= 0) & (~top_is_green | expired | ~has_green)
+    
+    # New green: the top approach, plus the other members of its legal phase (looked up in the
+    # intersection's phase plan) that have a reading, unless the top one is near saturation
+    new_green = np.zeros(size, dtype=bool)
+    changing_top = top[change_needed]
+    new_green[changing_top] = True
+    joins = priority[changing_top] < 0.8
+    phase = network.approach_phase_mask[changing_top]
+    position = network.approach_position[changing_top]
+    first = network.intersection_first_approach[intersection[changing_top]]
+    for bit in range(network.max_approaches):
+        member = first[joins & (position != bit) & ((phase >> np.uint32(bit)) & 1).astype(bool)] + bit
+        new_green[member[has_reading[member]]] = True
+    
+    in_normal = change_needed[intersection]
+    normal_state = np.where(new_green, GREEN, RED).astype(np.int8)
+    normal_cycle = np.where(new_green, 30 + np.nan_to_num(priority) * 60, 60).astype(np.int64)  # 30-90 seconds
+    
+    # Handle yellow transition if changing from green to red
+    to_yellow = (state == GREEN) & (normal_state == RED)
+    normal_state[to_yellow] = YELLOW
+    normal_cycle[to_yellow] = 5  # Short yellow phase
+    
+    target_state = np.where(in_normal, normal_state, target_state)
+    target_cycle = np.where(in_normal, normal_cycle, target_cycle)
+    
+    applies = in_emergency | in_normal
+    changed = applies & ((state != target_state) | (cycle_time != target_cycle))
+    state[changed] = target_state[changed]
+    cycle_time[changed] = target_cycle[changed]
+    last_updated[changed] = np.datetime64(now, 'us')
+    return changed
@@ -0,0 +1,114 @@
+import heapq
+import itertools
+import threading
+import numpy as np
+from datetime import timedelta
+
+
+class ControlTracker:
+    """Tracks which intersections need a signal control evaluation.
+
+    An intersection is dirty when the priority score of one of its approaches
+    has moved by more than `priority_delta` since it was last evaluated (or a
+    reading appeared or went stale), when its emergency status changed, when
+    it was marked explicitly (e.g. by a manual override), or when its timer
+    comes due. After an evaluation the timer is set to the moment the current
+    green runs past its cycle time, capped at `max_idle`, and kept in a heap,
+    so stable intersections cost nothing until something happens.
+    """
+
+    def __init__(self, priority_delta=0.05, max_idle=timedelta(seconds=60)):
+        self.priority_delta = priority_delta
+        self.max_idle = max_idle
+        self._version = None
+        self._priority = None
+        self._emergency = None
+        self._due = None
+        self._heap = []  # (due, sequence, intersection index); entries superseded by a reschedule are skipped
+        self._sequence = itertools.count()
+        self._marked = set()
+        self._lock = threading.Lock()
+
+    def mark_dirty(self, intersection_id):
+        """Force an evaluation of one intersection on the next pass"""
+        with self._lock:
+            self._marked.add(intersection_id)
+
+    def retry(self, network, dirty):
+        """Mark the intersections of a failed pass dirty again, so timers popped for it are not lost"""
+        with self._lock:
+            self._marked.update(network.intersections[index].id for index in np.flatnonzero(dirty))
+
+    def reset(self):
+        """Forget all state so the next pass evaluates every intersection"""
+        with self._lock:
+            self._version = None
+
+    def collect_dirty(self, network, priority, emergency, now):
+        """Return a boolean intersection mask of everything that needs evaluating at `now`"""
+        n_intersections = len(network.intersections)
+        intersection = network.approach_intersection_index
+
+        with self._lock:
+            if self._version != network.version or self._due is None or len(self._due) != n_intersections:
+                self._version = network.version
+                self._priority = np.full(len(network.approaches), np.nan)
+                self._emergency = np.zeros(len(network.approaches), dtype=bool)
+                self._due = np.full(n_intersections, np.datetime64('NaT'), dtype='datetime64[us]')
+                self._heap = []
+                self._marked.clear()
+                return np.ones(n_intersections, dtype=bool)
+
+            # Inputs that moved by more than the delta, readings that appeared or went stale,
+            # and emergency vehicles that arrived or cleared
+            previous_missing = np.isnan(self._priority)
+            current_missing = np.isnan(priority)
+            with np.errstate(invalid='ignore'):
+                moved = np.abs(priority - self._priority) > self.priority_delta
+            changed = moved | (previous_missing != current_missing) | (emergency != self._emergency)
+
+            dirty = np.bincount(intersection, weights=changed, minlength=n_intersections) > 0
+
+            # Timers that came due
+            now64 = np.datetime64(now, 'us')
+            while self._heap and self._heap[0][0] < now64:
+                due, _, index = heapq.heappop(self._heap)
+                if self._due[index] == due:
+                    dirty[index] = True
+
+            for intersection_id in self._marked:
+                index = network.intersection_index.get(intersection_id)
+                if index is not None:
+                    dirty[index] = True
+            self._marked.clear()
+
+        return dirty
+
+    def evaluated(self, network, dirty, priority, emergency, is_green, cycle_time, last_updated, now):
+        """Record the inputs an evaluation used and schedule each evaluated intersection's next timer"""
+        intersection = network.approach_intersection_index
+        evaluated_approaches = dirty[intersection]
+        now64 = np.datetime64(now, 'us')
+
+        # The first green signal of each evaluated intersection decides when its cycle runs out
+        due = np.full(len(network.intersections), now64 + np.timedelta64(self.max_idle), dtype='datetime64[us]')
+        green = np.flatnonzero(evaluated_approaches & is_green)
+        groups, first = np.unique(intersection[green], return_index=True)
+        if len(groups):
+            first_green = green[first]
+            expires = last_updated[first_green] + cycle_time[first_green].astype('timedelta64[s]')
+            due[groups] = np.where(np.isnat(expires), due[groups], np.minimum(expires, due[groups]))
+
+        with self._lock:
+            if self._priority is None or len(self._priority) != len(priority):
+                return
+            self._priority[evaluated_approaches] = priority[evaluated_approaches]
+            self._emergency[evaluated_approaches] = emergency[evaluated_approaches]
+            for index in np.flatnonzero(dirty):
+                self._due[index] = due[index]
+                heapq.heappush(self._heap, (due[index], next(self._sequence), int(index)))
+
+            # Drop superseded timers once they outnumber the intersections
+            if len(self._heap) > 2 * len(self._due) + 64:
+                self._heap = [(d, next(self._sequence), i) for i, d in enumerate(self._due) if not np.isnat(d)]
+                heapq.heapify(self._heap)
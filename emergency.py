@@ -0,0 +1,104 @@
+import heapq
+import itertools
+import logging
+import threading
+from datetime import timedelta
+from sim_clock import sim_clock
+
+logger = logging.getLogger(__name__)
+
+# Emergency vehicles hold priority for this long after dispatch (simulated time)
+EMERGENCY_LIFETIME = timedelta(minutes=2)
+
+
+class EmergencyRegistry:
+    """Thread-safe registry of active emergency vehicles keyed by (intersection_id, direction).
+
+    Each approach holds at most one vehicle; dispatching to an approach that
+    already has one refreshes its expiry, so the registry never grows beyond
+    the number of approaches. Expiry times sit in a min-heap and are pruned
+    lazily on read, so lookups are O(1) and expiry costs O(log n) per vehicle.
+    Expired vehicles are passed to the registered expiry listeners.
+    """
+
+    def __init__(self, lifetime=EMERGENCY_LIFETIME, clock=None):
+        self.lifetime = lifetime
+        self._clock = clock or sim_clock
+        self._active = {}
+        self._heap = []  # (expires_at, sequence, key); entries superseded by a refresh are skipped
+        self._sequence = itertools.count()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def dispatch(self, intersection_id, direction, now=None):
+        """Register (or refresh) an emergency vehicle on one approach and return its entry"""
+        now = now or self._clock.now()
+        key = (intersection_id, direction)
+        sequence = next(self._sequence)
+        entry = {
+            'intersection_id': intersection_id,
+            'direction': direction,
+            'timestamp': now,
+            'expires_at': now + self.lifetime,
+            'sequence': sequence
+        }
+        with self._lock:
+            self._active[key] = entry
+            heapq.heappush(self._heap, (entry['expires_at'], sequence, key))
+            # Drop superseded heap entries once they outnumber the live ones
+            if len(self._heap) > 2 * len(self._active) + 64:
+                self._heap = [(e['expires_at'], e['sequence'], k) for k, e in self._active.items()]
+                heapq.heapify(self._heap)
+        return entry
+
+    def expire(self, now=None):
+        """Remove vehicles whose lifetime has passed, notify listeners and return them"""
+        now = now or self._clock.now()
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, sequence, key = heapq.heappop(self._heap)
+                entry = self._active.get(key)
+                if entry is not None and entry['sequence'] == sequence:
+                    del self._active[key]
+                    expired.append(entry)
+
+        for callback in self._listeners if expired else ():
+            try:
+                callback(expired)
+            except Exception as e:
+                logger.error(f"Error in emergency expiry listener: {str(e)}")
+        return expired
+
+    def is_active(self, intersection_id, direction):
+        """Check whether an approach currently has an emergency vehicle"""
+        entry = self._active.get((intersection_id, direction))
+        return entry is not None and entry['expires_at'] > self._clock.now()
+
+    def keys(self):
+        """Get the (intersection_id, direction) keys of all active vehicles"""
+        self.expire()
+        with self._lock:
+            return list(self._active)
+
+    def get_all(self):
+        """Get a copy of every active vehicle entry"""
+        self.expire()
+        with self._lock:
+            return [dict(entry) for entry in self._active.values()]
+
+    def add_expiry_listener(self, callback):
+        """Register a callable invoked with the list of expired entries"""
+        self._listeners.append(callback)
+
+    def clear(self):
+        with self._lock:
+            self._active.clear()
+            self._heap.clear()
+
+    def __len__(self):
+        return len(self._active)
+
+
+# Global registry for the live simulation
+emergency_registry = EmergencyRegistry()
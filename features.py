@@ -0,0 +1,113 @@
+import numpy as np
+from sqlalchemy import select
+from app import db
+from models import TrafficData
+
+# Column order of the model input matrix, shared by training and inference
+MODEL_FEATURES = ["vehicle_count", "average_speed", "queue_length", "wait_time",
+                  "hour_of_day", "day_of_week", "is_weekend", "is_peak_hour"]
+
+# TrafficData columns read for training and evaluation, with the array dtype each is loaded as
+TRAFFIC_COLUMNS = {
+    "id": np.int64,
+    "intersection_id": np.int64,
+    "direction": object,
+    "vehicle_count": np.float64,
+    "average_speed": np.float64,
+    "queue_length": np.float64,
+    "wait_time": np.float64,
+    "timestamp": "datetime64[us]",
+}
+
+
+def iter_traffic_columns(after_id=0, until_id=None, since=None, until=None, columns=TRAFFIC_COLUMNS,
+                         chunk_size=50000, limit=None):
+    """Stream TrafficData rows with id > after_id as dicts of typed column arrays, chunk by chunk.
+
+    Rows are read with a Core select paged by id, so no ORM objects are built
+    and memory is bounded by `chunk_size`. `until_id`, `since` and `until`
+    narrow the range; `limit` caps the total rows yielded.
+    """
+    names = list(columns)
+    if "id" not in names:
+        names.insert(0, "id")
+    query = select(*(getattr(TrafficData, name) for name in names))
+    if until_id is not None:
+        query = query.where(TrafficData.id <= until_id)
+    if since is not None:
+        query = query.where(TrafficData.timestamp >= since)
+    if until is not None:
+        query = query.where(TrafficData.timestamp <= until)
+
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        rows = db.session.execute(
+            query.where(TrafficData.id > after_id).order_by(TrafficData.id).limit(size)
+        ).all()
+        if not rows:
+            return
+        chunk = {
+            name: np.array(values, dtype=columns.get(name, np.int64))
+            for name, values in zip(names, zip(*rows))
+        }
+        yield chunk
+        after_id = int(chunk["id"][-1])
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            return
+
+
+def load_training_set(after_id=0, until_id=None, since=None, chunk_size=50000, limit=None):
+    """Load a model_features matrix, vehicle-count and congestion targets and the newest id read.
+
+    Features are built per chunk, so only the float matrix of the rows read
+    is held, never the raw rows.
+    """
+    columns = {name: TRAFFIC_COLUMNS[name] for name in
+               ("id", "vehicle_count", "average_speed", "queue_length", "wait_time", "timestamp")}
+    matrices = []
+    last_id = after_id
+    for chunk in iter_traffic_columns(after_id, until_id, since, columns=columns, chunk_size=chunk_size,
+                                      limit=limit):
+        matrices.append(build_features(chunk["vehicle_count"], chunk["average_speed"], chunk["queue_length"],
+                                       chunk["wait_time"], chunk["timestamp"]))
+        last_id = int(chunk["id"][-1])
+    X = np.vstack(matrices) if matrices else np.empty((0, len(MODEL_FEATURES)))
+    y_count = X[:, 0]
+    y_congestion = congestion_labels(X[:, 3], X[:, 2])
+    return X, y_count, y_congestion, last_id
+
+
+def time_feature_columns(timestamps):
+    """Hour of day, day of week, weekend and peak-hour columns for a datetime64 array"""
+    timestamps = np.asarray(timestamps, dtype="datetime64[us]")
+    days = timestamps.astype("datetime64[D]")
+    hour_of_day = (timestamps.astype("datetime64[h]") - days).astype(np.int64)
+    day_of_week = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday; Monday is 0
+    is_weekend = day_of_week >= 5
+    is_peak_hour = ((hour_of_day >= 7) & (hour_of_day < 10)) | ((hour_of_day >= 16) & (hour_of_day < 19))
+    return np.column_stack([hour_of_day, day_of_week, is_weekend, is_peak_hour]).astype(np.float64)
+
+
+def build_features(vehicle_count, average_speed, queue_length, wait_time, timestamps):
+    """Stack readings and their time features into a model_features matrix.
+
+    `timestamps` is one datetime64 per row, or a single time shared by every row.
+    """
+    size = len(vehicle_count)
+    if np.ndim(timestamps) == 0:
+        time_features = np.repeat(time_feature_columns([np.datetime64(timestamps, "us")]), size, axis=0)
+    else:
+        time_features = time_feature_columns(timestamps)
+    return np.column_stack([
+        np.asarray(vehicle_count, dtype=np.float64), np.asarray(average_speed, dtype=np.float64),
+        np.asarray(queue_length, dtype=np.float64), np.asarray(wait_time, dtype=np.float64),
+        time_features
+    ])
+
+
+def congestion_labels(wait_time, queue_length):
+    """Congested when the wait exceeds 45 seconds with more than 10 vehicles queued"""
+    return ((np.asarray(wait_time) > 45) & (np.asarray(queue_length) > 10)).astype(int)
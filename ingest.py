@@ -0,0 +1,324 @@
+import atexit
+import csv
+import io
+import logging
+import threading
+import time
+from collections import deque
+from sqlalchemy import insert
+from app import db
+from models import TrafficData
+from metrics import GaugeFunction, PhaseTimer, registry, rows_written
+
+logger = logging.getLogger(__name__)
+
+# Column order used for bulk inserts and PostgreSQL COPY
+TRAFFIC_DATA_COLUMNS = ["intersection_id", "timestamp", "vehicle_count", "average_speed",
+                        "queue_length", "wait_time", "direction"]
+
+# Global writer instance, created by init_ingest
+traffic_data_writer = None
+
+# Callbacks invoked with each batch of rows after it has been written
+flush_listeners = []
+
+# Listener deliveries that failed, as (callback, rows), replayed before the next batch is delivered.
+# The raw rows are already committed, so only the listener is retried; rollup merges are sums,
+# minimums and maximums, so applying a batch late gives the same result.
+failed_listener_batches = deque()
+MAX_FAILED_LISTENER_ROWS = 100000
+_failed_listener_rows = 0
+_listener_lock = threading.RLock()
+
+
+class TrafficDataWriter:
+    """Write-behind buffer that flushes TrafficData rows in batches from its own thread.
+
+    Producers append rows to a bounded in-memory queue and return immediately.
+    A dedicated writer thread drains the queue whenever `flush_size` rows are
+    pending or `flush_interval` seconds have passed, writing each batch with a
+    single bulk statement. When the queue is full, producers block for up to
+    `put_timeout` seconds before the overflowing rows are dropped and counted.
+    A failed write is retried `flush_retries` times, waiting `retry_backoff`
+    seconds and doubling the wait each time, before the batch is dropped.
+    """
+
+    def __init__(self, app, flush_size=1000, flush_interval=1.0, max_queue_size=50000, put_timeout=0.5,
+                 flush_retries=3, retry_backoff=0.5):
+        self.app = app
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.max_queue_size = max(self.flush_size, int(max_queue_size))
+        self.put_timeout = max(0.0, float(put_timeout))
+        self.flush_retries = max(0, int(flush_retries))
+        self.retry_backoff = max(0.0, float(retry_backoff))
+
+        self._pending = deque()
+        self._pending_rows = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+        self.stats = {
+            "rows_enqueued": 0,
+            "rows_written": 0,
+            "rows_dropped": 0,
+            "backpressure_waits": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "flush_retries": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def start(self):
+        """Start the writer thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="traffic-data-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Stop the writer thread after flushing everything still queued"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def enqueue(self, rows):
+        """Queue rows for writing, blocking briefly when the queue is full.
+
+        Returns the number of rows accepted.
+        """
+        if not rows:
+            return 0
+
+        with self._condition:
+            if self._pending_rows + len(rows) > self.max_queue_size:
+                self.stats["backpressure_waits"] += 1
+                deadline = time.monotonic() + self.put_timeout
+                while self._pending_rows + len(rows) > self.max_queue_size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+            free = self.max_queue_size - self._pending_rows
+            if free < len(rows):
+                dropped = len(rows) - max(0, free)
+                self.stats["rows_dropped"] += dropped
+                logger.warning(f"Traffic data queue full, dropped {dropped} rows")
+                rows = rows[:max(0, free)]
+                if not rows:
+                    return 0
+
+            self._pending.append(rows)
+            self._pending_rows += len(rows)
+            self.stats["rows_enqueued"] += len(rows)
+            if self._pending_rows >= self.flush_size:
+                self._condition.notify_all()
+            return len(rows)
+
+    def get_stats(self):
+        """Get writer counters and current queue depth"""
+        with self._condition:
+            stats = dict(self.stats)
+            stats["queue_depth"] = self._pending_rows
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / stats["flushes"] if stats["flushes"] else 0.0
+        stats["flush_size"] = self.flush_size
+        stats["flush_interval"] = self.flush_interval
+        stats["max_queue_size"] = self.max_queue_size
+        return stats
+
+    def _take_batch(self):
+        """Wait for a full batch or the flush interval, then take pending rows"""
+        with self._condition:
+            deadline = time.monotonic() + self.flush_interval
+            while self._pending_rows < self.flush_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = []
+            while self._pending and len(batch) < self.flush_size:
+                batch.extend(self._pending.popleft())
+            self._pending_rows -= len(batch)
+
+            # Wake producers waiting on backpressure
+            self._condition.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                for start in range(0, len(batch), self.flush_size):
+                    self._flush(batch[start:start + self.flush_size])
+            elif self._stopping:
+                break
+            elif failed_listener_batches:
+                with self.app.app_context():
+                    _replay_failed_listener_batches()
+
+    def _flush(self, rows):
+        started = time.perf_counter()
+        phases = PhaseTimer('ingest_flush')
+        with self.app.app_context():
+            if not self._write_with_retry(rows):
+                return
+            phases.mark('commit')
+            _notify_flush_listeners(rows)
+
+        rows_written.inc(len(rows), table='traffic_data')
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._condition:
+            self.stats["rows_written"] += len(rows)
+            self.stats["flushes"] += 1
+            self.stats["last_flush_ms"] = elapsed_ms
+            self.stats["total_flush_ms"] += elapsed_ms
+            self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], elapsed_ms)
+
+    def _write_with_retry(self, rows):
+        """Write a batch, retrying with exponential backoff; returns False if it was dropped"""
+        for attempt in range(self.flush_retries + 1):
+            try:
+                _write_rows(rows)
+                return True
+            except Exception as e:
+                db.session.rollback()
+                with self._condition:
+                    self.stats["flush_errors"] += 1
+                if attempt == self.flush_retries:
+                    logger.error(f"Error flushing traffic data, dropped {len(rows)} rows: {str(e)}")
+                    with self._condition:
+                        self.stats["rows_dropped"] += len(rows)
+                    return False
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(f"Error flushing traffic data, retrying in {delay:.2f}s: {str(e)}")
+                with self._condition:
+                    self.stats["flush_retries"] += 1
+                time.sleep(delay)
+
+
+def _write_rows(rows):
+    """Insert rows in one transaction, with COPY on PostgreSQL"""
+    if db.engine.dialect.name == "postgresql":
+        _copy_rows(rows)
+    else:
+        db.session.execute(insert(TrafficData), rows)
+        db.session.commit()
+
+
+def _notify_flush_listeners(rows):
+    with _listener_lock:
+        _replay_failed_listener_batches()
+        for callback in flush_listeners:
+            try:
+                callback(rows)
+            except Exception as e:
+                logger.error(f"Error in traffic data flush listener, queued {len(rows)} rows for retry: {str(e)}")
+                db.session.rollback()
+                _queue_failed_listener_batch(callback, rows)
+
+
+def _queue_failed_listener_batch(callback, rows):
+    """Keep a failed delivery for replay, dropping the oldest beyond MAX_FAILED_LISTENER_ROWS"""
+    global _failed_listener_rows
+    failed_listener_batches.append((callback, rows))
+    _failed_listener_rows += len(rows)
+    while _failed_listener_rows > MAX_FAILED_LISTENER_ROWS:
+        _, dropped = failed_listener_batches.popleft()
+        _failed_listener_rows -= len(dropped)
+        logger.error(f"Dropped {len(dropped)} rows queued for a failed flush listener; "
+                     "rebuild_rollups() repairs the rollups from raw data")
+
+
+def _replay_failed_listener_batches():
+    """Deliver queued failed batches oldest first, stopping at the first one that fails again"""
+    global _failed_listener_rows
+    with _listener_lock:
+        while failed_listener_batches:
+            callback, rows = failed_listener_batches[0]
+            try:
+                callback(rows)
+            except Exception as e:
+                logger.error(f"Error replaying traffic data flush listener batch: {str(e)}")
+                db.session.rollback()
+                return
+            failed_listener_batches.popleft()
+            _failed_listener_rows -= len(rows)
+
+
+def _copy_rows(rows):
+    """Write rows with PostgreSQL COPY through the raw DB-API connection"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in TRAFFIC_DATA_COLUMNS])
+    buffer.seek(0)
+
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.copy_expert(
+            f"COPY {TrafficData.__tablename__} ({', '.join(TRAFFIC_DATA_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def init_ingest(app):
+    """Initialize the write-behind ingest pipeline for TrafficData"""
+    if app.config.get("WORKER_PROCESS"):
+        return
+    global traffic_data_writer
+
+    traffic_data_writer = TrafficDataWriter(
+        app,
+        flush_size=app.config.get("INGEST_FLUSH_SIZE", 1000),
+        flush_interval=app.config.get("INGEST_FLUSH_INTERVAL", 1.0),
+        max_queue_size=app.config.get("INGEST_QUEUE_SIZE", 50000),
+        put_timeout=app.config.get("INGEST_PUT_TIMEOUT", 0.5),
+        flush_retries=app.config.get("INGEST_FLUSH_RETRIES", 3),
+        retry_backoff=app.config.get("INGEST_RETRY_BACKOFF", 0.5)
+    )
+    traffic_data_writer.start()
+    atexit.register(traffic_data_writer.stop)
+    registry.register(GaugeFunction(
+        "traffic_ingest_queue_rows", "TrafficData rows waiting for the write-behind writer",
+        lambda: traffic_data_writer.get_stats()["queue_depth"]))
+    logger.info("Started write-behind traffic data writer")
+
+
+def enqueue_traffic_data(rows):
+    """Queue TrafficData rows for the writer, or insert them directly if it is not running"""
+    if traffic_data_writer is not None:
+        return traffic_data_writer.enqueue(rows)
+
+    if rows:
+        _write_rows(rows)
+        rows_written.inc(len(rows), table='traffic_data')
+        _notify_flush_listeners(rows)
+    return len(rows)
+
+
+def add_flush_listener(callback):
+    """Register a callback invoked with each batch of rows after it is written"""
+    flush_listeners.append(callback)
+
+
+def get_ingest_stats():
+    """Get counters for the write-behind ingest pipeline"""
+    if traffic_data_writer is None:
+        return {"running": False}
+    stats = traffic_data_writer.get_stats()
+    stats["running"] = True
+    stats["listener_backlog_rows"] = _failed_listener_rows
+    return stats
@@ -0,0 +1,190 @@
+import logging
+import threading
+import numpy as np
+from sqlalchemy import func, select
+from app import db
+from models import TrafficData
+from sim_clock import sim_clock
+
+logger = logging.getLogger(__name__)
+
+
+class LatestReading:
+    """Newest traffic reading for one approach (intersection and direction)"""
+    __slots__ = ("intersection_id", "direction", "timestamp", "vehicle_count",
+                 "average_speed", "queue_length", "wait_time")
+
+    def __init__(self, intersection_id, direction, timestamp, vehicle_count,
+                 average_speed, queue_length, wait_time):
+        self.intersection_id = intersection_id
+        self.direction = direction
+        self.timestamp = timestamp
+        self.vehicle_count = vehicle_count
+        self.average_speed = average_speed
+        self.queue_length = queue_length
+        self.wait_time = wait_time
+
+    def to_dict(self):
+        return {
+            'intersection_id': self.intersection_id,
+            'direction': self.direction,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'vehicle_count': self.vehicle_count,
+            'average_speed': self.average_speed,
+            'queue_length': self.queue_length,
+            'wait_time': self.wait_time
+        }
+
+
+class LatestStateStore:
+    """Process-local store of the newest reading per (intersection_id, direction).
+
+    The simulation tick publishes every generated row here, so consumers that
+    only need the current state of each approach do an O(1) dictionary lookup
+    instead of scanning minutes of TrafficData history. Intersections that have
+    not been seen since start-up are loaded once from the database.
+    """
+
+    def __init__(self):
+        self._readings = {}
+        self._by_intersection = {}
+        self._loaded = set()
+        self._lock = threading.Lock()
+
+    def update(self, rows):
+        """Publish TrafficData column mappings, keeping only the newest per approach"""
+        with self._lock:
+            for row in rows:
+                key = (row["intersection_id"], row["direction"])
+                current = self._readings.get(key)
+                # A stored reading ahead of the clock is from before a clock reset, so replace it
+                if (current is not None and current.timestamp
+                        and row["timestamp"] < current.timestamp <= sim_clock.now()):
+                    continue
+                reading = LatestReading(
+                    row["intersection_id"], row["direction"], row["timestamp"], row["vehicle_count"],
+                    row["average_speed"], row["queue_length"], row["wait_time"]
+                )
+                self._readings[key] = reading
+                self._by_intersection.setdefault(key[0], {})[key[1]] = reading
+                self._loaded.add(key[0])
+
+    def get(self, intersection_id, direction):
+        """Get the newest reading for one approach, or None"""
+        self._ensure_loaded([intersection_id])
+        return self._readings.get((intersection_id, direction))
+
+    def get_intersection(self, intersection_id, max_age=None):
+        """Get {direction: reading} for one intersection, optionally limited to fresh readings"""
+        self._ensure_loaded([intersection_id])
+        with self._lock:
+            readings = dict(self._by_intersection.get(intersection_id, {}))
+        return _filter_fresh(readings, max_age)
+
+    def get_all(self, max_age=None):
+        """Get {intersection_id: {direction: reading}} for every known intersection"""
+        with self._lock:
+            snapshot = {iid: dict(readings) for iid, readings in self._by_intersection.items()}
+        if max_age is None:
+            return snapshot
+        return {iid: _filter_fresh(readings, max_age) for iid, readings in snapshot.items()}
+
+    def get_arrays(self, network, max_age=None,
+                   metrics=("vehicle_count", "average_speed", "queue_length", "wait_time")):
+        """Get {metric: array} aligned with the network's approach order.
+
+        Approaches without a (fresh) reading are NaN, so vectorized consumers
+        can read the whole network's current state in one call. The
+        "timestamp" metric is returned as datetime64[us], with NaT for missing.
+        """
+        self._ensure_loaded([node.id for node in network.intersections])
+        arrays = {
+            metric: (np.full(len(network.approaches), np.datetime64('NaT'), dtype='datetime64[us]')
+                     if metric == "timestamp" else np.full(len(network.approaches), np.nan))
+            for metric in metrics
+        }
+        now = sim_clock.now()
+        cutoff_time = now - max_age if max_age is not None else None
+        approach_index = network.approach_index
+        with self._lock:
+            for key, reading in self._readings.items():
+                index = approach_index.get(key)
+                if index is None:
+                    continue
+                if cutoff_time is not None and not (reading.timestamp and cutoff_time <= reading.timestamp <= now):
+                    continue
+                for metric in metrics:
+                    arrays[metric][index] = getattr(reading, metric)
+        return arrays
+
+    def warm(self, intersection_ids=None):
+        """Load the newest reading per approach from the database for cold intersections"""
+        self._ensure_loaded(intersection_ids)
+
+    def clear(self):
+        with self._lock:
+            self._readings.clear()
+            self._by_intersection.clear()
+            self._loaded.clear()
+
+    def _ensure_loaded(self, intersection_ids):
+        with self._lock:
+            if intersection_ids is not None:
+                missing = [iid for iid in intersection_ids if iid not in self._loaded]
+                if not missing:
+                    return
+            else:
+                missing = None
+
+        rows = _load_latest_rows(missing)
+        with self._lock:
+            for row in rows:
+                key = (row["intersection_id"], row["direction"])
+                if key in self._readings:
+                    continue  # A live update arrived while loading
+                reading = LatestReading(**row)
+                self._readings[key] = reading
+                self._by_intersection.setdefault(key[0], {})[key[1]] = reading
+            if missing is not None:
+                self._loaded.update(missing)
+            else:
+                self._loaded.update(row["intersection_id"] for row in rows)
+
+
+def _filter_fresh(readings, max_age):
+    if max_age is None:
+        return dict(readings)
+    now = sim_clock.now()
+    cutoff_time = now - max_age
+    return {d: r for d, r in readings.items() if r.timestamp and cutoff_time <= r.timestamp <= now}
+
+
+def _load_latest_rows(intersection_ids=None):
+    """Load the newest TrafficData row per approach with one grouped query"""
+    try:
+        newest = select(
+            TrafficData.intersection_id,
+            TrafficData.direction,
+            func.max(TrafficData.timestamp).label("timestamp")
+        ).group_by(TrafficData.intersection_id, TrafficData.direction)
+        if intersection_ids is not None:
+            newest = newest.where(TrafficData.intersection_id.in_(intersection_ids))
+        newest = newest.subquery()
+
+        query = select(
+            TrafficData.intersection_id, TrafficData.direction, TrafficData.timestamp,
+            TrafficData.vehicle_count, TrafficData.average_speed,
+            TrafficData.queue_length, TrafficData.wait_time
+        ).join(newest, (TrafficData.intersection_id == newest.c.intersection_id) &
+                       (TrafficData.direction == newest.c.direction) &
+                       (TrafficData.timestamp == newest.c.timestamp))
+
+        return [dict(row) for row in db.session.execute(query).mappings()]
+
+    except Exception as e:
+        logger.error(f"Error loading latest traffic state: {str(e)}")
+        return []
+
+
+# Global store shared by the simulation, signal control, predictions and scenarios
+latest_state = LatestStateStore()
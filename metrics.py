@@ -0,0 +1,235 @@
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond ticks to multi-second passes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    """Base for metrics keyed by a fixed tuple of label names"""
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{self._labels(key)} {_format(value)}"
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a `with` block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format(bound)
+                yield f"{self.name}_bucket{self._labels(key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {_format(total)}"
+            yield f"{self.name}_count{self._labels(key)} {count}"
+
+
+class GaugeFunction(_Metric):
+    """Gauge read from a callback at scrape time, returning a number or {label values: number}"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.error(f"Error reading gauge {self.name}: {str(e)}")
+            return
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for key, sample in values:
+            key = key if isinstance(key, tuple) else (key,)
+            yield f"{self.name}{self._labels(tuple(str(k) for k in key))} {_format(sample)}"
+
+
+class CounterFunction(GaugeFunction):
+    """Counter read from a callback at scrape time, for components that keep their own totals"""
+    kind = "counter"
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric, replacing any earlier metric of the same name, and return it"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+# Global registry and the metrics shared by the scheduler jobs, writers and routes
+registry = MetricsRegistry()
+
+job_duration = registry.register(Histogram(
+    "traffic_job_duration_seconds", "Duration of scheduler job runs", ("job",)))
+phase_duration = registry.register(Histogram(
+    "traffic_job_phase_duration_seconds", "Duration of the phases (query, compute, commit, emit) of job runs",
+    ("job", "phase")))
+rows_written = registry.register(Counter(
+    "traffic_rows_written_total", "Rows written to the database", ("table",)))
+socket_messages = registry.register(Counter(
+    "traffic_socket_messages_total", "Socket.IO messages emitted", ("event",)))
+scheduler_events = registry.register(Counter(
+    "traffic_scheduler_job_events_total", "Scheduler runs that were missed, skipped or failed", ("job", "outcome")))
+http_duration = registry.register(Histogram(
+    "traffic_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")))
+
+
+class PhaseTimer:
+    """Times consecutive phases of one job run; each mark() closes the phase that just ended"""
+
+    __slots__ = ("job", "_last")
+
+    def __init__(self, job):
+        self.job = job
+        self._last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        phase_duration.observe(now - self._last, job=self.job, phase=phase)
+        self._last = now
+
+
+def timed_job(job):
+    """Decorator recording each call's duration in traffic_job_duration_seconds"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with job_duration.time(job=job):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_metrics(app, socketio, scheduler):
+    """Instrument HTTP requests, Socket.IO emits and scheduler job outcomes"""
+    if app.config.get("WORKER_PROCESS"):
+        return
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # Label by URL rule rather than path so the number of series stays bounded
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            http_duration.observe(time.perf_counter() - started, method=request.method,
+                                  route=route, status=response.status_code)
+        return response
+
+    # Count every emit, including flask_socketio.emit() from event handlers, which goes through this method
+    emit = socketio.emit
+
+    def counted_emit(event, *args, **kwargs):
+        socket_messages.inc(event=event)
+        return emit(event, *args, **kwargs)
+
+    socketio.emit = counted_emit
+
+    outcomes = {EVENT_JOB_MISSED: "missed", EVENT_JOB_MAX_INSTANCES: "skipped", EVENT_JOB_ERROR: "error"}
+
+    def _job_event(event):
+        scheduler_events.inc(job=event.job_id, outcome=outcomes.get(event.code, "other"))
+
+    scheduler.add_listener(_job_event, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_ERROR)
+    logger.info("Metrics instrumentation enabled")
@@ -2,60 +2,125 @@ import numpy as np
 import pandas as pd
 import logging
 import pickle
-import os
+import atexit
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from datetime import datetime, timedelta
 from app import db
-from models import TrafficData, PredictionResult, Intersection
+from models import TrafficData, PredictionResult
 from flask import current_app
+from latest_state import latest_state
+from network import get_network
+from sim_clock import sim_clock
+from metrics import CounterFunction, GaugeFunction, PhaseTimer, registry, rows_written, timed_job
+from sqlalchemy import func, insert, select
+from prediction_cache import PredictionCache
+from model_registry import ModelRegistry
+from model_training import append_trees, fit_models
+from regions import worker_context
+from features import (MODEL_FEATURES, TRAFFIC_COLUMNS, build_features, congestion_labels, iter_traffic_columns,
+                      load_training_set)
 
 logger = logging.getLogger(__name__)
 
-# Global variables to store trained models
-vehicle_count_model = None
-congestion_model = None
-model_features = ["vehicle_count", "average_speed", "queue_length", "wait_time", 
-                 "hour_of_day", "day_of_week", "is_weekend", "is_peak_hour"]
+# The served model pair and its registry version, swapped as one reference so a
+# predictor always sees a consistent pair; read it once per prediction
+ModelSet = namedtuple("ModelSet", ["vehicle_count_model", "congestion_model", "version"])
+active_models = ModelSet(None, None, None)
 
-def init_ml_models(app):
-    """Initialize ML models for traffic prediction"""
+# Versioned model artifacts; the served version's metadata carries the incremental training cursor
+model_registry = None
+training_state = {"last_trained_id": 0, "mode": None, "updated_at": None, "rows": 0}
+training_settings = {"trees_per_update": 10, "max_trees": 50, "min_rows": 100, "max_rows": 200000,
+                     "use_process": True}
+_training_lock = threading.Lock()
+_training_pool = None
+_training_pool_lock = threading.Lock()
+
+# Recent prediction results keyed by (intersection, window, model version, newest input timestamp)
+prediction_cache = PredictionCache()
+model_features = MODEL_FEATURES
+
+def init_ml_models(app, scheduler=None):
+    """Initialize ML models for traffic prediction and schedule periodic training"""
+    if app.config.get("WORKER_PROCESS"):
+        return
+    global model_registry
     with app.app_context():
         logger.info("Initializing ML models")
-        global vehicle_count_model, congestion_model
         
-        # Check if models exist and load them
-        if os.path.exists('vehicle_count_model.pkl'):
-            try:
-                with open('vehicle_count_model.pkl', 'rb') as f:
-                    vehicle_count_model = pickle.load(f)
-                logger.info("Loaded vehicle count model from file")
-            except Exception as e:
-                logger.error(f"Failed to load vehicle count model: {str(e)}")
+        prediction_cache.max_entries = app.config.get("PREDICTION_CACHE_SIZE", 10000)
+        prediction_cache.ttl = app.config.get("PREDICTION_CACHE_TTL", 60)
+        for key in ("hits", "misses", "evictions"):
+            registry.register(CounterFunction(
+                f"traffic_prediction_cache_{key}_total", f"Prediction cache {key}",
+                lambda key=key: prediction_cache.stats[key]))
+        registry.register(GaugeFunction(
+            "traffic_prediction_cache_entries", "Prediction results held in the cache", lambda: len(prediction_cache)))
         
-        if os.path.exists('congestion_model.pkl'):
-            try:
-                with open('congestion_model.pkl', 'rb') as f:
-                    congestion_model = pickle.load(f)
-                logger.info("Loaded congestion model from file")
-            except Exception as e:
-                logger.error(f"Failed to load congestion model: {str(e)}")
+        training_settings.update(
+            trees_per_update=app.config.get("ML_TREES_PER_UPDATE", 10),
+            max_trees=app.config.get("ML_MAX_TREES", 50),
+            min_rows=app.config.get("ML_INCREMENTAL_MIN_ROWS", 100),
+            max_rows=app.config.get("ML_INCREMENTAL_MAX_ROWS", 200000),
+            use_process=app.config.get("ML_TRAINING_PROCESS", True)
+        )
+        model_registry = ModelRegistry(app.config.get("ML_REGISTRY_DIR", "model_registry"),
+                                       keep=app.config.get("ML_REGISTRY_KEEP", 20))
         
-        # If models don't exist, train them with available data
-        if vehicle_count_model is None or congestion_model is None:
-            # Check if we have enough data to train models
-            data_count = TrafficData.query.count()
+        # Serve the registry's current version without rewriting CURRENT; seed the registry on first start
+        current = model_registry.current()
+        if current is not None:
+            result = load_model_version(current)
+            if "error" in result:
+                current = None
+        if current is None:
+            _seed_registry()
+        
+        # Training runs in the background: incremental updates consume only rows added since the
+        # served version's cursor, and a version never trained on real data is replaced right away
+        interval = app.config.get("ML_TRAINING_INTERVAL", 15)
+        if scheduler is not None and interval:
+            mode = app.config.get("ML_TRAINING_MODE", "incremental")
             
-            if data_count > 100:  # Arbitrary threshold for minimal training data
-                train_models()
-            else:
-                # Create simple baseline models if not enough data
-                create_baseline_models()
-                logger.info("Created baseline models (not enough data for training)")
+            def train_models_with_app_context():
+                with app.app_context():
+                    run_training(mode)
+            
+            untrained = training_state["last_trained_id"] == 0
+            scheduler.add_job(
+                train_models_with_app_context,
+                'interval',
+                minutes=interval,
+                id='model_training',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+                **({'next_run_time': datetime.now()} if untrained else {})
+            )
+            logger.info(f"Scheduled {mode} model training every {interval} minutes")
+
+def _seed_registry():
+    """Publish the bundled model files, or baseline models, as the first version"""
+    models = []
+    for path in ('vehicle_count_model.pkl', 'congestion_model.pkl'):
+        try:
+            with open(path, 'rb') as f:
+                models.append(pickle.load(f))
+            logger.info(f"Loaded {path}")
+        except Exception as e:
+            logger.error(f"Failed to load {path}: {str(e)}")
+    if len(models) == 2:
+        _publish_and_activate(models[0], models[1], {"mode": "bundled", "rows": 0, "last_trained_id": 0})
+    else:
+        create_baseline_models()
+        logger.info("Created baseline models (no saved models available)")
 
 def create_baseline_models():
     """Create simple baseline models when not enough data is available"""
-    global vehicle_count_model, congestion_model
-    
     # For vehicle count prediction, use a simple random forest with dummy data
     X_dummy = np.random.rand(100, len(model_features))
     y_dummy_count = np.random.randint(5, 50, 100)  # Random vehicle counts between 5-50
@@ -69,131 +134,253 @@ def create_baseline_models():
     congestion_model = RandomForestClassifier(n_estimators=10, max_depth=3)
     congestion_model.fit(X_dummy, y_dummy_congestion)
     
-    # Save the baseline models
-    with open('vehicle_count_model.pkl', 'wb') as f:
-        pickle.dump(vehicle_count_model, f)
-    
-    with open('congestion_model.pkl', 'wb') as f:
-        pickle.dump(congestion_model, f)
+    # Baselines have seen no real data, so incremental training starts from the first row
+    return _publish_and_activate(vehicle_count_model, congestion_model,
+                                 {"mode": "baseline", "rows": 0, "last_trained_id": 0})
 
 def train_models():
-    """Train ML models using historical traffic data"""
-    global vehicle_count_model, congestion_model
+    """Train ML models on the last 24 hours of traffic data and serve the new version"""
+    return run_training("full")
+
+def update_models_incremental():
+    """Update the models with only the TrafficData rows added since the served version's cursor"""
+    return run_training("incremental")
+
+@timed_job('model_training')
+def run_training(mode="incremental"):
+    """Train a new model version off-thread and switch serving to it.
     
+    Training rows are streamed in this thread; fitting runs in a separate
+    worker process, so predictions keep running at full speed meanwhile and
+    only the finished pair is swapped in. "full" refits on the last 24 hours;
+    "incremental" fits a small forest on the rows past the served version's
+    cursor and appends its trees, keeping the newest `max_trees`, so cost
+    scales with the new rows. A run reads at most `max_rows`; when more are
+    waiting, the oldest are skipped (and recorded) so the cursor never falls
+    behind and the update always reflects recent traffic. Each run publishes
+    a registry version with its training window, row count and metrics.
+    Returns a summary dict; a run is skipped while another is in progress.
+    """
+    if not _training_lock.acquire(blocking=False):
+        return {"status": "skipped", "message": "Training already in progress"}
     try:
-        # Get historical data (last 24 hours)
-        cutoff_time = datetime.now() - timedelta(hours=24)
-        traffic_data = TrafficData.query.filter(TrafficData.timestamp >= cutoff_time).all()
-        
-        if len(traffic_data) < 100:
-            logger.warning(f"Only {len(traffic_data)} data points available, using baseline models")
-            create_baseline_models()
-            return
-        
-        # Prepare training data
-        df = pd.DataFrame([{
-            'vehicle_count': data.vehicle_count,
-            'average_speed': data.average_speed,
-            'queue_length': data.queue_length,
-            'wait_time': data.wait_time,
-            'direction': data.direction,
-            'intersection_id': data.intersection_id,
-            'timestamp': data.timestamp
-        } for data in traffic_data])
-        
-        # Feature engineering
-        df['hour_of_day'] = df['timestamp'].dt.hour
-        df['day_of_week'] = df['timestamp'].dt.dayofweek
-        df['is_weekend'] = df['day_of_week'].apply(lambda x: 1 if x >= 5 else 0)
-        df['is_peak_hour'] = df['hour_of_day'].apply(lambda x: 1 if (7 <= x < 10) or (16 <= x < 19) else 0)
-        
-        # Define congestion based on wait time and queue length
-        # This is a simplification - in a real system, this would be more complex
-        df['is_congested'] = ((df['wait_time'] > 45) & (df['queue_length'] > 10)).astype(int)
-        
-        # Prepare features and target variables
-        X = df[model_features].values
-        y_count = df['vehicle_count'].values
-        y_congestion = df['is_congested'].values
-        
-        # Train vehicle count prediction model
-        vehicle_count_model = RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42)
-        vehicle_count_model.fit(X, y_count)
-        
-        # Train congestion detection model
-        congestion_model = RandomForestClassifier(n_estimators=50, max_depth=10, random_state=42)
-        congestion_model.fit(X, y_congestion)
-        
-        # Save the trained models
-        with open('vehicle_count_model.pkl', 'wb') as f:
-            pickle.dump(vehicle_count_model, f)
-        
-        with open('congestion_model.pkl', 'wb') as f:
-            pickle.dump(congestion_model, f)
-        
-        logger.info("Successfully trained ML models with historical data")
+        phases = PhaseTimer('model_training')
+        served = active_models
+        first_id = training_state["last_trained_id"] if mode == "incremental" else 0
+        if mode == "full":
+            since = sim_clock.now() - timedelta(hours=24)
+            last_id = db.session.execute(select(func.max(TrafficData.id))).scalar() or 0
+            X, y_count, y_congestion, _ = load_training_set(until_id=last_id, since=since)
+            min_rows = 100
+        else:
+            since = None
+            # Never fall behind: when more rows arrived than one run may read, skip the oldest so
+            # the update learns from the newest traffic
+            max_rows = training_settings["max_rows"]
+            newest_id = db.session.execute(select(func.max(TrafficData.id))).scalar() or 0
+            start_id = max(first_id, newest_id - max_rows)
+            skipped = {"after_id": first_id, "last_id": start_id} if start_id > first_id else None
+            if skipped:
+                logger.warning(f"Incremental training is {newest_id - first_id} rows behind; "
+                               f"skipping ids {first_id + 1}-{start_id} and training on the newest {max_rows}")
+            X, y_count, y_congestion, last_id = load_training_set(after_id=start_id, until_id=newest_id,
+                                                                  limit=max_rows)
+            min_rows = training_settings["min_rows"]
+        phases.mark('query')
+        
+        if len(X) < min_rows:
+            if mode == "full":
+                logger.warning(f"Only {len(X)} data points available, using baseline models")
+                return create_baseline_models()
+            return {"status": "skipped", "new_rows": len(X), "last_trained_id": first_id}
+        
+        if mode == "full":
+            count_model, congestion_model, metrics = _run_in_training_process(
+                fit_models, X, y_count, y_congestion, 50, 10, 42, True)
+        else:
+            n_trees = training_settings["trees_per_update"]
+            count_forest, congestion_forest, metrics = _run_in_training_process(
+                fit_models, X, y_count, y_congestion, n_trees, 10, last_id % 2**31, False,
+                (served.vehicle_count_model, served.congestion_model))
+            max_trees = training_settings["max_trees"]
+            count_model = append_trees(served.vehicle_count_model, count_forest, max_trees)
+            congestion_model = append_trees(served.congestion_model, congestion_forest, max_trees)
+        phases.mark('fit')
+        
+        result = _publish_and_activate(count_model, congestion_model, {
+            "mode": mode,
+            "parent": served.version if mode == "incremental" else None,
+            "training_window": {
+                "after_id": first_id if mode == "full" else start_id,
+                "skipped": skipped if mode == "incremental" else None,
+                "last_id": int(last_id),
+                "since": since.isoformat() if since else None,
+                "until": sim_clock.now().isoformat()
+            },
+            "rows": len(X),
+            "last_trained_id": int(last_id),
+            "trees": len(count_model.estimators_),
+            "metrics": metrics
+        })
+        phases.mark('publish')
+        logger.info(f"Trained model version {result.get('version')} ({mode}) on {len(X)} rows")
+        return result
         
     except Exception as e:
         logger.error(f"Error training ML models: {str(e)}")
-        create_baseline_models()
+        return {"status": "error", "message": str(e)}
+    finally:
+        _training_lock.release()
 
+def _run_in_training_process(func, *args):
+    """Run `func(*args)` in the training worker process, or inline when ML_TRAINING_PROCESS is off"""
+    global _training_pool
+    if not training_settings["use_process"]:
+        return func(*args)
+    with _training_pool_lock:
+        if _training_pool is None:
+            _training_pool = ProcessPoolExecutor(max_workers=1, mp_context=worker_context)
+            atexit.register(shutdown_training_pool)
+        pool = _training_pool
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool:
+        # Start a fresh worker next time
+        shutdown_training_pool()
+        raise
+
+def shutdown_training_pool():
+    """Stop the training worker process"""
+    global _training_pool
+    with _training_pool_lock:
+        if _training_pool is not None:
+            _training_pool.shutdown(wait=False, cancel_futures=True)
+            _training_pool = None
+
+def _publish_and_activate(vehicle_count_model, congestion_model, metadata):
+    """Publish a model pair as a new registry version and serve it"""
+    metadata = dict(metadata, created_at=datetime.utcnow().isoformat(), features=list(model_features))
+    models = {"vehicle_count_model": vehicle_count_model, "congestion_model": congestion_model}
+    version = model_registry.publish(models, metadata)
+    _serve(vehicle_count_model, congestion_model, dict(metadata, version=version))
+    model_registry.set_current(version)
+    return {"status": "success", **metadata, "version": version}
+
+def _serve(vehicle_count_model, congestion_model, metadata):
+    """Switch predictions to a model pair in one assignment"""
+    global active_models
+    active_models = ModelSet(vehicle_count_model, congestion_model, metadata["version"])
+    training_state.update(last_trained_id=metadata.get("last_trained_id", 0), mode=metadata.get("mode"),
+                          updated_at=metadata.get("created_at"), rows=metadata.get("rows", 0))
+    # Entries for the old version can no longer be hit; free them
+    prediction_cache.clear()
+
+def load_model_version(version):
+    """Serve a published model version in this process only; CURRENT is left unchanged"""
+    try:
+        models, metadata = model_registry.load(version)
+        _serve(models["vehicle_count_model"], models["congestion_model"], metadata)
+        logger.info(f"Serving model version {version}")
+        return metadata
+    except Exception as e:
+        logger.error(f"Error loading model version {version}: {str(e)}")
+        return {"error": str(e)}
+
+def activate_model_version(version):
+    """Serve a published model version and make it the one served after a restart, e.g. to roll back"""
+    metadata = load_model_version(version)
+    if "error" in metadata:
+        return metadata
+    try:
+        model_registry.set_current(version)
+    except Exception as e:
+        logger.error(f"Error activating model version {version}: {str(e)}")
+        return {"error": str(e)}
+    return metadata
+
+def rollback_models():
+    """Serve the version published before the current one"""
+    previous = model_registry.previous(active_models.version) if active_models.version else None
+    if previous is None:
+        return {"error": "No earlier model version to roll back to"}
+    return activate_model_version(previous)
+
+def get_model_versions():
+    """Metadata of every registered model version and the one being served"""
+    try:
+        versions = []
+        for version in model_registry.versions():
+            try:
+                versions.append(model_registry.metadata(version))
+            except Exception as e:
+                logger.error(f"Error reading metadata of model version {version}: {str(e)}")
+        return {
+            "current": active_models.version,
+            "training": _training_lock.locked(),
+            "versions": versions
+        }
+    except Exception as e:
+        logger.error(f"Error listing model versions: {str(e)}")
+        return {"error": str(e)}
+
+def _predict_rows(models, features):
+    """Predict vehicle counts and congestion probabilities for every row with one call per model"""
+    predicted_counts = models.vehicle_count_model.predict(features).astype(int)
+    probabilities = models.congestion_model.predict_proba(features)
+    classes = list(models.congestion_model.classes_)
+    congestion_probs = probabilities[:, classes.index(1)] if 1 in classes else np.zeros(len(features))
+    return predicted_counts, congestion_probs
+
+def _cache_key(intersection_id, prediction_window, version, newest_input):
+    """Cache key for one intersection's predictions; `newest_input` is the newest reading timestamp"""
+    return (intersection_id, prediction_window, version, int(np.datetime64(newest_input, 'us').astype(np.int64)))
+
+@timed_job('predict_traffic')
 def predict_traffic(intersection_id, prediction_window=15):
     """Make traffic predictions for a specific intersection"""
     try:
-        # Get recent traffic data
-        cutoff_time = datetime.now() - timedelta(minutes=30)
-        recent_data = TrafficData.query.filter(
-            TrafficData.intersection_id == intersection_id,
-            TrafficData.timestamp >= cutoff_time
-        ).order_by(TrafficData.timestamp.desc()).all()
+        phases = PhaseTimer('predict_traffic')
+        models = active_models
+        # Get the newest reading per direction from the latest-state store
+        recent_data = latest_state.get_intersection(intersection_id, max_age=timedelta(minutes=30))
         
         if not recent_data:
             return {"error": "Not enough recent data for prediction"}
         
         # Get the intersection
-        intersection = Intersection.query.get(intersection_id)
+        intersection = get_network().get_intersection(intersection_id)
         if not intersection:
             return {"error": "Intersection not found"}
+        phases.mark('query')
+        
+        # Serve repeated requests from the cache until a newer reading or model arrives
+        cache_key = _cache_key(intersection_id, prediction_window, models.version,
+                               max(reading.timestamp for reading in recent_data.values()))
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Group data by direction
-        directions = set(data.direction for data in recent_data)
         predictions = []
         
-        for direction in directions:
-            # Get most recent data point for this direction
-            direction_data = [d for d in recent_data if d.direction == direction]
-            if not direction_data:
-                continue
+        # Make predictions for all directions using both models, one call each
+        if models.vehicle_count_model is not None and models.congestion_model is not None:
+            now = sim_clock.now()
+            directions = list(recent_data)
+            readings = [recent_data[direction] for direction in directions]
+            features = build_features(
+                [r.vehicle_count for r in readings], [r.average_speed for r in readings],
+                [r.queue_length for r in readings], [r.wait_time for r in readings], now
+            )
+            predicted_counts, congestion_probs = _predict_rows(models, features)
             
-            latest_data = direction_data[0]
-            
-            # Prepare features for prediction
-            now = datetime.now()
-            hour_of_day = now.hour
-            day_of_week = now.weekday()
-            is_weekend = 1 if day_of_week >= 5 else 0
-            is_peak_hour = 1 if (7 <= hour_of_day < 10) or (16 <= hour_of_day < 19) else 0
-            
-            features = np.array([[
-                latest_data.vehicle_count,
-                latest_data.average_speed,
-                latest_data.queue_length,
-                latest_data.wait_time,
-                hour_of_day,
-                day_of_week,
-                is_weekend,
-                is_peak_hour
-            ]])
-            
-            # Make predictions using both models
-            if vehicle_count_model and congestion_model:
-                predicted_count = int(vehicle_count_model.predict(features)[0])
-                congestion_prob = congestion_model.predict_proba(features)[0][1]  # Probability of class 1 (congested)
+            for direction, predicted_count, congestion_prob in zip(directions, predicted_counts.tolist(),
+                                                                   congestion_probs.tolist()):
                 predicted_congestion = congestion_prob > 0.5
                 
                 # Store prediction in database
                 prediction = PredictionResult(
                     intersection_id=intersection_id,
+                    timestamp=now,
                     prediction_window=prediction_window,
                     predicted_vehicle_count=predicted_count,
                     predicted_congestion=predicted_congestion,
@@ -210,23 +397,130 @@ def predict_traffic(intersection_id, prediction_window=15):
                     'prediction_window': prediction_window
                 })
         
+        phases.mark('compute')
         db.session.commit()
-        return {
+        rows_written.inc(len(predictions), table='prediction_result')
+        phases.mark('commit')
+        result = {
             'intersection_id': intersection_id,
             'intersection_name': intersection.name,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': sim_clock.now().isoformat(),
             'predictions': predictions
         }
+        prediction_cache.put(cache_key, result)
+        return result
         
     except Exception as e:
         logger.error(f"Error making traffic predictions: {str(e)}")
         db.session.rollback()
         return {"error": str(e)}
 
+@timed_job('predict_network')
+def predict_network(prediction_window=15):
+    """Make traffic predictions for every approach in the network in one batch.
+    
+    Builds one feature matrix from the latest-state store, makes one predict
+    call per model and writes all PredictionResult rows in one bulk insert.
+    Intersections whose cached predictions are still current (same model and
+    newest reading) are served from the cache and skip inference and the
+    write. Returns per-intersection results shaped like predict_traffic's.
+    """
+    try:
+        phases = PhaseTimer('predict_network')
+        models = active_models
+        now = sim_clock.now()
+        network = get_network()
+        readings = latest_state.get_arrays(
+            network, max_age=timedelta(minutes=30),
+            metrics=("vehicle_count", "average_speed", "queue_length", "wait_time", "timestamp"))
+        fresh = ~np.isnan(readings["vehicle_count"]) & ~np.isnan(readings["wait_time"])
+        phases.mark('query')
+        
+        if not fresh.any() or models.vehicle_count_model is None or models.congestion_model is None:
+            return {"timestamp": now.isoformat(), "prediction_window": prediction_window, "intersections": []}
+        
+        # Newest input reading per intersection, then split cached intersections from those to predict
+        intersection = network.approach_intersection_index
+        newest = np.full(len(network.intersections), np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(newest, intersection[fresh], readings["timestamp"][fresh].astype(np.int64))
+        cached_results = {}
+        cache_keys = {}
+        for index in np.flatnonzero(newest > np.iinfo(np.int64).min).tolist():
+            key = (network.intersections[index].id, prediction_window, models.version, int(newest[index]))
+            cached = prediction_cache.get(key)
+            if cached is not None:
+                cached_results[index] = cached
+            else:
+                cache_keys[index] = key
+        needed = np.zeros(len(network.intersections), dtype=bool)
+        needed[list(cache_keys)] = True
+        approaches = np.flatnonzero(fresh & needed[intersection])
+        if not len(approaches):
+            return {
+                "timestamp": now.isoformat(),
+                "prediction_window": prediction_window,
+                "intersections": [cached_results[index] for index in sorted(cached_results)]
+            }
+        
+        features = build_features(
+            readings["vehicle_count"][approaches], readings["average_speed"][approaches],
+            readings["queue_length"][approaches], readings["wait_time"][approaches], now
+        )
+        predicted_counts, congestion_probs = _predict_rows(models, features)
+        
+        rows = []
+        by_intersection = {}
+        for index, predicted_count, congestion_prob in zip(approaches.tolist(), predicted_counts.tolist(),
+                                                           congestion_probs.tolist()):
+            approach = network.approaches[index]
+            rows.append({
+                'intersection_id': approach.intersection_id,
+                'timestamp': now,
+                'prediction_window': prediction_window,
+                'predicted_vehicle_count': predicted_count,
+                'predicted_congestion': congestion_prob > 0.5,
+                'confidence': congestion_prob,
+                'direction': approach.direction
+            })
+            by_intersection.setdefault(approach.intersection_index, []).append({
+                'direction': approach.direction,
+                'predicted_vehicle_count': predicted_count,
+                'predicted_congestion': congestion_prob > 0.5,
+                'confidence': congestion_prob,
+                'prediction_window': prediction_window
+            })
+        phases.mark('compute')
+        
+        db.session.execute(insert(PredictionResult), rows)
+        db.session.commit()
+        rows_written.inc(len(rows), table='prediction_result')
+        phases.mark('commit')
+        
+        results = dict(cached_results)
+        for index, predictions in by_intersection.items():
+            results[index] = {
+                'intersection_id': network.intersections[index].id,
+                'intersection_name': network.intersections[index].name,
+                'timestamp': now.isoformat(),
+                'predictions': predictions
+            }
+            prediction_cache.put(cache_keys[index], results[index])
+        
+        return {
+            "timestamp": now.isoformat(),
+            "prediction_window": prediction_window,
+            "intersections": [results[index] for index in sorted(results)]
+        }
+        
+    except Exception as e:
+        logger.error(f"Error making network predictions: {str(e)}")
+        db.session.rollback()
+        return {"error": str(e)}
+
 def get_recent_predictions(intersection_id=None, minutes=30):
     """Get recent predictions for one or all intersections"""
     try:
-        cutoff_time = datetime.now() - timedelta(minutes=minutes)
+        cutoff_time = sim_clock.now() - timedelta(minutes=minutes)
         
         if intersection_id:
             predictions = PredictionResult.query.filter(
@@ -248,62 +542,61 @@ def evaluate_model_accuracy():
     """Evaluate the accuracy of ML models using recent data"""
     try:
         # Get predictions from the last hour
-        cutoff_time = datetime.now() - timedelta(hours=1)
-        predictions = PredictionResult.query.filter(
-            PredictionResult.timestamp >= cutoff_time
-        ).all()
+        now = sim_clock.now()
+        cutoff_time = now - timedelta(hours=1)
+        predictions = pd.DataFrame(db.session.execute(
+            select(PredictionResult.intersection_id, PredictionResult.direction, PredictionResult.timestamp,
+                   PredictionResult.prediction_window, PredictionResult.predicted_vehicle_count,
+                   PredictionResult.predicted_congestion)
+            .where(PredictionResult.timestamp >= cutoff_time)
+        ).all(), columns=['intersection_id', 'direction', 'prediction_time', 'prediction_window',
+                          'predicted_count', 'predicted_congestion'])
         
-        if not predictions:
+        if predictions.empty:
             return {"error": "No recent predictions available for evaluation"}
         
-        # For each prediction, get the actual data from when the prediction window elapsed
-        results = []
-        for pred in predictions:
-            # Calculate when the prediction was for
-            target_time = pred.timestamp + timedelta(minutes=pred.prediction_window)
-            
-            # Skip predictions that haven't materialized yet
-            if target_time > datetime.now():
-                continue
-            
-            # Get actual data closest to the target time
-            actual_data = TrafficData.query.filter(
-                TrafficData.intersection_id == pred.intersection_id,
-                TrafficData.direction == pred.direction,
-                TrafficData.timestamp >= target_time - timedelta(minutes=2),
-                TrafficData.timestamp <= target_time + timedelta(minutes=2)
-            ).order_by(abs(db.func.julianday(TrafficData.timestamp) - db.func.julianday(target_time))).first()
-            
-            if not actual_data:
-                continue
-            
-            # Calculate prediction error and accuracy
-            count_error = abs(pred.predicted_vehicle_count - actual_data.vehicle_count)
-            count_accuracy = max(0, 1 - (count_error / max(1, actual_data.vehicle_count)))
-            
-            # For congestion, determine if actual data showed congestion
-            actual_congestion = (actual_data.wait_time > 45) and (actual_data.queue_length > 10)
-            congestion_correct = (pred.predicted_congestion == actual_congestion)
-            
-            results.append({
-                'intersection_id': pred.intersection_id,
-                'direction': pred.direction,
-                'prediction_time': pred.timestamp.isoformat(),
-                'target_time': target_time.isoformat(),
-                'predicted_count': pred.predicted_vehicle_count,
-                'actual_count': actual_data.vehicle_count,
-                'count_accuracy': count_accuracy,
-                'predicted_congestion': pred.predicted_congestion,
-                'actual_congestion': actual_congestion,
-                'congestion_correct': congestion_correct
-            })
+        # Calculate when each prediction was for, skipping those that haven't materialized yet
+        predictions['target_time'] = (predictions['prediction_time'].astype('datetime64[us]')
+                                      + pd.to_timedelta(predictions['prediction_window'], unit='m'))
+        predictions = predictions[predictions['target_time'] <= now]
+        if predictions.empty:
+            return {"error": "No completed predictions available for evaluation"}
+        
+        # Stream the actual readings around the targets and match each prediction to the closest
+        # reading for its approach within two minutes
+        tolerance = timedelta(minutes=2)
+        columns = {name: TRAFFIC_COLUMNS[name] for name in
+                   ("id", "intersection_id", "direction", "vehicle_count", "queue_length", "wait_time", "timestamp")}
+        chunks = list(iter_traffic_columns(since=predictions['target_time'].min() - tolerance,
+                                           until=predictions['target_time'].max() + tolerance, columns=columns))
+        if not chunks:
+            return {"error": "No completed predictions available for evaluation"}
+        actual = pd.DataFrame({name: np.concatenate([chunk[name] for chunk in chunks]) for name in columns})
+        matched = pd.merge_asof(
+            predictions.sort_values('target_time'), actual.sort_values('timestamp'),
+            left_on='target_time', right_on='timestamp', by=['intersection_id', 'direction'],
+            direction='nearest', tolerance=pd.Timedelta(tolerance)
+        ).dropna(subset=['timestamp'])
+        
+        # Calculate prediction error and accuracy
+        actual_count = matched['vehicle_count'].to_numpy()
+        count_error = np.abs(matched['predicted_count'].to_numpy() - actual_count)
+        matched['count_accuracy'] = np.maximum(0, 1 - count_error / np.maximum(1, actual_count))
+        matched['actual_count'] = actual_count.astype(int)
+        matched['actual_congestion'] = congestion_labels(matched['wait_time'], matched['queue_length']).astype(bool)
+        matched['congestion_correct'] = matched['predicted_congestion'].astype(bool) == matched['actual_congestion']
+        matched['prediction_time'] = matched['prediction_time'].map(datetime.isoformat)
+        matched['target_time'] = matched['target_time'].map(datetime.isoformat)
+        results = matched[['intersection_id', 'direction', 'prediction_time', 'target_time', 'predicted_count',
+                           'actual_count', 'count_accuracy', 'predicted_congestion', 'actual_congestion',
+                           'congestion_correct']].to_dict('records')
         
         # Calculate overall accuracy
         if not results:
             return {"error": "No completed predictions available for evaluation"}
         
-        count_accuracy = sum(r['count_accuracy'] for r in results) / len(results)
-        congestion_accuracy = sum(1 for r in results if r['congestion_correct']) / len(results)
+        count_accuracy = float(matched['count_accuracy'].mean())
+        congestion_accuracy = float(matched['congestion_correct'].mean())
         
         return {
             'count_accuracy': count_accuracy,
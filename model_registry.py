@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+MODELS_FILE = "models.pkl"
+METADATA_FILE = "metadata.json"
+
+
+class ModelRegistry:
+    """Versioned model artifacts in a local directory with an atomically switched current version.
+
+    Each version is a directory (v000001, v000002, ...) holding the pickled
+    models and a metadata.json. It is written under a temporary name and
+    renamed into place, so a version is either complete or absent. The
+    CURRENT file names the served version and is replaced atomically. Older
+    versions stay until more than `keep` exist, so serving can roll back.
+    """
+
+    def __init__(self, root="model_registry", keep=20):
+        self.root = root
+        self.keep = keep
+        os.makedirs(root, exist_ok=True)
+
+    def versions(self):
+        """Version ids, oldest first"""
+        return sorted(name for name in os.listdir(self.root)
+                      if name.startswith("v") and name[1:].isdigit()
+                      and os.path.isdir(os.path.join(self.root, name)))
+
+    def publish(self, models, metadata):
+        """Write a new version and return its id; it is not served until set_current()"""
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+        try:
+            while True:
+                existing = self.versions()
+                version = f"v{int(existing[-1][1:]) + 1 if existing else 1:06d}"
+                metadata = dict(metadata, version=version)
+                with open(os.path.join(staging, MODELS_FILE), "wb") as f:
+                    pickle.dump(models, f)
+                with open(os.path.join(staging, METADATA_FILE), "w") as f:
+                    json.dump(metadata, f, indent=2)
+                try:
+                    # Renaming onto an existing version fails, so concurrent publishers never collide
+                    os.rename(staging, os.path.join(self.root, version))
+                    return version
+                except OSError:
+                    if not os.path.exists(os.path.join(self.root, version)):
+                        raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _path(self, version, name=""):
+        """Path inside a published version; ids that are not published versions are rejected"""
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version {version}")
+        return os.path.join(self.root, version, name)
+
+    def load(self, version):
+        """Load a version's models and metadata"""
+        with open(self._path(version, MODELS_FILE), "rb") as f:
+            models = pickle.load(f)
+        return models, self.metadata(version)
+
+    def metadata(self, version):
+        with open(self._path(version, METADATA_FILE)) as f:
+            return json.load(f)
+
+    def current(self):
+        """Id of the served version, or None"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version if os.path.isdir(os.path.join(self.root, version)) else None
+
+    def set_current(self, version):
+        """Atomically point CURRENT at `version` and prune the oldest versions"""
+        self._path(version)
+        temporary = os.path.join(self.root, CURRENT_FILE + ".tmp")
+        with open(temporary, "w") as f:
+            f.write(version)
+        os.replace(temporary, os.path.join(self.root, CURRENT_FILE))
+        self.prune()
+
+    def previous(self, version):
+        """The version published before `version`, or None"""
+        older = [v for v in self.versions() if v < version]
+        return older[-1] if older else None
+
+    def prune(self):
+        """Delete the oldest versions beyond `keep`, never the current one"""
+        current = self.current()
+        versions = self.versions()
+        for version in versions[:max(0, len(versions) - self.keep)]:
+            if version != current:
+                shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+                logger.info(f"Pruned model version {version}")
@@ -0,0 +1,74 @@
+import copy
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+# Runs inside the training worker process. This module imports only NumPy and scikit-learn, but a
+# spawned worker still re-imports the server's main module first (the whole app under python main.py),
+# which is why workers start with regions.WORKER_ENVIRONMENT
+
+
+def fit_models(X, y_count, y_congestion, n_estimators, max_depth=10, random_state=None, oob_score=False,
+               previous=None):
+    """Fit the vehicle-count and congestion forests and return them with their metrics.
+
+    With `oob_score` the metrics include out-of-bag R² and accuracy. With
+    `previous` (the served model pair) they include that pair's error on
+    these rows before training on them, i.e. how well it predicted new data.
+    """
+    metrics = {}
+    if previous is not None:
+        metrics.update(score_models(previous[0], previous[1], X, y_count, y_congestion))
+
+    count_forest = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                         random_state=random_state, oob_score=oob_score)
+    count_forest.fit(X, y_count)
+    congestion_forest = fit_congestion_forest(X, y_congestion, n_estimators, max_depth, random_state, oob_score)
+
+    if oob_score:
+        metrics["oob_count_r2"] = float(count_forest.oob_score_)
+        metrics["oob_congestion_accuracy"] = float(congestion_forest.oob_score_)
+    return count_forest, congestion_forest, metrics
+
+
+def fit_congestion_forest(X, y, n_estimators, max_depth=10, random_state=None, oob_score=False):
+    """Fit a congestion forest that always knows both classes, so its trees can join any ensemble.
+
+    A class missing from the batch is added as a zero-weight row; it fixes the
+    class list without influencing any split.
+    """
+    missing = [label for label in (0, 1) if label not in set(y.tolist())]
+    weights = np.ones(len(y))
+    if missing:
+        X = np.vstack([X, np.repeat(X[:1], len(missing), axis=0)])
+        y = np.concatenate([y, missing])
+        weights = np.concatenate([weights, np.zeros(len(missing))])
+    forest = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=random_state,
+                                    oob_score=oob_score)
+    forest.fit(X, y, sample_weight=weights)
+    return forest
+
+
+def score_models(count_model, congestion_model, X, y_count, y_congestion):
+    """Mean absolute vehicle-count error and congestion accuracy of a model pair on labelled rows"""
+    probabilities = congestion_model.predict_proba(X)
+    classes = list(congestion_model.classes_)
+    congested = probabilities[:, classes.index(1)] > 0.5 if 1 in classes else np.zeros(len(X), dtype=bool)
+    return {
+        "count_mae": float(np.mean(np.abs(count_model.predict(X) - y_count))),
+        "congestion_accuracy": float(np.mean(congested == y_congestion.astype(bool))),
+    }
+
+
+def append_trees(model, forest, max_trees):
+    """Return a copy of `model` with `forest`'s trees appended, keeping the newest `max_trees`"""
+    compatible = (
+        type(model) is type(forest)
+        and getattr(model, "n_features_in_", None) == forest.n_features_in_
+        and np.array_equal(getattr(model, "classes_", None), getattr(forest, "classes_", None))
+    )
+    if not compatible:
+        return forest
+    merged = copy.copy(model)
+    merged.estimators_ = (list(model.estimators_) + list(forest.estimators_))[-max_trees:]
+    merged.n_estimators = len(merged.estimators_)
+    return merged
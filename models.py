@@ -37,6 +37,7 @@ class TrafficSignal(db.Model):
     def to_dict(self):
         return {
             'id': self.id,
+            'intersection_id': self.intersection_id,
             'direction': self.direction,
             'state': self.current_state,
             'cycle_time': self.current_cycle_time,
@@ -44,6 +45,39 @@ class TrafficSignal(db.Model):
         }
 
 
+class SignalEvent(db.Model):
+    """Append-only log of traffic signal state transitions in a compact encoding"""
+    __table_args__ = (
+        db.Index('ix_signal_event_signal_time', 'signal_id', 'timestamp_ms'),
+        db.Index('ix_signal_event_time', 'timestamp_ms'),
+    )
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    signal_id = db.Column(db.Integer, db.ForeignKey('traffic_signal.id'), nullable=False)
+    state = db.Column(db.SmallInteger, nullable=False)  # 0 red, 1 yellow, 2 green
+    cycle_time = db.Column(db.SmallInteger, nullable=False)  # in seconds
+    timestamp_ms = db.Column(db.BigInteger, nullable=False)  # simulated time, epoch milliseconds
+    source = db.Column(db.SmallInteger, nullable=False, default=0)  # 0 controller, 1 manual override
+
+
+class RoadLink(db.Model):
+    """Directed road segment connecting two intersections"""
+    id = db.Column(db.Integer, primary_key=True)
+    from_intersection_id = db.Column(db.Integer, db.ForeignKey('intersection.id'), nullable=False, index=True)
+    to_intersection_id = db.Column(db.Integer, db.ForeignKey('intersection.id'), nullable=False, index=True)
+    to_direction = db.Column(db.String(20), nullable=False)  # Approach the link feeds at the downstream intersection
+    length_m = db.Column(db.Float)  # in meters
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'from_intersection_id': self.from_intersection_id,
+            'to_intersection_id': self.to_intersection_id,
+            'to_direction': self.to_direction,
+            'length_m': self.length_m
+        }
+
+
 class TrafficData(db.Model):
     """Traffic data collected at an intersection"""
     id = db.Column(db.Integer, primary_key=True)
@@ -69,6 +103,50 @@ class TrafficData(db.Model):
         }
 
 
+class TrafficRollup(db.Model):
+    """Time-bucketed aggregates of TrafficData per intersection and direction"""
+    __table_args__ = (
+        db.UniqueConstraint('bucket_seconds', 'intersection_id', 'direction', 'bucket_start',
+                            name='uq_traffic_rollup_bucket'),
+        db.Index('ix_traffic_rollup_window', 'bucket_seconds', 'bucket_start'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_seconds = db.Column(db.Integer, nullable=False)  # 60, 900 or 3600
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    intersection_id = db.Column(db.Integer, db.ForeignKey('intersection.id'), nullable=False)
+    direction = db.Column(db.String(20), nullable=False)
+    sample_count = db.Column(db.Integer, default=0)
+    vehicle_count_sum = db.Column(db.Float, default=0.0)
+    vehicle_count_min = db.Column(db.Float)
+    vehicle_count_max = db.Column(db.Float)
+    average_speed_sum = db.Column(db.Float, default=0.0)
+    average_speed_min = db.Column(db.Float)
+    average_speed_max = db.Column(db.Float)
+    queue_length_sum = db.Column(db.Float, default=0.0)
+    queue_length_min = db.Column(db.Float)
+    queue_length_max = db.Column(db.Float)
+    wait_time_sum = db.Column(db.Float, default=0.0)
+    wait_time_min = db.Column(db.Float)
+    wait_time_max = db.Column(db.Float)
+    
+    def to_dict(self):
+        # Means use the same keys as TrafficData.to_dict() so charts can consume either
+        count = self.sample_count or 1
+        result = {
+            'timestamp': self.bucket_start.isoformat(),
+            'bucket_seconds': self.bucket_seconds,
+            'intersection_id': self.intersection_id,
+            'direction': self.direction,
+            'sample_count': self.sample_count
+        }
+        for metric in ('vehicle_count', 'average_speed', 'queue_length', 'wait_time'):
+            result[metric] = getattr(self, f'{metric}_sum') / count
+            result[f'{metric}_min'] = getattr(self, f'{metric}_min')
+            result[f'{metric}_max'] = getattr(self, f'{metric}_max')
+        return result
+
+
 class Scenario(db.Model):
     """Pre-configured traffic scenarios for demonstration"""
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,172 @@
+import logging
+import threading
+import numpy as np
+from sqlalchemy import select
+from app import db
+from models import Intersection, TrafficSignal
+from phase_plans import compile_phase_plan
+
+logger = logging.getLogger(__name__)
+
+
+class Approach:
+    """One signalised approach (a traffic signal) of an intersection"""
+    __slots__ = ("index", "signal_id", "intersection_id", "intersection_index", "direction")
+
+    def __init__(self, index, signal_id, intersection_id, intersection_index, direction):
+        self.index = index
+        self.signal_id = signal_id
+        self.intersection_id = intersection_id
+        self.intersection_index = intersection_index
+        self.direction = direction
+
+
+class IntersectionNode:
+    """Static description of an intersection and its approaches"""
+    __slots__ = ("index", "id", "name", "location_lat", "location_lng", "num_roads", "approaches", "phase_plan")
+
+    def __init__(self, index, id, name, location_lat, location_lng, num_roads):
+        self.index = index
+        self.id = id
+        self.name = name
+        self.location_lat = location_lat
+        self.location_lng = location_lng
+        self.num_roads = num_roads
+        self.approaches = ()
+        self.phase_plan = compile_phase_plan(())
+
+    @property
+    def directions(self):
+        return [approach.direction for approach in self.approaches]
+
+
+class NetworkModel:
+    """Immutable snapshot of the road network topology.
+
+    Intersections and approaches get dense integer indices, and the per-approach
+    columns are also exposed as read-only NumPy arrays so array-based code can
+    use the same ordering. Dynamic signal state (colour, cycle time) is not part
+    of the model.
+    """
+
+    def __init__(self, intersection_rows, signal_rows, version=0):
+        self.version = version
+        self.intersections = tuple(
+            IntersectionNode(index, row["id"], row["name"], row["location_lat"],
+                             row["location_lng"], row["num_roads"])
+            for index, row in enumerate(sorted(intersection_rows, key=lambda r: r["id"]))
+        )
+        self.intersection_index = {node.id: node.index for node in self.intersections}
+
+        approaches = []
+        by_intersection = {}
+        for row in sorted(signal_rows, key=lambda r: (r["intersection_id"], r["id"])):
+            intersection_index = self.intersection_index.get(row["intersection_id"])
+            if intersection_index is None:
+                continue
+            approach = Approach(len(approaches), row["id"], row["intersection_id"],
+                                intersection_index, row["direction"])
+            approaches.append(approach)
+            by_intersection.setdefault(intersection_index, []).append(approach)
+        self.approaches = tuple(approaches)
+
+        for index, node_approaches in by_intersection.items():
+            node = self.intersections[index]
+            node.approaches = tuple(node_approaches)
+            node.phase_plan = compile_phase_plan(tuple(a.direction for a in node_approaches))
+
+        self.approach_index = {(a.intersection_id, a.direction): a.index for a in self.approaches}
+        self.signal_index = {a.signal_id: a.index for a in self.approaches}
+
+        self.approach_signal_ids = _readonly(np.array([a.signal_id for a in self.approaches], dtype=np.int64))
+        self.approach_intersection_ids = _readonly(
+            np.array([a.intersection_id for a in self.approaches], dtype=np.int64))
+        self.approach_intersection_index = _readonly(
+            np.array([a.intersection_index for a in self.approaches], dtype=np.int64))
+        self.approach_directions = _readonly(np.array([a.direction for a in self.approaches], dtype=str))
+
+        # Phase tables: approaches of an intersection are contiguous, so an approach's phase
+        # partners are found from the intersection's first approach plus their bit positions
+        self.intersection_first_approach = _readonly(np.array(
+            [node.approaches[0].index if node.approaches else -1 for node in self.intersections], dtype=np.int64))
+        self.approach_position = _readonly(np.array(
+            [a.index - node.approaches[0].index for node in self.intersections for a in node.approaches],
+            dtype=np.int64))
+        self.approach_phase_mask = _readonly(np.array(
+            [node.phase_plan.phase_for(position)
+             for node in self.intersections for position in range(len(node.approaches))], dtype=np.uint32))
+        self.max_approaches = max((len(node.approaches) for node in self.intersections), default=0)
+        self.approach_parent_index = None  # Set on sub-models built by subnetwork()
+
+    def __len__(self):
+        return len(self.intersections)
+
+    def subnetwork(self, intersection_indices):
+        """Build a model of a subset of intersections with the same version.
+
+        Approaches keep their relative order, so the sub-model's approach i
+        maps to this model's approach `approach_parent_index[i]`.
+        """
+        nodes = [self.intersections[i] for i in sorted(int(i) for i in intersection_indices)]
+        intersection_rows = [{
+            "id": node.id, "name": node.name, "location_lat": node.location_lat,
+            "location_lng": node.location_lng, "num_roads": node.num_roads
+        } for node in nodes]
+        signal_rows = [{
+            "id": a.signal_id, "intersection_id": a.intersection_id, "direction": a.direction
+        } for node in nodes for a in node.approaches]
+        model = NetworkModel(intersection_rows, signal_rows, version=self.version)
+        model.approach_parent_index = _readonly(
+            np.array([a.index for node in nodes for a in node.approaches], dtype=np.int64))
+        return model
+
+    def get_intersection(self, intersection_id):
+        """Get an intersection node by database id, or None"""
+        index = self.intersection_index.get(intersection_id)
+        return self.intersections[index] if index is not None else None
+
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+
+# Cached network model, loaded on first use and replaced on invalidation
+_network = None
+_network_version = 0
+_network_lock = threading.Lock()
+
+
+def load_network():
+    """Build a network model from the Intersection and TrafficSignal tables"""
+    intersection_rows = db.session.execute(select(
+        Intersection.id, Intersection.name, Intersection.location_lat,
+        Intersection.location_lng, Intersection.num_roads
+    )).mappings().all()
+    signal_rows = db.session.execute(select(
+        TrafficSignal.id, TrafficSignal.intersection_id, TrafficSignal.direction
+    )).mappings().all()
+    return NetworkModel(intersection_rows, signal_rows, version=_network_version)
+
+
+def get_network():
+    """Get the cached network model, loading it on first use"""
+    global _network
+    network = _network
+    if network is not None:
+        return network
+
+    with _network_lock:
+        if _network is None:
+            _network = load_network()
+            logger.info(f"Loaded network model with {len(_network.intersections)} intersections "
+                        f"and {len(_network.approaches)} approaches")
+        return _network
+
+
+def invalidate_network():
+    """Drop the cached network model after intersections or signals are added, removed or edited"""
+    global _network, _network_version
+    with _network_lock:
+        _network = None
+        _network_version += 1
@@ -0,0 +1,199 @@
+import os
+
+if __name__ == "__main__":
+    # Running as a CLI: initialize the app without starting the background jobs
+    os.environ.setdefault("SCHEDULER_AUTOSTART", "0")
+
+import argparse
+import json
+import logging
+import math
+import time
+import numpy as np
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Grid offsets (row, col) for each approach side; north is the previous row
+DIRECTION_OFFSETS = {"N": (-1, 0), "S": (1, 0), "E": (0, 1), "W": (0, -1)}
+OPPOSITE_DIRECTION = {"N": "S", "S": "N", "E": "W", "W": "E"}
+
+# Default origin: Uhuru Highway & Kenyatta Avenue, Nairobi
+DEFAULT_ORIGIN = (-1.2864, 36.8172)
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+def generate_network(num_intersections, layout="grid", spacing_m=400.0, jitter=0.25,
+                     drop_fraction=0.3, origin=DEFAULT_ORIGIN, seed=None):
+    """Generate a synthetic road network of 3- and 4-way signalised junctions.
+
+    `layout="grid"` builds a regular Manhattan grid of 4-way junctions.
+    `layout="random"` jitters junction positions and removes a random share of
+    the internal road segments (never taking a junction below three legs),
+    which keeps the road graph planar while mixing 3- and 4-way junctions.
+    Junctions on the edge of the network keep an external entry road on every
+    open side. Ids are 1-based and local to the generated network; bulk_load
+    shifts them past the ids already in the database.
+    """
+    if layout not in ("grid", "random"):
+        raise ValueError(f"Unknown layout: {layout}")
+
+    n = int(num_intersections)
+    rng = np.random.default_rng(seed)
+    rows = max(1, int(math.sqrt(n)))
+    cols = math.ceil(n / rows)
+
+    # Every junction starts with four legs: a road to a neighbour or an external entry road
+    legs = [set(DIRECTION_OFFSETS) for _ in range(n)]
+    edges = []
+    for index in range(n):
+        r, c = divmod(index, cols)
+        for direction in ("S", "E"):
+            dr, dc = DIRECTION_OFFSETS[direction]
+            nr, nc = r + dr, c + dc
+            neighbour = nr * cols + nc
+            if nr < rows and nc < cols and neighbour < n:
+                edges.append((index, neighbour, direction))
+
+    if layout == "random" and drop_fraction > 0:
+        kept = []
+        for edge_index in rng.permutation(len(edges)):
+            a, b, direction = edges[edge_index]
+            if (rng.random() < drop_fraction and len(legs[a]) > 3 and len(legs[b]) > 3):
+                legs[a].discard(direction)
+                legs[b].discard(OPPOSITE_DIRECTION[direction])
+            else:
+                kept.append(edges[edge_index])
+        edges = kept
+
+    # Coordinates in meters from the origin, jittered for random layouts
+    grid_rows, grid_cols = np.divmod(np.arange(n), cols)
+    north_m = -grid_rows * spacing_m
+    east_m = grid_cols * spacing_m
+    if layout == "random" and jitter > 0:
+        north_m = north_m + rng.uniform(-jitter, jitter, n) * spacing_m
+        east_m = east_m + rng.uniform(-jitter, jitter, n) * spacing_m
+
+    origin_lat, origin_lng = origin
+    lats = origin_lat + north_m / METERS_PER_DEGREE_LAT
+    lngs = origin_lng + east_m / (METERS_PER_DEGREE_LAT * math.cos(math.radians(origin_lat)))
+
+    now = datetime.now()
+    intersections = []
+    signals = []
+    for index in range(n):
+        r, c = divmod(index, cols)
+        directions = [d for d in ("N", "S", "E", "W") if d in legs[index]]
+        intersections.append({
+            "id": index + 1,
+            "name": f"Synthetic Junction R{r}C{c}",
+            "location_lat": float(lats[index]),
+            "location_lng": float(lngs[index]),
+            "num_roads": len(directions),
+            "created_at": now,
+        })
+        for direction in directions:
+            signals.append({
+                "id": len(signals) + 1,
+                "intersection_id": index + 1,
+                "direction": direction,
+                "current_state": "red",
+                "default_cycle_time": 60,
+                "current_cycle_time": 60,
+                "last_updated": now,
+            })
+
+    links = []
+    for a, b, direction in edges:
+        length = float(math.hypot(north_m[a] - north_m[b], east_m[a] - east_m[b]))
+        # Traffic from a enters b on the side facing a, and vice versa
+        links.append({"id": len(links) + 1, "from_intersection_id": a + 1, "to_intersection_id": b + 1,
+                      "to_direction": OPPOSITE_DIRECTION[direction], "length_m": length})
+        links.append({"id": len(links) + 1, "from_intersection_id": b + 1, "to_intersection_id": a + 1,
+                      "to_direction": direction, "length_m": length})
+
+    return {"intersections": intersections, "signals": signals, "links": links}
+
+
+def to_network_model(generated):
+    """Build an in-memory NetworkModel from a generated network without touching the database"""
+    import app  # noqa: F401  (network depends on the initialized app)
+    from network import NetworkModel
+
+    return NetworkModel(generated["intersections"], generated["signals"])
+
+
+def bulk_load(generated, batch_size=5000):
+    """Insert a generated network after the existing rows using bulk Core inserts"""
+    from sqlalchemy import func, insert, select
+    from app import db
+    from models import Intersection, TrafficSignal, RoadLink
+    from network import invalidate_network
+
+    intersection_offset = db.session.execute(select(func.coalesce(func.max(Intersection.id), 0))).scalar()
+    signal_offset = db.session.execute(select(func.coalesce(func.max(TrafficSignal.id), 0))).scalar()
+    link_offset = db.session.execute(select(func.coalesce(func.max(RoadLink.id), 0))).scalar()
+
+    intersections = [dict(row, id=row["id"] + intersection_offset) for row in generated["intersections"]]
+    signals = [dict(row, id=row["id"] + signal_offset,
+                    intersection_id=row["intersection_id"] + intersection_offset)
+               for row in generated["signals"]]
+    links = [dict(row, id=row["id"] + link_offset,
+                  from_intersection_id=row["from_intersection_id"] + intersection_offset,
+                  to_intersection_id=row["to_intersection_id"] + intersection_offset)
+             for row in generated["links"]]
+
+    try:
+        for model, rows in ((Intersection, intersections), (TrafficSignal, signals), (RoadLink, links)):
+            for start in range(0, len(rows), batch_size):
+                db.session.execute(insert(model), rows[start:start + batch_size])
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error bulk loading generated network: {str(e)}")
+        db.session.rollback()
+        return {"error": str(e)}
+
+    invalidate_network()
+    return {
+        "success": True,
+        "intersections": len(intersections),
+        "signals": len(signals),
+        "links": len(links),
+        "first_intersection_id": intersection_offset + 1
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic city road network")
+    parser.add_argument("--intersections", type=int, default=1000, help="Number of intersections")
+    parser.add_argument("--layout", choices=["grid", "random"], default="random")
+    parser.add_argument("--spacing", type=float, default=400.0, help="Block length in meters")
+    parser.add_argument("--drop-fraction", type=float, default=0.3,
+                        help="Share of internal roads removed in random layouts")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--in-memory", action="store_true",
+                        help="Build the network model only, without writing to the database")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generated = generate_network(args.intersections, layout=args.layout, spacing_m=args.spacing,
+                                 drop_fraction=args.drop_fraction, seed=args.seed)
+    generated_at = time.perf_counter()
+
+    if args.in_memory:
+        network = to_network_model(generated)
+        result = {"success": True, "intersections": len(network.intersections),
+                  "signals": len(network.approaches), "links": len(generated["links"])}
+    else:
+        from app import app
+        with app.app_context():
+            result = bulk_load(generated)
+
+    result["generate_seconds"] = round(generated_at - started, 3)
+    result["total_seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(result, indent=2))
+    return 0 if result.get("success") else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
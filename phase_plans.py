@@ -0,0 +1,83 @@
+from functools import lru_cache
+import numpy as np
+
+# Compass bearing (degrees) of each supported approach direction
+DIRECTION_BEARINGS = {
+    "N": 0, "NE": 45, "E": 90, "SE": 135,
+    "S": 180, "SW": 225, "W": 270, "NW": 315,
+}
+
+# Approach directions used when creating signals for an intersection with this many roads
+DEFAULT_DIRECTIONS = {
+    3: ("N", "S", "E"),
+    4: ("N", "S", "E", "W"),
+    5: ("N", "S", "E", "W", "NE"),
+    6: ("N", "S", "E", "W", "NE", "SW"),
+}
+
+# Phase membership is stored as a bitmask over an intersection's approaches
+MAX_APPROACHES = 32
+
+
+def default_directions(num_roads):
+    """Approach directions for a new intersection with `num_roads` legs"""
+    return DEFAULT_DIRECTIONS.get(num_roads, DEFAULT_DIRECTIONS[4])
+
+
+class PhasePlan:
+    """Conflict matrix and legal phases for one intersection topology.
+
+    Two approaches may run green together only when they come from opposite
+    compass bearings (straight-through movements that do not cross), so N/S
+    and E/W pair up at a four-way junction and NE/SW joins them at a six-way
+    one. Approaches with an unknown direction conflict with everything. Each
+    approach's preferred phase is the largest legal green set containing it;
+    phases are bitmasks over the approaches in the order they were given.
+    """
+
+    __slots__ = ("directions", "conflicts", "phases", "approach_phase")
+
+    def __init__(self, directions):
+        if len(directions) > MAX_APPROACHES:
+            raise ValueError(f"Phase plans support at most {MAX_APPROACHES} approaches, got {len(directions)}")
+        self.directions = directions
+        size = len(directions)
+
+        bearings = [DIRECTION_BEARINGS.get(direction) for direction in directions]
+        conflicts = np.ones((size, size), dtype=bool)
+        for i, a in enumerate(bearings):
+            for j, b in enumerate(bearings):
+                if a is not None and b is not None and (a - b) % 360 == 180:
+                    conflicts[i, j] = False
+        np.fill_diagonal(conflicts, False)
+        conflicts.flags.writeable = False
+        self.conflicts = conflicts
+
+        # Grow each approach's phase greedily with every approach compatible with all members so far
+        phases = []
+        approach_phase = []
+        for i in range(size):
+            members = [i]
+            for j in range(size):
+                if j != i and not conflicts[j, members].any():
+                    members.append(j)
+            mask = sum(1 << j for j in members)
+            if mask not in phases:
+                phases.append(mask)
+            approach_phase.append(phases.index(mask))
+        self.phases = tuple(phases)
+        self.approach_phase = tuple(approach_phase)
+
+    def phase_for(self, position):
+        """Bitmask of the preferred legal green set for the approach at `position`"""
+        return self.phases[self.approach_phase[position]]
+
+    def conflicting(self, position):
+        """Positions of the approaches that must be red while `position` is green"""
+        return [int(j) for j in np.flatnonzero(self.conflicts[position])]
+
+
+@lru_cache(maxsize=None)
+def compile_phase_plan(directions):
+    """Get the phase plan for a tuple of approach directions, compiled once per topology"""
+    return PhasePlan(tuple(directions))
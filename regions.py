@@ -0,0 +1,260 @@
+import atexit
+import json
+import logging
+import math
+import os
+import pickle
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import SpawnContext, SpawnProcess
+from control_core import control_network
+from simulation_engine import SimulationEngine
+
+logger = logging.getLogger(__name__)
+
+# Region pool settings, filled in by init_regions
+_settings = {"workers": 0, "regions": 0, "region_ids": None}
+
+# Environment of spawned workers: they re-import the main module, and with it the app, so run the
+# app in worker mode (see app.py) and point it at an in-memory database instead of the real one
+WORKER_ENVIRONMENT = {"TRAFFIC_WORKER_PROCESS": "1", "SCHEDULER_AUTOSTART": "0", "DATABASE_URL": "sqlite://"}
+_environment_lock = threading.Lock()
+
+# Process pool for the current network version, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_regions(app):
+    """Initialize region-partitioned parallel control and simulation"""
+    if app.config.get("WORKER_PROCESS"):
+        return
+    _settings["workers"] = app.config.get("CONTROL_WORKERS", 0)
+    _settings["regions"] = app.config.get("CONTROL_REGIONS", 0)
+
+    # Optional explicit assignment: a JSON object mapping intersection ids to region ids
+    region_file = app.config.get("CONTROL_REGION_FILE")
+    if region_file:
+        try:
+            with open(region_file) as f:
+                _settings["region_ids"] = {int(k): v for k, v in json.load(f).items()}
+        except Exception as e:
+            logger.error(f"Error loading control regions from {region_file}: {str(e)}")
+
+    if _settings["workers"] > 0:
+        atexit.register(shutdown_region_pool)
+        logger.info(f"Region-parallel control enabled with {_settings['workers']} worker processes")
+
+
+def partition_network(network, n_regions, region_ids=None):
+    """Split the network's intersections into regions.
+
+    With `region_ids` ({intersection_id: region}) intersections are grouped by
+    their explicit region, and unassigned ones form a region of their own.
+    Otherwise the network is cut into `n_regions` spatially compact regions of
+    near-equal size by recursive coordinate bisection on location_lat and
+    location_lng. Returns a list of sorted intersection index arrays.
+    """
+    if region_ids:
+        groups = {}
+        for node in network.intersections:
+            groups.setdefault(region_ids.get(node.id), []).append(node.index)
+        return [np.array(groups[key], dtype=np.int64) for key in sorted(groups, key=str)]
+
+    lat = np.array([node.location_lat for node in network.intersections], dtype=np.float64)
+    lng = np.array([node.location_lng for node in network.intersections], dtype=np.float64)
+    parts = _bisect(np.arange(len(network.intersections)), lat, lng, max(1, int(n_regions)))
+    return [part for part in parts if len(part)]
+
+
+def _bisect(indices, lat, lng, n_regions):
+    """Split across the longer side of the bounding box, keeping sizes proportional to region counts"""
+    if n_regions <= 1 or len(indices) <= 1:
+        return [np.sort(indices)]
+
+    lat_span = np.ptp(lat[indices])
+    lng_span = np.ptp(lng[indices]) * math.cos(math.radians(float(lat[indices].mean())))
+    keys = lat if lat_span >= lng_span else lng
+    ordered = indices[np.argsort(keys[indices], kind="stable")]
+
+    left_regions = n_regions // 2
+    cut = len(ordered) * left_regions // n_regions
+    return (_bisect(ordered[:cut], lat, lng, left_regions)
+            + _bisect(ordered[cut:], lat, lng, n_regions - left_regions))
+
+
+# Worker process state: the region models sent once at start-up and a simulation engine per region
+_worker_regions = None
+_worker_engines = {}
+
+
+def _init_region_worker(payload):
+    """Load the pickled region models in a worker.
+
+    The models reference the network module, which imports the app, which
+    imports the network module back; importing the app first resolves that
+    cycle in the order the server uses. A worker whose main module already
+    loaded the app (python main.py) skips straight to unpickling.
+    """
+    global _worker_regions
+    import app  # noqa: F401
+    _worker_regions = pickle.loads(payload)
+
+
+def _control_region(region_index, state, cycle_time, last_updated, readings, emergency, now,
+                    emergency_priority, intersections):
+    """Run the control rules for one region inside a worker process"""
+    control_state = {"emergency_priority": emergency_priority}
+    changed = control_network(_worker_regions[region_index], state, cycle_time, last_updated, readings,
+                              emergency, now, control_state, intersections=intersections)
+    return changed, state, cycle_time, last_updated, control_state["emergency_priority"]
+
+
+def _tick_region(region_index, is_green, cycle_time, has_emergency, pattern):
+    """Generate one simulation tick for one region inside a worker process"""
+    engine = _worker_engines.get(region_index)
+    if engine is None:
+        region = _worker_regions[region_index]
+        engine = SimulationEngine(region.approach_intersection_ids, region.approach_directions)
+        _worker_engines[region_index] = engine
+    engine.is_green = is_green
+    engine.cycle_time = cycle_time
+    engine.has_emergency = has_emergency
+    return engine.tick(pattern)
+
+
+class RegionPool:
+    """Process pool that runs signal control and simulation ticks region by region.
+
+    Each worker receives every region's sub-model once at start-up; a pass
+    then only ships the region's slices of the approach arrays. Results are
+    merged back into network-wide arrays, so callers still make one commit and
+    one broadcast per pass. The control rules are the same control_network
+    used in-process, and intersections never span regions, so the outcome is
+    identical to an in-process pass.
+    """
+
+    def __init__(self, network, workers, n_regions=None, region_ids=None):
+        self.version = network.version
+        self.broken = False
+        self.parts = partition_network(network, n_regions or workers, region_ids)
+        self.regions = [network.subnetwork(part) for part in self.parts]
+
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=worker_context,
+                                             initializer=_init_region_worker,
+                                             initargs=(pickle.dumps(self.regions),))
+
+    def control(self, state, cycle_time, last_updated, readings, emergency, now, control_state,
+                intersections=None):
+        """Parallel equivalent of control_network over the whole network"""
+        changed = np.zeros(len(state), dtype=bool)
+        futures = []
+        for region_index, (region, part) in enumerate(zip(self.regions, self.parts)):
+            region_intersections = intersections[part] if intersections is not None else None
+            if region_intersections is not None and not region_intersections.any():
+                continue
+            index = region.approach_parent_index
+            futures.append((index, self._executor.submit(
+                _control_region, region_index, state[index], cycle_time[index], last_updated[index],
+                {metric: values[index] for metric, values in readings.items()}, emergency[index], now,
+                control_state["emergency_priority"], region_intersections
+            )))
+
+        for index, region_changed, region_state, region_cycle, region_updated, emergency_priority in \
+                self._results(futures):
+            changed[index] = region_changed
+            state[index] = region_state
+            cycle_time[index] = region_cycle
+            last_updated[index] = region_updated
+            if emergency_priority:
+                control_state["emergency_priority"] = True
+        return changed
+
+    def tick(self, is_green, cycle_time, has_emergency, pattern):
+        """Parallel equivalent of SimulationEngine.tick over the whole network"""
+        futures = []
+        for region_index, region in enumerate(self.regions):
+            index = region.approach_parent_index
+            futures.append((index, self._executor.submit(
+                _tick_region, region_index, is_green[index], cycle_time[index], has_emergency[index], pattern
+            )))
+
+        readings = {}
+        for index, region_readings in self._results(futures):
+            for metric, values in region_readings.items():
+                if metric not in readings:
+                    readings[metric] = np.zeros(len(is_green), dtype=values.dtype)
+                readings[metric][index] = values
+        return readings
+
+    def _results(self, futures):
+        """Collect results in submission order, marking the pool broken if a worker failed"""
+        results = []
+        try:
+            for index, future in futures:
+                result = future.result()
+                results.append((index, *result) if isinstance(result, tuple) else (index, result))
+        except Exception:
+            self.broken = True
+            raise
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_region_pool(network):
+    """Get the region pool for the current network version, or None to run in-process"""
+    global _pool
+    if _settings["workers"] <= 0:
+        return None
+
+    with _pool_lock:
+        if _pool is None or _pool.broken or _pool.version != network.version:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = RegionPool(network, _settings["workers"], _settings["regions"], _settings["region_ids"])
+            logger.info(f"Started region pool with {len(_pool.regions)} regions "
+                        f"on {_settings['workers']} workers")
+        return _pool
+
+
+class WorkerProcess(SpawnProcess):
+    """Spawned worker process started with WORKER_ENVIRONMENT.
+
+    A child inherits the environment at start(), before it re-imports the
+    main module, so the settings are applied to os.environ only while the
+    process starts and restored right after; the server's own environment,
+    and anything it launches later, is left unchanged.
+    """
+
+    def start(self):
+        with _environment_lock:
+            saved = {name: os.environ.get(name) for name in WORKER_ENVIRONMENT}
+            os.environ.update(WORKER_ENVIRONMENT)
+            try:
+                super().start()
+            finally:
+                for name, value in saved.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+
+
+class WorkerContext(SpawnContext):
+    """Spawn context whose processes are WorkerProcess; pass it as a pool's mp_context"""
+    Process = WorkerProcess
+
+
+worker_context = WorkerContext()
+
+
+def shutdown_region_pool():
+    """Stop the worker processes"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,259 @@
+import os
+
+if __name__ == "__main__":
+    # Running as a CLI: initialize the app without starting the background jobs
+    os.environ.setdefault("SCHEDULER_AUTOSTART", "0")
+
+import argparse
+import glob
+import json
+import logging
+import time
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from sqlalchemy import func, select
+from app import db
+from models import TrafficData, PredictionResult, TrafficRollup
+from metrics import timed_job
+from sim_clock import sim_clock
+
+logger = logging.getLogger(__name__)
+
+# Archived columns and their NumPy dtypes, per hot table
+ARCHIVE_TABLES = {
+    "traffic_data": (TrafficData, [
+        ("id", "i8"),
+        ("intersection_id", "i8"),
+        ("timestamp", "M8[ms]"),
+        ("vehicle_count", "i8"),
+        ("average_speed", "f8"),
+        ("queue_length", "i8"),
+        ("wait_time", "f8"),
+        ("direction", "U"),
+    ]),
+    "prediction_result": (PredictionResult, [
+        ("id", "i8"),
+        ("intersection_id", "i8"),
+        ("timestamp", "M8[ms]"),
+        ("prediction_window", "i8"),
+        ("predicted_vehicle_count", "f8"),
+        ("predicted_congestion", "?"),
+        ("confidence", "f8"),
+        ("direction", "U"),
+    ]),
+}
+
+
+def init_retention(app, scheduler):
+    """Schedule the periodic retention job"""
+    if app.config.get("WORKER_PROCESS"):
+        return
+    interval_hours = app.config.get("RETENTION_INTERVAL_HOURS", 24)
+    if not interval_hours:
+        logger.info("Retention job disabled")
+        return
+
+    @timed_job('retention')
+    def run_retention_with_app_context():
+        with app.app_context():
+            run_retention(app.config)
+
+    scheduler.add_job(
+        run_retention_with_app_context,
+        'interval',
+        hours=interval_hours,
+        id='retention',
+        replace_existing=True
+    )
+    logger.info("Scheduled retention job")
+
+
+def _column_array(values, dtype):
+    """Convert a column of Python values to a NumPy array, keeping NULLs representable"""
+    if dtype == "U":
+        return np.array(["" if v is None else v for v in values], dtype=str)
+    if dtype == "?":
+        return np.array([bool(v) for v in values], dtype=bool)
+    if dtype == "M8[ms]":
+        return np.array(values, dtype="datetime64[ms]")
+    if dtype == "i8" and any(v is None for v in values):
+        dtype = "f8"
+    if dtype == "f8":
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return np.array(values, dtype=dtype)
+
+
+def _write_partition(archive_dir, table_name, day, columns, rows):
+    """Write one compressed columnar part file for a day partition"""
+    partition_dir = os.path.join(archive_dir, table_name, f"day={day.isoformat()}")
+    os.makedirs(partition_dir, exist_ok=True)
+
+    arrays = {
+        name: _column_array([row[i] for row in rows], dtype)
+        for i, (name, dtype) in enumerate(columns)
+    }
+    path = os.path.join(partition_dir, f"part-{rows[0][0]:012d}-{rows[-1][0]:012d}.npz")
+
+    # Write to a temporary file first so a crash never leaves a truncated part
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_table(table_name, horizon_days, archive_dir, batch_size=5000, pause=0.05, dry_run=False):
+    """Move rows older than the horizon into day-partitioned archive files.
+
+    Rows are processed in id order in bounded batches. Each batch is written to
+    disk before it is deleted and committed on its own, so no transaction ever
+    covers more than `batch_size` rows.
+    """
+    model, columns = ARCHIVE_TABLES[table_name]
+    # Rows are stamped with simulated time, which may run ahead of the wall clock
+    cutoff_time = sim_clock.now() - timedelta(days=horizon_days)
+    selected = [getattr(model, name) for name, _ in columns]
+
+    archived = 0
+    files = set()
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*selected)
+            .where(model.timestamp < cutoff_time, model.id > last_id)
+            .order_by(model.id)
+            .limit(batch_size)
+        ).all()
+        db.session.commit()  # End the read transaction before writing files
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        if dry_run:
+            archived += len(rows)
+            continue
+
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row[2].date(), []).append(row)
+        for day, day_rows in by_day.items():
+            files.add(_write_partition(archive_dir, table_name, day, columns, day_rows))
+
+        db.session.execute(
+            model.__table__.delete().where(model.id.in_([row[0] for row in rows]))
+        )
+        db.session.commit()
+        archived += len(rows)
+
+        if pause:
+            time.sleep(pause)
+
+    return {"table": table_name, "archived": archived, "files": len(files), "dry_run": dry_run}
+
+
+def prune_rollups(bucket_horizons, batch_size=5000, dry_run=False):
+    """Delete fine-grained rollup buckets older than their horizon in bounded batches"""
+    deleted = {}
+    for bucket_seconds, horizon_days in bucket_horizons.items():
+        if not horizon_days:
+            continue
+        cutoff_time = sim_clock.now() - timedelta(days=horizon_days)
+        expired = (TrafficRollup.bucket_seconds == bucket_seconds, TrafficRollup.bucket_start < cutoff_time)
+        if dry_run:
+            deleted[bucket_seconds] = db.session.execute(
+                select(func.count()).select_from(TrafficRollup).where(*expired)
+            ).scalar()
+            db.session.commit()
+            continue
+        total = 0
+        while True:
+            ids = db.session.execute(
+                select(TrafficRollup.id).where(*expired).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                db.session.commit()
+                break
+            db.session.execute(TrafficRollup.__table__.delete().where(TrafficRollup.id.in_(ids)))
+            db.session.commit()
+            total += len(ids)
+        deleted[bucket_seconds] = total
+    return deleted
+
+
+def run_retention(config, dry_run=False):
+    """Archive and delete expired raw rows and prune old fine-grained rollups"""
+    started = time.perf_counter()
+    archive_dir = config.get("RETENTION_ARCHIVE_DIR", "archive")
+    batch_size = config.get("RETENTION_BATCH_SIZE", 5000)
+    pause = config.get("RETENTION_BATCH_PAUSE", 0.05)
+
+    try:
+        results = [
+            archive_table("traffic_data", config.get("RETENTION_RAW_DAYS", 7), archive_dir,
+                          batch_size=batch_size, pause=pause, dry_run=dry_run),
+            archive_table("prediction_result", config.get("RETENTION_PREDICTION_DAYS", 7), archive_dir,
+                          batch_size=batch_size, pause=pause, dry_run=dry_run),
+        ]
+        rollups = prune_rollups({
+            60: config.get("RETENTION_ROLLUP_MINUTE_DAYS", 30),
+            900: config.get("RETENTION_ROLLUP_QUARTER_HOUR_DAYS", 180),
+        }, batch_size=batch_size, dry_run=dry_run)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Retention finished in {elapsed:.1f}s: {results}, rollups pruned: {rollups}")
+        return {"success": True, "tables": results, "rollups_pruned": rollups, "elapsed": elapsed}
+
+    except Exception as e:
+        logger.error(f"Error running retention: {str(e)}")
+        db.session.rollback()
+        return {"error": str(e)}
+
+
+def load_archive(table_name, start_day, end_day=None, archive_dir="archive"):
+    """Load archived rows for a day range (inclusive) into a DataFrame"""
+    end_day = end_day or start_day
+    frames = []
+    day = start_day
+    while day <= end_day:
+        pattern = os.path.join(archive_dir, table_name, f"day={day.isoformat()}", "part-*.npz")
+        for path in sorted(glob.glob(pattern)):
+            with np.load(path) as part:
+                frames.append(pd.DataFrame({name: part[name] for name in part.files}))
+        day += timedelta(days=1)
+
+    if not frames:
+        return pd.DataFrame(columns=[name for name, _ in ARCHIVE_TABLES[table_name][1]])
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Archive and delete expired traffic data")
+    parser.add_argument("--raw-days", type=float, help="Retention horizon for TrafficData in days")
+    parser.add_argument("--prediction-days", type=float, help="Retention horizon for PredictionResult in days")
+    parser.add_argument("--archive-dir", help="Directory for the day-partitioned archive files")
+    parser.add_argument("--batch-size", type=int, help="Rows archived and deleted per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Count expired rows without changing anything")
+    args = parser.parse_args()
+
+    config = dict(app.config)
+    overrides = {
+        "RETENTION_RAW_DAYS": args.raw_days,
+        "RETENTION_PREDICTION_DAYS": args.prediction_days,
+        "RETENTION_ARCHIVE_DIR": args.archive_dir,
+        "RETENTION_BATCH_SIZE": args.batch_size,
+    }
+    config.update({key: value for key, value in overrides.items() if value is not None})
+
+    with app.app_context():
+        result = run_retention(config, dry_run=args.dry_run)
+    print(json.dumps(result, indent=2, default=str))
+    return 0 if result.get("success") else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,192 @@
+import logging
+from datetime import timedelta
+from sqlalchemy import func, select
+from app import db
+from models import TrafficData, TrafficRollup
+from ingest import add_flush_listener
+from sim_clock import sim_clock
+
+logger = logging.getLogger(__name__)
+
+# Bucket sizes maintained for every intersection and direction (in seconds)
+ROLLUP_BUCKETS = (60, 900, 3600)
+ROLLUP_METRICS = ("vehicle_count", "average_speed", "queue_length", "wait_time")
+
+# A rollup is only used when it still yields at least this many points for the window
+MIN_BUCKETS_PER_WINDOW = 60
+
+
+def init_rollups(app):
+    """Initialize rollup maintenance for TrafficData"""
+    if app.config.get("WORKER_PROCESS"):
+        return
+    with app.app_context():
+        # Backfill once when the rollup table is new but raw history exists
+        if TrafficRollup.query.first() is None and TrafficData.query.first() is not None:
+            rebuild_rollups()
+            logger.info("Backfilled traffic rollups from raw data")
+
+    add_flush_listener(apply_rollups)
+    logger.info("Registered traffic rollup maintenance")
+
+
+def bucket_start(timestamp, bucket_seconds):
+    """Floor a timestamp to the start of its bucket"""
+    midnight = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    seconds = timestamp.hour * 3600 + timestamp.minute * 60 + timestamp.second
+    return midnight + timedelta(seconds=seconds - seconds % bucket_seconds)
+
+
+def aggregate_rows(rows, buckets=ROLLUP_BUCKETS):
+    """Aggregate TrafficData column mappings into rollup rows for each bucket size"""
+    aggregates = {}
+    for row in rows:
+        for bucket_seconds in buckets:
+            key = (bucket_seconds, bucket_start(row["timestamp"], bucket_seconds),
+                   row["intersection_id"], row["direction"])
+            aggregate = aggregates.get(key)
+            if aggregate is None:
+                aggregate = {
+                    "bucket_seconds": key[0],
+                    "bucket_start": key[1],
+                    "intersection_id": key[2],
+                    "direction": key[3],
+                    "sample_count": 0,
+                }
+                for metric in ROLLUP_METRICS:
+                    aggregate[f"{metric}_sum"] = 0.0
+                    aggregate[f"{metric}_min"] = row[metric]
+                    aggregate[f"{metric}_max"] = row[metric]
+                aggregates[key] = aggregate
+
+            aggregate["sample_count"] += 1
+            for metric in ROLLUP_METRICS:
+                value = row[metric]
+                aggregate[f"{metric}_sum"] += value
+                if value < aggregate[f"{metric}_min"]:
+                    aggregate[f"{metric}_min"] = value
+                if value > aggregate[f"{metric}_max"]:
+                    aggregate[f"{metric}_max"] = value
+    return list(aggregates.values())
+
+
+def _upsert_statement():
+    """Build a dialect-specific INSERT ... ON CONFLICT that merges into existing buckets"""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        least, greatest = func.least, func.greatest
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        least, greatest = func.min, func.max
+    else:
+        return None
+
+    table = TrafficRollup.__table__
+    stmt = dialect_insert(table)
+    excluded = stmt.excluded
+    merged = {"sample_count": table.c.sample_count + excluded.sample_count}
+    for metric in ROLLUP_METRICS:
+        merged[f"{metric}_sum"] = table.c[f"{metric}_sum"] + excluded[f"{metric}_sum"]
+        merged[f"{metric}_min"] = least(table.c[f"{metric}_min"], excluded[f"{metric}_min"])
+        merged[f"{metric}_max"] = greatest(table.c[f"{metric}_max"], excluded[f"{metric}_max"])
+
+    return stmt.on_conflict_do_update(
+        index_elements=["bucket_seconds", "intersection_id", "direction", "bucket_start"],
+        set_=merged
+    )
+
+
+def _merge_one(aggregate):
+    """Portable read-modify-write merge for dialects without ON CONFLICT"""
+    existing = TrafficRollup.query.filter_by(
+        bucket_seconds=aggregate["bucket_seconds"],
+        intersection_id=aggregate["intersection_id"],
+        direction=aggregate["direction"],
+        bucket_start=aggregate["bucket_start"]
+    ).first()
+    if existing is None:
+        db.session.add(TrafficRollup(**aggregate))
+        return
+
+    existing.sample_count += aggregate["sample_count"]
+    for metric in ROLLUP_METRICS:
+        setattr(existing, f"{metric}_sum", getattr(existing, f"{metric}_sum") + aggregate[f"{metric}_sum"])
+        setattr(existing, f"{metric}_min", min(getattr(existing, f"{metric}_min"), aggregate[f"{metric}_min"]))
+        setattr(existing, f"{metric}_max", max(getattr(existing, f"{metric}_max"), aggregate[f"{metric}_max"]))
+
+
+def apply_rollups(rows):
+    """Fold a batch of freshly written TrafficData rows into every rollup table"""
+    aggregates = aggregate_rows(rows)
+    if not aggregates:
+        return 0
+
+    stmt = _upsert_statement()
+    if stmt is not None:
+        db.session.execute(stmt, aggregates)
+    else:
+        for aggregate in aggregates:
+            _merge_one(aggregate)
+    db.session.commit()
+    return len(aggregates)
+
+
+def rebuild_rollups(since=None, chunk_size=10000):
+    """Recompute rollups from raw TrafficData, optionally only from `since` onwards"""
+    columns = [TrafficData.id, TrafficData.intersection_id, TrafficData.timestamp, TrafficData.direction] + [
+        getattr(TrafficData, metric) for metric in ROLLUP_METRICS
+    ]
+    query = select(*columns).where(TrafficData.timestamp.isnot(None))
+
+    if since is not None:
+        # Drop buckets that overlap the rebuilt range so they are not double counted
+        TrafficRollup.query.filter(
+            TrafficRollup.bucket_start >= bucket_start(since, max(ROLLUP_BUCKETS))
+        ).delete(synchronize_session=False)
+        query = query.where(TrafficData.timestamp >= bucket_start(since, max(ROLLUP_BUCKETS)))
+    else:
+        TrafficRollup.query.delete(synchronize_session=False)
+    db.session.commit()
+
+    # Page through raw rows by id so each chunk is committed in its own transaction
+    total = 0
+    last_id = 0
+    while True:
+        rows = [dict(row) for row in db.session.execute(
+            query.where(TrafficData.id > last_id).order_by(TrafficData.id).limit(chunk_size)
+        ).mappings()]
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        apply_rollups(rows)
+        total += len(rows)
+    return {"success": True, "rows_processed": total}
+
+
+def choose_rollup_bucket(minutes):
+    """Pick the coarsest rollup that still resolves the window, or None for raw data"""
+    window_seconds = minutes * 60
+    for bucket_seconds in sorted(ROLLUP_BUCKETS, reverse=True):
+        if window_seconds / bucket_seconds >= MIN_BUCKETS_PER_WINDOW:
+            return bucket_seconds
+    return None
+
+
+def get_traffic_rollups(intersection_id=None, minutes=60, bucket_seconds=None):
+    """Get bucketed traffic aggregates for one or all intersections"""
+    if bucket_seconds is None:
+        bucket_seconds = choose_rollup_bucket(minutes) or min(ROLLUP_BUCKETS)
+    if bucket_seconds not in ROLLUP_BUCKETS:
+        return {"error": f"Unsupported bucket size: {bucket_seconds}"}
+
+    cutoff_time = bucket_start(sim_clock.now() - timedelta(minutes=minutes), bucket_seconds)
+    query = TrafficRollup.query.filter(
+        TrafficRollup.bucket_seconds == bucket_seconds,
+        TrafficRollup.bucket_start >= cutoff_time
+    )
+    if intersection_id:
+        query = query.filter(TrafficRollup.intersection_id == intersection_id)
+
+    rollups = query.order_by(TrafficRollup.bucket_start.desc()).all()
+    return [r.to_dict() for r in rollups]
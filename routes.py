@@ -1,15 +1,24 @@
 import json
 import logging
 from datetime import datetime
-from flask import render_template, request, jsonify
+from flask import Response, render_template, request, jsonify, stream_with_context
 from app import app, socketio
 from models import Intersection, TrafficData, TrafficSignal, Scenario, PredictionResult, PerformanceMetric
 from simulation import (
     set_simulation_state, get_simulation_state, add_emergency_vehicle, 
-    get_traffic_data
+    get_traffic_data, TRAFFIC_PATTERNS
 )
-from ml_models import predict_traffic, get_recent_predictions, evaluate_model_accuracy
-from signal_control import get_signal_states, manual_signal_override, update_traffic_signals
+from headless import run_headless
+from network import get_network
+from ml_models import (predict_traffic, predict_network, get_recent_predictions, evaluate_model_accuracy,
+                       get_model_versions, activate_model_version, rollback_models)
+from signal_control import (
+    get_signal_states, manual_signal_override, get_control_status,
+    get_signal_delta, get_signal_snapshot
+)
+from signal_events import signal_states_at, iter_transitions
+from ingest import get_ingest_stats
+from metrics import registry
 from scenarios import (
     start_scenario, end_scenario, clear_scenario, get_scenario_list,
     get_scenario_metrics, get_active_scenario
@@ -80,6 +89,34 @@ def simulation_state():
     else:
         return jsonify(get_simulation_state())
 
+@app.route('/api/simulation/headless', methods=['POST'])
+def headless_simulation():
+    """Run an unthrottled simulation on in-memory state and return its metrics"""
+    data = request.get_json() or {}
+    
+    config = {}
+    scenario_id = data.get('scenario_id')
+    duration = data.get('duration')
+    if scenario_id:
+        scenario = Scenario.query.get(scenario_id)
+        if not scenario:
+            return jsonify({"error": f"Scenario with ID {scenario_id} not found"}), 404
+        config = json.loads(scenario.config) if scenario.config else {}
+        duration = duration or scenario.duration
+    config.update(data.get('config', {}))
+    
+    try:
+        duration = int(duration or 180)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid duration"}), 400
+    if not 1 <= duration <= 7 * 24 * 3600:
+        return jsonify({"error": "Duration must be between 1 second and 7 days"}), 400
+    if config.get('pattern') and config['pattern'] not in TRAFFIC_PATTERNS:
+        return jsonify({"error": f"Unknown pattern: {config['pattern']}"}), 400
+    
+    result = run_headless(get_network(), duration, config=config, seed=data.get('seed'))
+    return jsonify(result)
+
 @app.route('/api/simulation/emergency', methods=['POST'])
 def emergency_vehicle():
     """Add emergency vehicle to simulation"""
@@ -95,12 +132,24 @@ def emergency_vehicle():
 
 @app.route('/api/traffic/data')
 def traffic_data():
-    """Get recent traffic data"""
+    """Get recent traffic data, aggregated into rollup buckets for long windows"""
     intersection_id = request.args.get('intersection_id', type=int)
     minutes = request.args.get('minutes', 5, type=int)
-    data = get_traffic_data(intersection_id=intersection_id, minutes=minutes)
+    resolution = request.args.get('resolution', 'auto')
+    
+    if resolution not in ('auto', 'raw') and not resolution.isdigit():
+        return jsonify({"error": f"Invalid resolution: {resolution}"}), 400
+    
+    data = get_traffic_data(intersection_id=intersection_id, minutes=minutes, resolution=resolution)
+    if isinstance(data, dict) and 'error' in data:
+        return jsonify(data), 400
     return jsonify(data)
 
+@app.route('/api/ingest/stats')
+def ingest_stats():
+    """Get write-behind ingest counters"""
+    return jsonify(get_ingest_stats())
+
 # API Routes for ML Predictions
 @app.route('/api/predictions/traffic')
 def traffic_prediction():
@@ -114,6 +163,13 @@ def traffic_prediction():
     result = predict_traffic(intersection_id, prediction_window=window)
     return jsonify(result)
 
+@app.route('/api/predictions/network')
+def network_prediction():
+    """Get traffic predictions for every intersection in one batch"""
+    window = request.args.get('window', 15, type=int)
+    result = predict_network(prediction_window=window)
+    return jsonify(result)
+
 @app.route('/api/predictions/recent')
 def recent_predictions():
     """Get recent traffic predictions"""
@@ -128,14 +184,76 @@ def prediction_accuracy():
     result = evaluate_model_accuracy()
     return jsonify(result)
 
+@app.route('/api/models')
+def model_versions():
+    """Get the registered model versions and the one being served"""
+    return jsonify(get_model_versions())
+
+@app.route('/api/models/activate', methods=['POST'])
+def activate_model():
+    """Serve a registered model version"""
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    if not version:
+        return jsonify({"error": "Missing version parameter"}), 400
+    
+    result = activate_model_version(version)
+    if 'error' in result:
+        return jsonify(result), 404
+    return jsonify(result)
+
+@app.route('/api/models/rollback', methods=['POST'])
+def rollback_model():
+    """Serve the model version published before the current one"""
+    result = rollback_models()
+    if 'error' in result:
+        return jsonify(result), 409
+    return jsonify(result)
+
+@app.route('/metrics')
+def metrics():
+    """Expose instrumentation in the Prometheus text format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 # API Routes for Signal Control
 @app.route('/api/signals/state')
 def signal_state():
-    """Get current state of traffic signals"""
+    """Get current state of traffic signals.
+    
+    With `since`, returns only the changes after that stream sequence (or a
+    snapshot if they are no longer available) instead of every signal.
+    """
     intersection_id = request.args.get('intersection_id', type=int)
+    since = request.args.get('since', type=int)
+    if since is not None:
+        return jsonify(get_signal_delta(since))
     data = get_signal_states(intersection_id=intersection_id)
     return jsonify(data)
 
+@app.route('/api/signals/history')
+def signal_history():
+    """Rebuild the state of all signals (or one intersection's) at an ISO timestamp from the event log"""
+    at = request.args.get('at', type=datetime.fromisoformat)
+    intersection_id = request.args.get('intersection_id', type=int)
+    if at is None:
+        return jsonify({"error": "Missing or invalid 'at' timestamp"}), 400
+    return jsonify(signal_states_at(at, intersection_id=intersection_id))
+
+@app.route('/api/signals/events')
+def signal_events():
+    """Stream logged signal transitions between two ISO timestamps as newline-delimited JSON"""
+    start = request.args.get('start', type=datetime.fromisoformat)
+    end = request.args.get('end', type=datetime.fromisoformat)
+    intersection_id = request.args.get('intersection_id', type=int)
+    if start is None or end is None:
+        return jsonify({"error": "Missing or invalid 'start'/'end' timestamps"}), 400
+    
+    def generate():
+        for event in iter_transitions(start, end, intersection_id=intersection_id):
+            yield json.dumps(event) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/signals/override', methods=['POST'])
 def override_signal():
     """Manually override a traffic signal"""
@@ -151,11 +269,14 @@ def override_signal():
     result = manual_signal_override(intersection_id, direction, new_state, cycle_time)
     return jsonify(result)
 
-@app.route('/api/signals/update', methods=['POST'])
+@app.route('/api/signals/update', methods=['GET', 'POST'])
 def update_signals():
-    """Trigger an update of traffic signals"""
-    result = update_traffic_signals()
-    return jsonify(result)
+    """Get the status of the server-side signal control loop.
+    
+    Signal control runs on a fixed server schedule; this call never runs a pass
+    itself, so the number of open dashboards does not add database load.
+    """
+    return jsonify(get_control_status())
 
 # API Routes for Scenarios
 @app.route('/api/scenarios/list')
@@ -311,11 +432,17 @@ def handle_data_request(data):
     """Handle client request for data update"""
     intersection_id = data.get('intersection_id')
     traffic_data = get_traffic_data(intersection_id=intersection_id, minutes=5)
-    signal_states = get_signal_states(intersection_id=intersection_id)
+    
+    # Clients that track the signal stream only get the changes since their last sequence
+    signal_sequence = data.get('signal_sequence')
+    if isinstance(signal_sequence, int):
+        signal_delta = get_signal_delta(signal_sequence)
+    else:
+        signal_delta = get_signal_snapshot(intersection_id=intersection_id)
     
     socketio.emit('data_update', {
         'traffic_data': traffic_data,
-        'signal_states': signal_states
+        'signal_delta': signal_delta
     }, room=request.sid)
 
 # Error handlers
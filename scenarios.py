@@ -1,10 +1,14 @@
 import json
 import logging
 import random
-from datetime import datetime, timedelta
 from flask import current_app
 from app import db, socketio
-from models import Scenario, PerformanceMetric, Intersection, TrafficData
+from models import Scenario, PerformanceMetric
+from latest_state import latest_state
+from network import get_network
+from phase_plans import default_directions
+from metrics import PhaseTimer, timed_job
+from sim_clock import sim_clock
 from simulation import set_simulation_state, set_active_scenario, add_emergency_vehicle, clear_active_scenario
 
 logger = logging.getLogger(__name__)
@@ -13,6 +17,7 @@ logger = logging.getLogger(__name__)
 active_scenario_id = None
 scenario_start_time = None
 scenario_metrics = {}
+last_emergency_elapsed = 0
 
 # Predefined scenario configurations for Nairobi, Kenya
 DEFAULT_SCENARIOS = [
@@ -71,19 +76,28 @@ DEFAULT_SCENARIOS = [
 
 def init_scenarios(app, socketio, scheduler):
     """Initialize the traffic scenarios system"""
+    if app.config.get("WORKER_PROCESS"):
+        return
     with app.app_context():
         # Create default scenarios if none exist
         if Scenario.query.count() == 0:
             _create_default_scenarios()
             logger.info("Created default scenarios")
         
-        # Schedule the scenario progress monitoring task
+        # Schedule the scenario progress monitoring task in its own application context,
+        # so it uses its own database session instead of sharing the tick's
+        def monitor_scenario_progress_with_app_context():
+            with app.app_context():
+                monitor_scenario_progress()
+        
         scheduler.add_job(
-            monitor_scenario_progress,
+            monitor_scenario_progress_with_app_context,
             'interval',
             seconds=5,
             id='scenario_monitor',
-            replace_existing=True
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
         )
         logger.info("Scheduled scenario monitoring job")
 
@@ -94,36 +108,43 @@ def _create_default_scenarios():
         db.session.add(scenario)
     db.session.commit()
 
+@timed_job('scenario_monitor')
 def monitor_scenario_progress():
     """Monitor the progress of currently running scenario"""
-    global active_scenario_id, scenario_start_time, scenario_metrics
+    global active_scenario_id, scenario_start_time, scenario_metrics, last_emergency_elapsed
     
     if not active_scenario_id or not scenario_start_time:
         return
     
     try:
         # Get the active scenario
+        phases = PhaseTimer('scenario_monitor')
         scenario = Scenario.query.get(active_scenario_id)
         if not scenario:
             clear_scenario()
             return
         
         # Check if scenario has expired
-        elapsed = (datetime.now() - scenario_start_time).total_seconds()
+        elapsed = (sim_clock.now() - scenario_start_time).total_seconds()
         if elapsed >= scenario.duration:
             # End the scenario
             end_scenario()
             return
         
+        phases.mark('query')
+        
         # Update progress metrics
         _update_scenario_metrics()
+        phases.mark('compute')
         
         # For emergency vehicle scenario, add emergency vehicles periodically
         if active_scenario_id:
             scenario_config = json.loads(scenario.config)
             if scenario_config.get("emergency_vehicles", False):
                 emergency_interval = scenario_config.get("emergency_interval", 60)
-                if int(elapsed) % emergency_interval == 0:
+                # Dispatch on elapsed simulated time so faster speeds cannot skip an interval
+                if elapsed - last_emergency_elapsed >= emergency_interval:
+                    last_emergency_elapsed = elapsed
                     _add_random_emergency_vehicle()
         
         # Emit progress update to clients
@@ -138,6 +159,7 @@ def monitor_scenario_progress():
             'remaining': int(remaining),
             'metrics': scenario_metrics
         })
+        phases.mark('emit')
         
     except Exception as e:
         logger.error(f"Error monitoring scenario progress: {str(e)}")
@@ -147,8 +169,8 @@ def _update_scenario_metrics():
     global scenario_metrics
     
     try:
-        # Get all intersections
-        intersections = Intersection.query.all()
+        # Get all intersections from the cached network model
+        intersections = get_network().intersections
         
         # Calculate metrics across all intersections
         total_wait_time = 0
@@ -156,10 +178,8 @@ def _update_scenario_metrics():
         congested_intersections = 0
         
         for intersection in intersections:
-            # Get latest traffic data
-            latest_data = TrafficData.query.filter_by(intersection_id=intersection.id).order_by(
-                TrafficData.timestamp.desc()
-            ).limit(10).all()
+            # Get the newest reading per direction
+            latest_data = list(latest_state.get_intersection(intersection.id).values())
             
             if not latest_data:
                 continue
@@ -194,17 +214,15 @@ def _update_scenario_metrics():
 
 def _add_random_emergency_vehicle():
     """Add a random emergency vehicle to simulation"""
-    intersections = Intersection.query.all()
+    intersections = get_network().intersections
     if not intersections:
         return
     
     # Choose a random intersection
     intersection = random.choice(intersections)
     
-    # Choose a random direction
-    directions = ["N", "S", "E", "W"]
-    if intersection.num_roads == 3:
-        directions = directions[:3]
+    # Choose a random signalised direction
+    directions = intersection.directions or default_directions(intersection.num_roads)
     
     direction = random.choice(directions)
     
@@ -216,12 +234,12 @@ def _add_random_emergency_vehicle():
         'intersection_id': intersection.id,
         'intersection_name': intersection.name,
         'direction': direction,
-        'timestamp': datetime.now().isoformat()
+        'timestamp': sim_clock.now().isoformat()
     })
 
 def start_scenario(scenario_id):
     """Start running a specific traffic scenario"""
-    global active_scenario_id, scenario_start_time, scenario_metrics
+    global active_scenario_id, scenario_start_time, scenario_metrics, last_emergency_elapsed
     
     try:
         # Validate scenario_id is an integer
@@ -241,8 +259,9 @@ def start_scenario(scenario_id):
         
         # Set the active scenario
         active_scenario_id = scenario_id
-        scenario_start_time = datetime.now()
+        scenario_start_time = sim_clock.now()
         scenario_metrics = {}
+        last_emergency_elapsed = 0
         
         # Parse configuration - with error handling for JSON parsing
         try:
@@ -310,7 +329,7 @@ def end_scenario():
         ).order_by(PerformanceMetric.start_time.desc()).first()
         
         if metric:
-            metric.end_time = datetime.now()
+            metric.end_time = sim_clock.now()
             metric.avg_wait_time = scenario_metrics.get('avg_wait_time', 0)
             metric.throughput = scenario_metrics.get('total_vehicles', 0)
             metric.congestion_duration = 0  # Would need more detailed tracking
@@ -399,7 +418,7 @@ def get_active_scenario():
             clear_scenario()
             return {"active": False}
         
-        elapsed = (datetime.now() - scenario_start_time).total_seconds()
+        elapsed = (sim_clock.now() - scenario_start_time).total_seconds()
         progress_percent = min(100, int((elapsed / scenario.duration) * 100))
         remaining = max(0, scenario.duration - elapsed)
         
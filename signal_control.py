@@ -1,200 +1,214 @@
 import logging
 import random
+import threading
+import time
+import numpy as np
 from datetime import datetime, timedelta
 from flask import current_app
+from flask_socketio import emit
+from sqlalchemy import select, update
 from app import db
-from models import TrafficSignal, TrafficData, Intersection
-from simulation import emergency_vehicles
+from models import TrafficSignal
+from emergency import emergency_registry
+from latest_state import latest_state
+from network import get_network
+from phase_plans import compile_phase_plan
+from control_core import GREEN, RED, SIGNAL_STATES, STATE_CODES, control_network, priority_scores
+from control_tracker import ControlTracker
+from regions import get_region_pool
+from signal_events import SOURCE_OVERRIDE, record_transitions
+from signal_stream import signal_stream
+from metrics import PhaseTimer, job_duration, rows_written, scheduler_events
+from sim_clock import sim_clock
 
 logger = logging.getLogger(__name__)
 
 # Global variables for signal control
-signal_update_counter = 0
-emergency_priority = False
+_control_state = {"emergency_priority": False}
 
-def init_signal_control(app, socketio):
+# Server-owned control loop: one pass at a time, with deadline tracking
+_control_lock = threading.Lock()
+_last_result = None
+control_loop_stats = {
+    "interval": None,
+    "runs": 0,
+    "skipped": 0,
+    "overruns": 0,
+    "missed_deadlines": 0,
+    "last_started_at": None,
+    "last_duration_ms": 0.0,
+    "max_duration_ms": 0.0,
+    "last_lag_ms": 0.0,
+}
+_previous_start = None
+
+# Intersections due for re-evaluation
+control_tracker = ControlTracker()
+
+# Intersection ids per IN query when loading a subset of signals
+SIGNAL_QUERY_CHUNK = 500
+
+def init_signal_control(app, socketio, scheduler):
     """Initialize the traffic signal control system"""
+    if app.config.get("WORKER_PROCESS"):
+        return
     logger.info("Initializing signal control system")
+    interval = app.config.get("SIGNAL_CONTROL_INTERVAL", 5)
+    control_loop_stats["interval"] = interval
+    control_tracker.priority_delta = app.config.get("SIGNAL_CONTROL_PRIORITY_DELTA", 0.05)
+    control_tracker.max_idle = timedelta(seconds=app.config.get("SIGNAL_CONTROL_MAX_IDLE", 60))
     
     @socketio.on('update_signals')
     def handle_update_signals():
-        """Socket event handler for updating signals"""
+        """Socket event handler reporting control loop status without running a pass"""
+        emit('signal_control_status', get_control_status())
+    
+    @socketio.on('request_signal_delta')
+    def handle_signal_delta_request(data=None):
+        """Socket event handler sending the signal changes a client missed since its last sequence"""
+        since = (data or {}).get('since')
+        since = since if isinstance(since, int) else None
+        with app.app_context():
+            emit('signal_sync', get_signal_delta(since))
+    
+    # Push every published batch of signal changes to all clients
+    signal_stream.add_listener(lambda payload: socketio.emit('signals_updated', payload))
+    
+    # Define a job that runs one control pass with the application context
+    def run_control_pass_with_app_context():
         with app.app_context():
-            result = update_traffic_signals()
-            socketio.emit('signals_updated', result)
+            run_control_pass()
+    
+    if interval > 0:
+        # A single job instance is the only writer; late runs are coalesced, not stacked
+        scheduler.add_job(
+            run_control_pass_with_app_context,
+            'interval',
+            seconds=interval,
+            id='signal_control',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+        logger.info(f"Scheduled signal control every {interval} seconds")
+
+def run_control_pass():
+    """Run one control pass and record its timing against the loop's deadlines"""
+    global _last_result, _previous_start
+    if not _control_lock.acquire(blocking=False):
+        control_loop_stats["skipped"] += 1
+        scheduler_events.inc(job="signal_control", outcome="skipped")
+        return {"status": "skipped", "message": "Previous control pass still running"}
+    
+    try:
+        started = time.monotonic()
+        interval = control_loop_stats["interval"] or 0
+        
+        # Lag behind the fixed-rate schedule; a full interval late means a missed deadline
+        if _previous_start is not None and interval > 0:
+            lag = max(0.0, started - _previous_start - interval)
+            control_loop_stats["last_lag_ms"] = round(lag * 1000.0, 3)
+            if lag >= interval:
+                control_loop_stats["missed_deadlines"] += int(lag // interval)
+        _previous_start = started
+        
+        result = update_traffic_signals()
+        
+        duration = time.monotonic() - started
+        job_duration.observe(duration, job="signal_control")
+        control_loop_stats["runs"] += 1
+        control_loop_stats["last_started_at"] = datetime.now().isoformat()
+        control_loop_stats["last_duration_ms"] = round(duration * 1000.0, 3)
+        control_loop_stats["max_duration_ms"] = max(control_loop_stats["max_duration_ms"],
+                                                    control_loop_stats["last_duration_ms"])
+        if interval > 0 and duration > interval:
+            control_loop_stats["overruns"] += 1
+            logger.warning(f"Signal control pass took {duration:.2f}s, longer than its {interval}s interval")
+        
+        _last_result = result
+        return result
+    finally:
+        _control_lock.release()
+
+def get_control_status():
+    """Get control loop timing and a summary of the latest pass without touching the database"""
+    status = dict(control_loop_stats)
+    status["running"] = _control_lock.locked()
+    if _last_result is not None:
+        status["last_result"] = {
+            "status": _last_result.get("status"),
+            "evaluated_count": _last_result.get("evaluated_count", 0),
+            "updated_count": _last_result.get("updated_count", 0),
+            "message": _last_result.get("message")
+        }
+    return status
 
 def update_traffic_signals():
     """Update traffic signals based on current traffic conditions and ML predictions"""
-    global signal_update_counter, emergency_priority
-    signal_update_counter += 1
-    
+    network = dirty = None
     try:
-        # Only run complete logic every 5 seconds to avoid too frequent updates
-        if signal_update_counter % 5 != 0:
-            return {"status": "skipped", "counter": signal_update_counter}
+        # Read the newest readings and emergencies for the whole network as approach arrays
+        phases = PhaseTimer("signal_control")
+        now = sim_clock.now()
+        network = get_network()
+        readings = latest_state.get_arrays(network, max_age=timedelta(minutes=5))
+        emergency = emergency_mask(network, emergency_registry.keys())
+        priority = priority_scores(readings, emergency)
+        
+        # Only intersections whose inputs moved, whose timer came due or that were marked
+        # need evaluating; a stable network costs no database work
+        dirty = control_tracker.collect_dirty(network, priority, emergency, now)
+        evaluated_count = int(dirty.sum())
+        phases.mark("select")
+        if not evaluated_count:
+            return {"status": "success", "evaluated_count": 0, "updated_count": 0, "updated_signals": []}
+        
+        # Decide the dirty intersections in one vectorized pass, split across the
+        # region workers when a pool is configured
+        signal_ids, state, cycle_time, last_updated = load_signal_arrays(network, dirty)
+        phases.mark("query")
+        pool = get_region_pool(network)
+        if pool is not None:
+            changed = pool.control(state, cycle_time, last_updated, readings,
+                                   emergency, now, _control_state, intersections=dirty)
+        else:
+            changed = control_network(network, state, cycle_time, last_updated, readings,
+                                      emergency, now, _control_state, intersections=dirty)
         
-        # Process each intersection
-        intersections = Intersection.query.all()
-        updated_signals = []
+        phases.mark("compute")
         
-        for intersection in intersections:
-            # Check for emergency vehicles at this intersection
-            has_emergency = any(ev['intersection_id'] == intersection.id for ev in emergency_vehicles)
-            
-            # Get current traffic signals for this intersection
-            signals = TrafficSignal.query.filter_by(intersection_id=intersection.id).all()
-            if not signals:
-                continue
-                
-            # Get recent traffic data for this intersection
-            cutoff_time = datetime.now() - timedelta(minutes=5)
-            traffic_data = TrafficData.query.filter(
-                TrafficData.intersection_id == intersection.id,
-                TrafficData.timestamp >= cutoff_time
-            ).order_by(TrafficData.timestamp.desc()).all()
-            
-            if not traffic_data:
-                continue
-            
-            # Group traffic data by direction
-            traffic_by_direction = {}
-            for data in traffic_data:
-                if data.direction not in traffic_by_direction:
-                    traffic_by_direction[data.direction] = []
-                traffic_by_direction[data.direction].append(data)
-            
-            # Calculate traffic metrics for each direction
-            metrics = {}
-            for direction, data_list in traffic_by_direction.items():
-                if not data_list:
-                    continue
-                    
-                # Use most recent data point
-                latest = data_list[0]
-                
-                # Calculate priority score based on multiple factors
-                wait_time_factor = min(1.0, latest.wait_time / 120.0)  # Normalize to max 120 seconds
-                queue_factor = min(1.0, latest.queue_length / 20.0)  # Normalize to max 20 vehicles
-                speed_factor = 1.0 - min(1.0, latest.average_speed / 60.0)  # Slower traffic gets higher priority
-                
-                # Combined priority score (0-1)
-                priority = (0.4 * wait_time_factor + 0.4 * queue_factor + 0.2 * speed_factor)
-                
-                # Check for emergency vehicles in this direction
-                direction_emergency = any(ev['intersection_id'] == intersection.id and 
-                                         ev['direction'] == direction for ev in emergency_vehicles)
-                
-                if direction_emergency:
-                    # Emergency vehicles get highest priority
-                    priority = 1.0
-                    emergency_priority = True
-                
-                metrics[direction] = {
-                    "priority": priority,
-                    "wait_time": latest.wait_time,
-                    "queue_length": latest.queue_length,
-                    "vehicle_count": latest.vehicle_count,
-                    "has_emergency": direction_emergency
-                }
-            
-            # Determine which signals should be green based on priorities
-            if emergency_priority and has_emergency:
-                # Emergency vehicle handling - give green to direction with emergency
-                emergency_directions = [d for d, m in metrics.items() if m.get("has_emergency", False)]
-                
-                if emergency_directions:
-                    # Set emergency direction to green, all others to red
-                    for signal in signals:
-                        if signal.direction in emergency_directions:
-                            new_state = "green"
-                            new_cycle = 30  # Shorter cycle during emergency
-                        else:
-                            new_state = "red"
-                            new_cycle = 30
-                        
-                        if signal.current_state != new_state or signal.current_cycle_time != new_cycle:
-                            signal.current_state = new_state
-                            signal.current_cycle_time = new_cycle
-                            signal.last_updated = datetime.now()
-                            updated_signals.append(signal.to_dict())
-                
-                # Reset emergency priority after handling
-                if not any(ev['intersection_id'] == intersection.id for ev in emergency_vehicles):
-                    emergency_priority = False
-            
-            else:
-                # Normal operation - balance based on traffic conditions
-                # Sort directions by priority
-                sorted_directions = sorted(metrics.keys(), key=lambda d: metrics[d]["priority"], reverse=True)
-                
-                if not sorted_directions:
-                    continue
-                
-                # Get current green directions
-                current_green = [s.direction for s in signals if s.current_state == "green"]
-                
-                # Determine if we need to change signals
-                change_needed = False
-                
-                # Check if highest priority direction is not green
-                if sorted_directions[0] not in current_green:
-                    change_needed = True
-                
-                # Check if current green has been active too long
-                if current_green:
-                    green_signal = next((s for s in signals if s.direction == current_green[0]), None)
-                    if green_signal:
-                        time_since_update = datetime.now() - green_signal.last_updated
-                        if time_since_update.total_seconds() > green_signal.current_cycle_time:
-                            change_needed = True
-                
-                if change_needed or not current_green:
-                    # Determine which directions get green (typically highest priority and possibly
-                    # the opposing direction for four-way intersections)
-                    new_green = [sorted_directions[0]]
-                    
-                    # Add opposing direction if it exists and not a high-traffic situation
-                    if len(sorted_directions) > 1:
-                        # For a 4-way intersection, opposing directions are typically 0-2 and 1-3
-                        # This is a simplification - real systems would have more complex mapping
-                        direction_mapping = {
-                            "N": "S",
-                            "S": "N",
-                            "E": "W",
-                            "W": "E"
-                        }
-                        
-                        opposing = direction_mapping.get(sorted_directions[0])
-                        if opposing in metrics and metrics[sorted_directions[0]]["priority"] < 0.8:
-                            new_green.append(opposing)
-                    
-                    # Set the new signal states
-                    for signal in signals:
-                        if signal.direction in new_green:
-                            new_state = "green"
-                            # Adjust cycle time based on traffic volume
-                            priority = metrics[signal.direction]["priority"]
-                            new_cycle = int(30 + priority * 60)  # 30-90 seconds depending on priority
-                        else:
-                            new_state = "red"
-                            new_cycle = 60  # Default cycle time for red
-                        
-                        # Handle yellow transition if changing from green to red
-                        if signal.current_state == "green" and new_state == "red":
-                            new_state = "yellow"
-                            new_cycle = 5  # Short yellow phase
-                        
-                        if signal.current_state != new_state or signal.current_cycle_time != new_cycle:
-                            signal.current_state = new_state
-                            signal.current_cycle_time = new_cycle
-                            signal.last_updated = datetime.now()
-                            updated_signals.append(signal.to_dict())
+        # Write back only the changed signals in one bulk UPDATE
+        changed_index = np.flatnonzero(changed)
+        updated_signals = [{
+            'id': int(signal_ids[i]),
+            'intersection_id': network.approaches[i].intersection_id,
+            'direction': network.approaches[i].direction,
+            'state': SIGNAL_STATES[state[i]],
+            'cycle_time': int(cycle_time[i]),
+            'last_updated': now.isoformat()
+        } for i in changed_index]
+        if updated_signals:
+            db.session.execute(update(TrafficSignal), [{
+                'id': signal['id'],
+                'current_state': signal['state'],
+                'current_cycle_time': signal['cycle_time'],
+                'last_updated': now
+            } for signal in updated_signals])
+            record_transitions(signal_ids[changed_index], state[changed_index], cycle_time[changed_index], now)
         
         # Commit all changes
         db.session.commit()
+        rows_written.inc(len(updated_signals), table="traffic_signal")
+        rows_written.inc(len(updated_signals), table="signal_event")
+        phases.mark("commit")
+        control_tracker.evaluated(network, dirty, priority, emergency, state == GREEN,
+                                  cycle_time, last_updated, now)
+        signal_stream.publish(updated_signals)
+        phases.mark("emit")
         
         return {
             "status": "success", 
+            "evaluated_count": evaluated_count,
             "updated_count": len(updated_signals),
             "updated_signals": updated_signals
         }
@@ -202,8 +216,55 @@ def update_traffic_signals():
     except Exception as e:
         logger.error(f"Error updating traffic signals: {str(e)}")
         db.session.rollback()
+        if dirty is not None:
+            # Re-evaluate everything this pass took, including timers it popped
+            control_tracker.retry(network, dirty)
         return {"status": "error", "message": str(e)}
 
+def emergency_mask(network, keys):
+    """Boolean approach array marking the (intersection_id, direction) keys with an emergency vehicle"""
+    mask = np.zeros(len(network.approaches), dtype=bool)
+    for key in keys:
+        index = network.approach_index.get(key)
+        if index is not None:
+            mask[index] = True
+    return mask
+
+def load_signal_arrays(network, intersections=None):
+    """Load signal state as approach arrays.
+    
+    Loads every signal with one query, or, given a boolean intersection mask,
+    only the signals of those intersections in chunked IN queries. Returns
+    (signal_ids, state codes, cycle times, last_updated as datetime64).
+    """
+    size = len(network.approaches)
+    state = np.zeros(size, dtype=np.int8)
+    cycle_time = np.full(size, 60, dtype=np.int64)
+    last_updated = np.full(size, np.datetime64('NaT'), dtype='datetime64[us]')
+    
+    query = select(
+        TrafficSignal.id, TrafficSignal.current_state,
+        TrafficSignal.current_cycle_time, TrafficSignal.last_updated
+    )
+    if intersections is None:
+        rows = db.session.execute(query).all()
+    else:
+        intersection_ids = [network.intersections[i].id for i in np.flatnonzero(intersections)]
+        rows = []
+        for start in range(0, len(intersection_ids), SIGNAL_QUERY_CHUNK):
+            rows.extend(db.session.execute(query.where(
+                TrafficSignal.intersection_id.in_(intersection_ids[start:start + SIGNAL_QUERY_CHUNK])
+            )).all())
+    for signal_id, current_state, current_cycle_time, updated in rows:
+        index = network.signal_index.get(signal_id)
+        if index is None:
+            continue
+        state[index] = STATE_CODES.get(current_state, RED)
+        cycle_time[index] = current_cycle_time or 60
+        if updated is not None:
+            last_updated[index] = np.datetime64(updated, 'us')
+    return network.approach_signal_ids, state, cycle_time, last_updated
+
 def get_signal_states(intersection_id=None):
     """Get current state of traffic signals"""
     try:
@@ -218,16 +279,35 @@ def get_signal_states(intersection_id=None):
         logger.error(f"Error getting signal states: {str(e)}")
         return {"error": str(e)}
 
+def get_signal_snapshot(intersection_id=None):
+    """Get every signal's state together with the stream sequence it is current as of"""
+    # Read the sequence first: changes that land during the query are re-sent as deltas,
+    # and applying a change twice is harmless
+    sequence = signal_stream.sequence
+    signals = get_signal_states(intersection_id)
+    if isinstance(signals, dict):
+        return signals
+    return {"snapshot": True, "sequence": sequence, "signals": signals}
+
+def get_signal_delta(since=None):
+    """Get the signal changes after sequence `since`, or a full snapshot if they are no longer available"""
+    delta = signal_stream.since(since)
+    if delta is None:
+        return get_signal_snapshot()
+    return dict(delta, snapshot=False)
+
 def manual_signal_override(intersection_id, direction, new_state, cycle_time=None):
     """Manually override a traffic signal"""
     try:
-        signal = TrafficSignal.query.filter_by(
-            intersection_id=intersection_id,
-            direction=direction
-        ).first()
+        # Load every signal at the intersection in one query, in network model order
+        signals = TrafficSignal.query.filter_by(
+            intersection_id=intersection_id
+        ).order_by(TrafficSignal.id).all()
+        position = next((i for i, s in enumerate(signals) if s.direction == direction), None)
         
-        if not signal:
+        if position is None:
             return {"error": "Signal not found"}
+        signal = signals[position]
         
         # Validate the new state
         if new_state not in ["red", "yellow", "green"]:
@@ -237,30 +317,25 @@ def manual_signal_override(intersection_id, direction, new_state, cycle_time=Non
         signal.current_state = new_state
         if cycle_time:
             signal.current_cycle_time = max(5, min(180, cycle_time))  # Limit to 5-180 seconds
-        signal.last_updated = datetime.now()
+        signal.last_updated = sim_clock.now()
+        changed = [signal]
         
-        # If setting one direction to green, set conflicting directions to red
+        # If setting one direction to green, set the directions that conflict with it
+        # in the intersection's phase plan to red
         if new_state == "green":
-            # Find conflicting signals
-            conflicting = TrafficSignal.query.filter(
-                TrafficSignal.intersection_id == intersection_id,
-                TrafficSignal.direction != direction
-            ).all()
-            
-            # Determine which directions conflict
-            # In a typical 4-way intersection, N/S can be green together, and E/W can be green together
-            non_conflicting = {"N": "S", "S": "N", "E": "W", "W": "E"}
-            
-            for other_signal in conflicting:
-                # Skip non-conflicting directions
-                if non_conflicting.get(direction) == other_signal.direction:
-                    continue
-                    
-                # Set conflicting directions to red
-                other_signal.current_state = "red"
-                other_signal.last_updated = datetime.now()
+            plan = compile_phase_plan(tuple(s.direction for s in signals))
+            for other_position in plan.conflicting(position):
+                other_signal = signals[other_position]
+                if other_signal.current_state != "red":
+                    other_signal.current_state = "red"
+                    other_signal.last_updated = sim_clock.now()
+                    changed.append(other_signal)
         
+        record_transitions([s.id for s in changed], [s.current_state for s in changed],
+                           [s.current_cycle_time for s in changed], sim_clock.now(), SOURCE_OVERRIDE)
         db.session.commit()
+        control_tracker.mark_dirty(intersection_id)
+        signal_stream.publish([s.to_dict() for s in changed])
         
         return {
             "status": "success",
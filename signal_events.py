@@ -0,0 +1,137 @@
+import logging
+import numpy as np
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, insert, or_, select
+from app import db
+from models import SignalEvent
+from control_core import SIGNAL_STATES, STATE_CODES
+from network import get_network
+
+logger = logging.getLogger(__name__)
+
+# Who caused a transition
+SOURCE_CONTROL, SOURCE_OVERRIDE = 0, 1
+EVENT_SOURCES = ("control", "override")
+
+# Timestamps are stored as milliseconds since this epoch (naive, like the simulated clock)
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_ms(timestamp):
+    return (timestamp - EPOCH) // timedelta(milliseconds=1)
+
+
+def from_epoch_ms(timestamp_ms):
+    return EPOCH + timedelta(milliseconds=int(timestamp_ms))
+
+
+def record_transitions(signal_ids, states, cycle_times, timestamp, source=SOURCE_CONTROL):
+    """Append one event per signal to the log in a single batched insert.
+
+    `states` are state codes or names. The insert joins the caller's
+    transaction, so the log only holds transitions that were committed.
+    """
+    if not len(signal_ids):
+        return 0
+    timestamp_ms = to_epoch_ms(timestamp)
+    rows = [{
+        'signal_id': int(signal_id),
+        'state': STATE_CODES.get(state, state) if isinstance(state, str) else int(state),
+        'cycle_time': int(cycle_time),
+        'timestamp_ms': timestamp_ms,
+        'source': source
+    } for signal_id, state, cycle_time in zip(np.asarray(signal_ids).tolist(), np.asarray(states).tolist(),
+                                              np.asarray(cycle_times).tolist())]
+    db.session.execute(insert(SignalEvent), rows)
+    return len(rows)
+
+
+def _signal_filter(intersection_id):
+    """Restrict a query to one intersection's signals using the cached network model"""
+    if intersection_id is None:
+        return None
+    node = get_network().get_intersection(intersection_id)
+    signal_ids = [a.signal_id for a in node.approaches] if node else []
+    return SignalEvent.signal_id.in_(signal_ids)
+
+
+def _event_to_dict(network, signal_id, state, cycle_time, timestamp_ms, source):
+    approach_index = network.signal_index.get(signal_id)
+    approach = network.approaches[approach_index] if approach_index is not None else None
+    return {
+        'id': signal_id,
+        'intersection_id': approach.intersection_id if approach else None,
+        'direction': approach.direction if approach else None,
+        'state': SIGNAL_STATES[state],
+        'cycle_time': cycle_time,
+        'last_updated': from_epoch_ms(timestamp_ms).isoformat(),
+        'source': EVENT_SOURCES[source]
+    }
+
+
+def signal_states_at(timestamp, intersection_id=None):
+    """Rebuild the state of every signal at `timestamp` from the event log.
+
+    Each signal's newest event at or before the timestamp is its state;
+    signals without an event by then are left out. Entries use the keys of
+    TrafficSignal.to_dict plus the source of the last transition.
+    """
+    try:
+        latest = select(
+            SignalEvent.signal_id, SignalEvent.state, SignalEvent.cycle_time,
+            SignalEvent.timestamp_ms, SignalEvent.source,
+            func.row_number().over(
+                partition_by=SignalEvent.signal_id,
+                order_by=(SignalEvent.timestamp_ms.desc(), SignalEvent.id.desc())
+            ).label('rank')
+        ).where(SignalEvent.timestamp_ms <= to_epoch_ms(timestamp))
+        signal_filter = _signal_filter(intersection_id)
+        if signal_filter is not None:
+            latest = latest.where(signal_filter)
+        latest = latest.subquery()
+
+        rows = db.session.execute(
+            select(latest.c.signal_id, latest.c.state, latest.c.cycle_time, latest.c.timestamp_ms, latest.c.source)
+            .where(latest.c.rank == 1)
+            .order_by(latest.c.signal_id)
+        ).all()
+        network = get_network()
+        return [_event_to_dict(network, *row) for row in rows]
+
+    except Exception as e:
+        logger.error(f"Error rebuilding signal states: {str(e)}")
+        return {"error": str(e)}
+
+
+def iter_transitions(start, end, intersection_id=None, batch_size=5000):
+    """Yield the logged transitions with start <= timestamp < end in order, batch by batch.
+
+    Batches are fetched with keyset pagination on (timestamp_ms, id), so a
+    long range streams in constant memory without OFFSET scans.
+    """
+    start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+    signal_filter = _signal_filter(intersection_id)
+    network = get_network()
+    after = None
+
+    while True:
+        query = select(
+            SignalEvent.id, SignalEvent.signal_id, SignalEvent.state, SignalEvent.cycle_time,
+            SignalEvent.timestamp_ms, SignalEvent.source
+        ).where(SignalEvent.timestamp_ms >= start_ms, SignalEvent.timestamp_ms < end_ms)
+        if signal_filter is not None:
+            query = query.where(signal_filter)
+        if after is not None:
+            query = query.where(or_(
+                SignalEvent.timestamp_ms > after[0],
+                and_(SignalEvent.timestamp_ms == after[0], SignalEvent.id > after[1])
+            ))
+        rows = db.session.execute(
+            query.order_by(SignalEvent.timestamp_ms, SignalEvent.id).limit(batch_size)
+        ).all()
+
+        for event_id, *event in rows:
+            yield _event_to_dict(network, *event)
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1].timestamp_ms, rows[-1].id)
@@ -0,0 +1,85 @@
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Changes kept for clients catching up; older gaps are answered with a snapshot
+DEFAULT_HISTORY_SIZE = 20000
+
+
+class SignalStateStream:
+    """Versioned stream of traffic signal changes.
+
+    Every published change gets the next value of a monotonically increasing
+    sequence number and is kept in a bounded history. Clients remember the
+    last sequence they applied and ask for the changes since then; only when
+    that point has fallen out of the history do they need a full snapshot.
+    Listeners receive each published batch as a delta payload.
+    """
+
+    def __init__(self, history_size=DEFAULT_HISTORY_SIZE):
+        self._sequence = 0
+        self._history = deque(maxlen=history_size)
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def publish(self, changes):
+        """Assign sequence numbers to signal dicts, record them and notify listeners"""
+        if not changes:
+            return None
+        with self._lock:
+            from_sequence = self._sequence + 1
+            stamped = []
+            for change in changes:
+                self._sequence += 1
+                change = dict(change, sequence=self._sequence)
+                self._history.append(change)
+                stamped.append(change)
+            payload = {
+                "from_sequence": from_sequence,
+                "sequence": self._sequence,
+                "updated_signals": stamped
+            }
+
+        for callback in self._listeners:
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"Error in signal stream listener: {str(e)}")
+        return payload
+
+    def since(self, sequence):
+        """Get the latest change per signal after `sequence`, or None if a snapshot is needed"""
+        with self._lock:
+            current = self._sequence
+            if sequence is None or sequence > current:
+                return None
+            if sequence == current:
+                return {"from_sequence": current + 1, "sequence": current, "updated_signals": []}
+            oldest = self._history[0]["sequence"] if self._history else current + 1
+            if sequence + 1 < oldest:
+                return None
+            latest = {}
+            for change in reversed(self._history):
+                if change["sequence"] <= sequence:
+                    break
+                latest.setdefault(change["id"], change)
+
+        return {
+            "from_sequence": sequence + 1,
+            "sequence": current,
+            "updated_signals": sorted(latest.values(), key=lambda c: c["sequence"])
+        }
+
+    def add_listener(self, callback):
+        """Register a callable invoked with every published delta payload"""
+        self._listeners.append(callback)
+
+
+# Global stream of live signal changes
+signal_stream = SignalStateStream()
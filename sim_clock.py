@@ -0,0 +1,48 @@
+import threading
+from datetime import datetime, timedelta
+
+
+class SimulationClock:
+    """Stepped clock for simulated time.
+
+    The clock only moves when the simulation advances it, one simulated second
+    per step. In live mode the scheduler advances it by `simulation_speed`
+    steps per wall-clock second; headless runs advance it as fast as the
+    steps can be computed. Pattern selection, reading timestamps, signal cycle
+    timers and emergency expiry all read this clock instead of datetime.now().
+    At start-up the live clock resumes from the newest persisted timestamp, so
+    stored times stay monotonic across restarts.
+    """
+
+    def __init__(self, start=None):
+        self._now = (start or datetime.now()).replace(microsecond=0)
+        self._lock = threading.Lock()
+
+    def now(self):
+        return self._now
+
+    def advance(self, seconds=1):
+        """Move simulated time forward and return the new time"""
+        with self._lock:
+            self._now += timedelta(seconds=seconds)
+            return self._now
+
+    def resume(self, at):
+        """Move the clock forward to `at` if it is behind, so time never runs backwards across restarts"""
+        with self._lock:
+            if at is not None and at > self._now:
+                self._now = at.replace(microsecond=0)
+            return self._now
+
+    def reset(self, start=None):
+        with self._lock:
+            self._now = (start or datetime.now()).replace(microsecond=0)
+
+
+# Global clock for the live simulation
+sim_clock = SimulationClock()
+
+
+def current_time():
+    """Get the current simulated time of the live simulation"""
+    return sim_clock.now()
@@ -1,12 +1,24 @@
 import json
-import random
 import time
 import numpy as np
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
 from flask import current_app
 from app import db, socketio
-from models import Intersection, TrafficData, TrafficSignal
+from sqlalchemy import func, select
+from models import Intersection, SignalEvent, TrafficData, TrafficSignal
+from simulation_engine import SimulationEngine
+from ingest import enqueue_traffic_data
+from latest_state import latest_state
+from network import get_network, invalidate_network
+from phase_plans import default_directions
+from sim_clock import sim_clock
+from emergency import emergency_registry
+from regions import get_region_pool
+from signal_events import from_epoch_ms
+from metrics import CounterFunction, GaugeFunction, PhaseTimer, registry, timed_job
+from tick_supervisor import TickSupervisor
+from rollups import choose_rollup_bucket, get_traffic_rollups
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +26,10 @@ logger = logging.getLogger(__name__)
 active_scenario = None
 simulation_running = False
 simulation_speed = 1.0  # Multiplier for simulation speed
-emergency_vehicles = []
+_engine = None
+_engine_network_version = None
+tick_supervisor = TickSupervisor()
+_pending_emit = None
 
 # Kenya traffic patterns based on Nairobi traffic behavior
 TRAFFIC_PATTERNS = {
@@ -96,6 +111,8 @@ DEFAULT_INTERSECTIONS = [
 
 def init_simulation(app, socketio, scheduler):
     """Initialize the traffic simulation system"""
+    if app.config.get("WORKER_PROCESS"):
+        return
     global simulation_running
     
     with app.app_context():
@@ -109,10 +126,28 @@ def init_simulation(app, socketio, scheduler):
             _create_default_signals()
             logger.info("Created default traffic signals")
         
-        # Define a job that wraps the simulation function with the application context
+        # Simulated time runs ahead of wall time at speeds above 1, so continue from the newest
+        # persisted timestamp rather than datetime.now(); otherwise a restart would stamp new
+        # rows before the ones already stored
+        sim_clock.resume(_latest_persisted_time())
+        
+        # Define a job that wraps the simulation function with the application context.
+        # The supervisor turns wall time since the last run into simulated seconds due
+        # and decides how to run them within the tick budget
+        tick_supervisor.budget = app.config.get("SIMULATION_TICK_BUDGET", 0.8)
+        tick_supervisor.degrade = tuple(app.config.get("SIMULATION_DEGRADE", tick_supervisor.degrade))
+        tick_supervisor.max_backlog = app.config.get("SIMULATION_MAX_BACKLOG", 60)
+        
+        @timed_job('simulation_update')
         def update_simulation_with_app_context():
-            with app.app_context():
-                update_simulation()
+            plan = tick_supervisor.begin(simulation_speed if simulation_running else 0)
+            if plan is None:
+                return
+            try:
+                with app.app_context():
+                    run_tick_plan(plan)
+            finally:
+                tick_supervisor.end(plan)
         
         # Schedule the simulation update task with application context
         scheduler.add_job(
@@ -120,9 +155,30 @@ def init_simulation(app, socketio, scheduler):
             'interval',
             seconds=1,
             id='simulation_update',
-            replace_existing=True
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
         )
         
+        # Export the supervisor's counters
+        for key in ("overlaps", "overruns", "over_budget_runs", "skipped_emits", "dropped_seconds"):
+            registry.register(CounterFunction(
+                f"traffic_simulation_tick_{key}_total", f"Simulation tick supervisor count of {key.replace('_', ' ')}",
+                lambda key=key: tick_supervisor.stats[key]))
+        registry.register(GaugeFunction(
+            "traffic_simulation_backlog_seconds", "Simulated seconds due but not yet run",
+            lambda: tick_supervisor.stats["backlog_seconds"]))
+        
+        # Tell clients when an emergency vehicle's priority expires
+        def emit_emergency_cleared(expired):
+            socketio.emit('emergency_cleared', {
+                'emergency_vehicles': [
+                    {'intersection_id': ev['intersection_id'], 'direction': ev['direction']}
+                    for ev in expired
+                ]
+            })
+        emergency_registry.add_expiry_listener(emit_emergency_cleared)
+        
         # Start the simulation automatically
         simulation_running = True
         logger.info("Simulation started automatically")
@@ -134,16 +190,13 @@ def _create_default_intersections():
         intersection = Intersection(**intersection_data)
         db.session.add(intersection)
     db.session.commit()
+    invalidate_network()
 
 def _create_default_signals():
     """Create default traffic signals for each intersection"""
     intersections = Intersection.query.all()
     for intersection in intersections:
-        directions = ["N", "S", "E", "W"]
-        if intersection.num_roads == 3:
-            directions = directions[:3]  # Use first 3 directions for 3-way intersections
-        
-        for direction in directions:
+        for direction in default_directions(intersection.num_roads):
             signal = TrafficSignal(
                 intersection_id=intersection.id,
                 direction=direction,
@@ -153,110 +206,165 @@ def _create_default_signals():
             )
             db.session.add(signal)
     db.session.commit()
+    invalidate_network()
+
+def select_pattern_key(now, scenario_config=None):
+    """Select the traffic pattern for a (simulated) time, honouring an active scenario"""
+    current_hour = now.hour
+    if 7 <= current_hour < 10:
+        pattern_key = "morning_rush"
+    elif 16 <= current_hour < 19:
+        pattern_key = "evening_rush"
+    elif current_hour >= 22 or current_hour < 5:
+        pattern_key = "night"
+    elif now.weekday() >= 5:  # Weekend
+        pattern_key = "weekend"
+    else:
+        pattern_key = "normal"
+    
+    # Adjust pattern if scenario is active
+    if scenario_config:
+        pattern_key = scenario_config.get('pattern', pattern_key)
+    
+    return pattern_key
+
+def run_tick_plan(plan):
+    """Run the steps of one supervised tick, queueing their rows together when coalescing"""
+    coalesced = []
+    for step in range(plan.steps):
+        rows = update_simulation(emit=False, seconds=plan.step_seconds, enqueue=not plan.coalesce)
+        if plan.coalesce and rows:
+            coalesced.extend(rows)
+    if coalesced:
+        enqueue_traffic_data(coalesced)
+    if plan.emit:
+        update_simulation_emit_last()
+
+def update_simulation_emit_last():
+    """Emit the readings of the most recent step, if any steps ran since the last emit"""
+    global _pending_emit
+    if _pending_emit is None:
+        return
+    rows, all_traffic_data = _pending_emit
+    _pending_emit = None
+    _emit_traffic_data(rows, all_traffic_data)
+
+def _latest_persisted_time():
+    """Newest simulated timestamp stored in traffic data, signal state or the signal event log"""
+    try:
+        newest = [
+            db.session.execute(select(func.max(TrafficData.timestamp))).scalar(),
+            db.session.execute(select(func.max(TrafficSignal.last_updated))).scalar(),
+        ]
+        newest_event_ms = db.session.execute(select(func.max(SignalEvent.timestamp_ms))).scalar()
+        if newest_event_ms is not None:
+            newest.append(from_epoch_ms(newest_event_ms))
+        newest = [timestamp for timestamp in newest if timestamp is not None]
+        return max(newest) if newest else None
+    except Exception as e:
+        logger.error(f"Error reading the latest persisted simulation time: {str(e)}")
+        return None
 
-def update_simulation():
-    """Update the traffic simulation and emit data via WebSocket"""
+def update_simulation(emit=True, seconds=1, enqueue=True):
+    """Advance the simulation by `seconds` simulated seconds in one step and emit data via WebSocket.
+    
+    Returns the generated TrafficData rows; with enqueue=False the caller writes them.
+    """
+    global _pending_emit
     if not simulation_running:
         return
     
     try:
-        # Get current pattern based on time of day
-        current_hour = datetime.now().hour
-        if 7 <= current_hour < 10:
-            pattern_key = "morning_rush"
-        elif 16 <= current_hour < 19:
-            pattern_key = "evening_rush"
-        elif 22 <= current_hour < 5:
-            pattern_key = "night"
-        elif datetime.now().weekday() >= 5:  # Weekend
-            pattern_key = "weekend"
-        else:
-            pattern_key = "normal"
-        
-        # Adjust pattern if scenario is active
-        if active_scenario:
-            pattern_key = active_scenario.get('pattern', pattern_key)
+        phases = PhaseTimer('simulation_update')
+        now = sim_clock.advance(seconds)
+        pattern = TRAFFIC_PATTERNS[select_pattern_key(now, active_scenario)]
         
-        pattern = TRAFFIC_PATTERNS[pattern_key]
+        # Refresh the engine state arrays from the cached network and current signal states
+        network = get_network()
+        engine = _get_engine(network)
+        _load_signal_states(engine)
+        engine.set_emergencies(emergency_registry.keys())
+        phases.mark('query')
         
-        # Process each intersection
-        intersections = Intersection.query.all()
-        all_traffic_data = []
-        
-        for intersection in intersections:
-            traffic_data_batch = []
-            signals = {signal.direction: signal for signal in intersection.traffic_signals}
-            
-            for direction, signal in signals.items():
-                # Generate traffic data based on pattern and signal state
-                is_peak_direction = direction in pattern["peak_directions"]
-                is_green = signal.current_state == "green"
-                
-                # Base vehicle count with directional adjustment
-                base_count = pattern["base_vehicle_count"]
-                if is_peak_direction:
-                    base_count *= 1.5
-                
-                # Add randomness
-                vehicle_count = max(0, int(base_count + random.uniform(-pattern["variation"], pattern["variation"])))
-                
-                # Calculate average speed based on signal state and traffic volume
-                min_speed, max_speed = pattern["avg_speed_range"]
-                if is_green:
-                    avg_speed = random.uniform(min_speed * 1.2, max_speed)
-                else:
-                    avg_speed = random.uniform(min_speed * 0.5, min_speed * 1.2)
-                
-                # Queue length depends on vehicle count and if signal is red
-                queue_multiplier = pattern["queue_multiplier"]
-                if not is_green:
-                    queue_multiplier *= 2
-                queue_length = int(vehicle_count * queue_multiplier)
-                
-                # Wait time calculation
-                base_wait = pattern["wait_time_base"]
-                wait_time = base_wait
-                if not is_green:
-                    wait_time += signal.current_cycle_time / 2  # Average wait time in cycle
-                
-                # Check for emergency vehicles
-                has_emergency = any(ev['intersection_id'] == intersection.id and 
-                                   ev['direction'] == direction for ev in emergency_vehicles)
-                
-                if has_emergency:
-                    # Emergency vehicles increase count slightly but primarily impact signal timing
-                    vehicle_count += 1
-                
-                # Create new traffic data record
-                traffic_data = TrafficData(
-                    intersection_id=intersection.id,
-                    vehicle_count=vehicle_count,
-                    average_speed=avg_speed,
-                    queue_length=queue_length,
-                    wait_time=wait_time,
-                    direction=direction
-                )
-                
-                db.session.add(traffic_data)
-                traffic_data_batch.append(traffic_data.to_dict())
-            
-            # Emit traffic data for this intersection
-            socketio.emit('traffic_update', {
-                'intersection_id': intersection.id,
-                'traffic_data': traffic_data_batch
-            })
-            
-            all_traffic_data.extend(traffic_data_batch)
+        # Generate readings for all approaches in one vectorized tick, split across
+        # the region workers when a pool is configured
+        pool = get_region_pool(network)
+        if pool is not None:
+            readings = pool.tick(engine.is_green, engine.cycle_time, engine.has_emergency, pattern)
+        else:
+            readings = engine.tick(pattern)
+        rows = engine.to_rows(readings, now)
+        phases.mark('compute')
         
-        db.session.commit()
+        # Publish the newest state per approach, then hand rows to the write-behind
+        # writer so the tick never waits on a commit
+        latest_state.update(rows)
+        if enqueue:
+            enqueue_traffic_data(rows)
+        phases.mark('enqueue')
         
-        # Also emit consolidated data for all intersections
-        socketio.emit('all_traffic_data', all_traffic_data)
+        all_traffic_data = [_row_to_dict(row) for row in rows]
+        if emit:
+            _emit_traffic_data(rows, all_traffic_data)
+            phases.mark('emit')
+        else:
+            _pending_emit = (rows, all_traffic_data)
+        return rows
         
     except Exception as e:
         logger.error(f"Error in simulation update: {str(e)}")
         db.session.rollback()
 
+def _emit_traffic_data(rows, all_traffic_data):
+    """Emit traffic data per intersection and for the whole network"""
+    # Rows are ordered by intersection
+    batch_start = 0
+    for i in range(1, len(rows) + 1):
+        if i == len(rows) or rows[i]['intersection_id'] != rows[batch_start]['intersection_id']:
+            socketio.emit('traffic_update', {
+                'intersection_id': rows[batch_start]['intersection_id'],
+                'traffic_data': all_traffic_data[batch_start:i]
+            })
+            batch_start = i
+    
+    # Also emit consolidated data for all intersections
+    socketio.emit('all_traffic_data', all_traffic_data)
+
+def _get_engine(network):
+    """Return the simulation engine, rebuilding it when the network model changes"""
+    global _engine, _engine_network_version
+    if _engine is None or network.version != _engine_network_version:
+        _engine = SimulationEngine(network.approach_intersection_ids, network.approach_directions)
+        _engine_network_version = network.version
+    return _engine
+
+def _load_signal_states(engine):
+    """Load current signal colours and cycle times into the engine's arrays"""
+    network = get_network()
+    states = np.full(engine.size, "red", dtype=object)
+    cycle_times = np.full(engine.size, 60.0)
+    rows = db.session.execute(select(
+        TrafficSignal.id, TrafficSignal.current_state, TrafficSignal.current_cycle_time
+    )).all()
+    for signal_id, state, cycle_time in rows:
+        index = network.signal_index.get(signal_id)
+        if index is not None:
+            states[index] = state
+            cycle_times[index] = cycle_time
+    engine.set_signal_states(states, cycle_times)
+
+def _row_to_dict(row):
+    """Serialize a generated TrafficData row the same way as TrafficData.to_dict()"""
+    return {
+        'id': None,
+        'timestamp': row['timestamp'].isoformat(),
+        'vehicle_count': row['vehicle_count'],
+        'average_speed': row['average_speed'],
+        'queue_length': row['queue_length'],
+        'wait_time': row['wait_time'],
+        'direction': row['direction']
+    }
+
 def set_simulation_state(running=True, speed=1.0):
     """Set the simulation state (running/paused) and speed"""
     global simulation_running, simulation_speed
@@ -266,25 +374,36 @@ def set_simulation_state(running=True, speed=1.0):
 
 def get_simulation_state():
     """Get the current simulation state"""
-    return {"running": simulation_running, "speed": simulation_speed}
+    return {
+        "running": simulation_running,
+        "speed": simulation_speed,
+        "simulated_time": sim_clock.now().isoformat(),
+        "tick": tick_supervisor.get_stats()
+    }
 
 def add_emergency_vehicle(intersection_id, direction):
     """Add an emergency vehicle to the simulation"""
-    global emergency_vehicles
-    emergency_vehicles.append({
-        'intersection_id': intersection_id,
-        'direction': direction,
-        'timestamp': datetime.now()
-    })
-    # Cleanup old emergency vehicles (older than 2 minutes)
-    now = datetime.now()
-    emergency_vehicles = [ev for ev in emergency_vehicles 
-                         if 'timestamp' in ev and now - ev['timestamp'] < timedelta(minutes=2)]
-    return {"emergency_vehicles": len(emergency_vehicles)}
+    emergency_registry.dispatch(intersection_id, direction)
+    return {"emergency_vehicles": len(emergency_registry)}
 
-def get_traffic_data(intersection_id=None, minutes=5):
-    """Get recent traffic data for one or all intersections"""
-    cutoff_time = datetime.now() - timedelta(minutes=minutes)
+def get_traffic_data(intersection_id=None, minutes=5, resolution='auto'):
+    """Get recent traffic data for one or all intersections.
+    
+    Long windows are served from the coarsest rollup that still resolves them;
+    pass resolution='raw' to force raw rows or a bucket size in seconds.
+    """
+    if resolution == 'auto':
+        bucket_seconds = choose_rollup_bucket(minutes)
+    elif resolution == 'raw':
+        bucket_seconds = None
+    else:
+        bucket_seconds = int(resolution)
+    
+    if bucket_seconds:
+        return get_traffic_rollups(intersection_id=intersection_id, minutes=minutes,
+                                   bucket_seconds=bucket_seconds)
+    
+    cutoff_time = sim_clock.now() - timedelta(minutes=minutes)
     
     if intersection_id:
         data = TrafficData.query.filter(
@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class SimulationEngine:
+    """Array-backed traffic generator holding per-approach state in NumPy arrays.
+
+    Each approach is one traffic signal (an intersection/direction pair). A
+    tick broadcasts the active TRAFFIC_PATTERNS entry across every approach and
+    draws all random values in a few vectorized calls, so the cost of a tick
+    grows with array length rather than with Python-level loop iterations.
+    """
+
+    def __init__(self, intersection_ids, directions, seed=None):
+        self.intersection_ids = np.asarray(intersection_ids, dtype=np.int64)
+        self.directions = np.asarray(directions, dtype=str)
+        self.size = len(self.intersection_ids)
+
+        # Mutable per-approach state, refreshed from signal control before each tick
+        self.is_green = np.zeros(self.size, dtype=bool)
+        self.cycle_time = np.full(self.size, 60.0)
+        self.has_emergency = np.zeros(self.size, dtype=bool)
+
+        self.approach_index = {
+            (int(iid), str(direction)): i
+            for i, (iid, direction) in enumerate(zip(self.intersection_ids, self.directions))
+        }
+        self.rng = np.random.default_rng(seed)
+
+    def set_signal_states(self, states, cycle_times):
+        """Load current signal states ('red', 'yellow', 'green') and cycle times"""
+        self.is_green = np.asarray(states, dtype=str) == "green"
+        self.cycle_time = np.asarray(cycle_times, dtype=np.float64)
+
+    def set_emergencies(self, keys):
+        """Flag approaches that currently have an emergency vehicle"""
+        self.has_emergency = np.zeros(self.size, dtype=bool)
+        for key in keys:
+            index = self.approach_index.get(key)
+            if index is not None:
+                self.has_emergency[index] = True
+
+    def tick(self, pattern):
+        """Generate one tick of traffic readings for every approach"""
+        is_green = self.is_green
+        is_peak = np.isin(self.directions, pattern["peak_directions"])
+
+        # Base vehicle count with directional adjustment plus randomness
+        base_count = np.where(is_peak, pattern["base_vehicle_count"] * 1.5, pattern["base_vehicle_count"])
+        variation = pattern["variation"]
+        noise = self.rng.uniform(-variation, variation, self.size)
+        vehicle_count = np.maximum(0, np.trunc(base_count + noise)).astype(np.int64)
+
+        # Average speed depends on signal state
+        min_speed, max_speed = pattern["avg_speed_range"]
+        low = np.where(is_green, min_speed * 1.2, min_speed * 0.5)
+        high = np.where(is_green, max_speed, min_speed * 1.2)
+        average_speed = self.rng.uniform(low, high)
+
+        # Queues build up twice as fast behind a red signal
+        queue_multiplier = np.where(is_green, pattern["queue_multiplier"], pattern["queue_multiplier"] * 2)
+        queue_length = (vehicle_count * queue_multiplier).astype(np.int64)
+
+        # Red approaches wait on average half a cycle on top of the base wait
+        wait_time = np.where(is_green, 0.0, self.cycle_time / 2) + pattern["wait_time_base"]
+
+        # Emergency vehicles add to the count after the queue is computed
+        vehicle_count = vehicle_count + self.has_emergency
+
+        return {
+            "vehicle_count": vehicle_count,
+            "average_speed": average_speed,
+            "queue_length": queue_length,
+            "wait_time": wait_time,
+        }
+
+    def to_rows(self, readings, timestamp):
+        """Convert tick readings into TrafficData column mappings"""
+        return [
+            {
+                "intersection_id": iid,
+                "timestamp": timestamp,
+                "vehicle_count": count,
+                "average_speed": speed,
+                "queue_length": queue,
+                "wait_time": wait,
+                "direction": direction,
+            }
+            for iid, direction, count, speed, queue, wait in zip(
+                self.intersection_ids.tolist(),
+                self.directions.tolist(),
+                readings["vehicle_count"].tolist(),
+                readings["average_speed"].tolist(),
+                readings["queue_length"].tolist(),
+                readings["wait_time"].tolist(),
+            )
+        ]
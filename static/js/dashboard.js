@@ -64,19 +64,16 @@ function loadTrafficData() {
  * Load traffic predictions from API
  */
 function loadPredictions() {
-    // Get unique intersection IDs
-    const intersectionIds = [...new Set(trafficData.map(d => d.intersection_id))];
-    
-    // Fetch predictions for each intersection
-    const promises = intersectionIds.map(id => {
-        return fetch(`/api/predictions/traffic?intersection_id=${id}`)
-            .then(response => response.json());
-    });
-    
-    Promise.all(promises)
-        .then(results => {
+    // Fetch predictions for the whole network in one batch request
+    fetch('/api/predictions/network')
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                console.error('Error loading predictions:', data.error);
+                return;
+            }
             // Process and display predictions
-            displayPredictions(results);
+            displayPredictions(data.intersections);
         })
         .catch(error => {
             console.error('Error loading predictions:', error);
@@ -379,19 +379,16 @@ function togglePredictionVisibility(show) {
     showPredictionsOnMap = show;
     
     if (show) {
-        // Load fresh predictions
-        const intersectionIds = Object.keys(intersectionMarkers);
-        
-        if (intersectionIds.length > 0) {
-            // Fetch predictions for each intersection
-            const promises = intersectionIds.map(id => {
-                return fetch(`/api/predictions/traffic?intersection_id=${id}`)
-                    .then(response => response.json());
-            });
-            
-            Promise.all(promises)
-                .then(results => {
-                    updatePredictionsOnMap(results);
+        // Load fresh predictions for the whole network in one batch request
+        if (Object.keys(intersectionMarkers).length > 0) {
+            fetch('/api/predictions/network')
+                .then(response => response.json())
+                .then(data => {
+                    if (data.error) {
+                        console.error('Error loading predictions:', data.error);
+                        return;
+                    }
+                    updatePredictionsOnMap(data.intersections);
                 })
                 .catch(error => {
                     console.error('Error loading predictions:', error);
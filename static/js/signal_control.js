@@ -1,39 +1,28 @@
 // Global variables
 let intersectionSignals = {};
-let signalUpdateInterval = null;
 
 /**
  * Initialize the traffic signal control
  */
 function initializeSignalControl() {
-    // Set up event listeners
+    // Set up event listeners. Signal control runs on the server on a fixed
+    // schedule and pushes changes over the 'signals_updated' socket event.
     document.addEventListener('signalsUpdated', function(e) {
         updateSignalDisplay(e.detail);
     });
-    
-    // Request signal updates every 5 seconds
-    signalUpdateInterval = setInterval(function() {
-        requestSignalUpdate();
-    }, 5000);
 }
 
 /**
- * Request signal update from server
+ * Get the status of the server-side signal control loop
  */
 function requestSignalUpdate() {
-    fetch('/api/signals/update', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({}),
-    })
+    fetch('/api/signals/update')
     .then(response => response.json())
     .then(data => {
-        console.log('Signal update requested:', data);
+        console.log('Signal control status:', data);
     })
     .catch(error => {
-        console.error('Error requesting signal update:', error);
+        console.error('Error requesting signal control status:', error);
     });
 }
 
@@ -128,7 +117,7 @@ function renderIntersectionSignals(intersectionId, signals) {
     
     // Sort signals by direction
     signals.sort((a, b) => {
-        const dirOrder = { 'N': 0, 'E': 1, 'S': 2, 'W': 3 };
+        const dirOrder = { 'N': 0, 'NE': 1, 'E': 2, 'SE': 3, 'S': 4, 'SW': 5, 'W': 6, 'NW': 7 };
         return (dirOrder[a.direction] || 99) - (dirOrder[b.direction] || 99);
     });
     
@@ -294,7 +283,7 @@ function formatTimestamp(timestamp) {
 
 /**
  * Get human-readable direction name
- * @param {string} dir - Direction code (N, S, E, W)
+ * @param {string} dir - Direction code (N, S, E, W, NE, ...)
  * @returns {string} - Direction name
  */
 function getDirectionName(dir) {
@@ -302,7 +291,11 @@ function getDirectionName(dir) {
         'N': 'North',
         'S': 'South',
         'E': 'East',
-        'W': 'West'
+        'W': 'West',
+        'NE': 'North-East',
+        'SE': 'South-East',
+        'SW': 'South-West',
+        'NW': 'North-West'
     };
     return directions[dir] || dir;
 }
@@ -1,6 +1,9 @@
 // Global socket connection
 let socket;
 
+// Sequence number of the last signal change applied from the server's signal stream
+let lastSignalSequence = null;
+
 /**
  * Initialize Socket.IO connection
  */
@@ -13,8 +16,11 @@ function initializeSocketConnection() {
         console.log('Connected to server');
         updateConnectionStatus(true);
         
-        // Request initial data
-        socket.emit('request_data_update', {});
+        // Request initial data; a reconnecting client only asks for the signal
+        // changes it missed since its last sequence
+        socket.emit('request_data_update', {
+            signal_sequence: lastSignalSequence
+        });
     });
     
     socket.on('disconnect', function() {
@@ -33,9 +39,24 @@ function initializeSocketConnection() {
         updateAllTrafficData(data);
     });
     
-    // Signal updates
+    // Signal updates: deltas carrying sequence numbers
     socket.on('signals_updated', function(data) {
-        updateSignals(data.updated_signals);
+        if (lastSignalSequence !== null && data.from_sequence > lastSignalSequence + 1) {
+            // Missed some changes; ask for everything since the last one applied
+            socket.emit('request_signal_delta', { since: lastSignalSequence });
+            return;
+        }
+        applySignalDelta(data);
+    });
+    
+    socket.on('signal_sync', function(data) {
+        applySignalDelta(data);
+    });
+    
+    socket.on('data_update', function(data) {
+        if (data.signal_delta) {
+            applySignalDelta(data.signal_delta);
+        }
     });
     
     // Emergency vehicle alerts
@@ -80,10 +101,36 @@ function requestDataUpdate(intersectionId = null) {
     if (!socket || !socket.connected) return;
     
     socket.emit('request_data_update', {
-        intersection_id: intersectionId
+        intersection_id: intersectionId,
+        signal_sequence: lastSignalSequence
     });
 }
 
+/**
+ * Apply a signal delta or snapshot from the server's signal stream
+ * @param {Object} data - {sequence, updated_signals} or {snapshot: true, sequence, signals}
+ */
+function applySignalDelta(data) {
+    if (!data || data.error) return;
+    
+    if (data.snapshot) {
+        lastSignalSequence = data.sequence;
+        updateSignals(data.signals || []);
+        return;
+    }
+    
+    // Skip changes that were already applied
+    const changes = (data.updated_signals || []).filter(signal =>
+        lastSignalSequence === null || signal.sequence > lastSignalSequence
+    );
+    if (lastSignalSequence === null || data.sequence > lastSignalSequence) {
+        lastSignalSequence = data.sequence;
+    }
+    if (changes.length > 0) {
+        updateSignals(changes);
+    }
+}
+
 /**
  * Placeholder function to update traffic data for a specific intersection
  * Will be implemented in dashboard.js
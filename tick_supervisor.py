@@ -0,0 +1,130 @@
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Ways to shed work when the simulated seconds due do not fit in the tick budget
+DEGRADE_MODES = ("skip_emit", "coalesce_writes", "lower_resolution")
+
+# How one scheduled run executes: `steps` engine ticks of `step_seconds` simulated seconds each
+TickPlan = namedtuple("TickPlan", ["steps", "step_seconds", "emit", "coalesce", "started"])
+
+
+class TickSupervisor:
+    """Budgets the scheduled simulation tick and catches up on simulated time.
+
+    Simulated seconds are credited from measured wall-clock time between
+    runs, so a late or skipped run leaves its seconds in the backlog instead
+    of losing them; only a backlog beyond `max_backlog` seconds is dropped,
+    and counted. A run takes the supervisor's lock without blocking, so runs
+    never overlap. The cost of one step is measured, and when the seconds due
+    do not fit in `budget` the configured degradation modes apply:
+    `skip_emit` holds back the Socket.IO emit (at most `max_emit_gap` runs in
+    a row), `coalesce_writes` queues all steps' rows as one batch, and
+    `lower_resolution` advances several simulated seconds per engine step so
+    the clock still catches up in full. Without `lower_resolution` the seconds
+    that do not fit are carried over to later runs.
+    """
+
+    def __init__(self, interval=1.0, budget=0.8, degrade=DEGRADE_MODES, max_backlog=60, max_emit_gap=5,
+                 clock=time.monotonic):
+        self.interval = interval
+        self.budget = budget
+        self.degrade = tuple(mode for mode in degrade if mode in DEGRADE_MODES)
+        self.max_backlog = max_backlog
+        self.max_emit_gap = max_emit_gap
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_run = None
+        self._credit = 0.0
+        self._step_cost = None  # Smoothed seconds of wall time per engine step
+        self._runs_without_emit = 0
+        self.stats = {
+            "runs": 0,
+            "overlaps": 0,
+            "overruns": 0,
+            "over_budget_runs": 0,
+            "skipped_emits": 0,
+            "coalesced_runs": 0,
+            "lowered_resolution_runs": 0,
+            "steps": 0,
+            "simulated_seconds": 0,
+            "dropped_seconds": 0,
+            "backlog_seconds": 0.0,
+            "last_duration_ms": 0.0,
+            "max_duration_ms": 0.0,
+            "step_cost_ms": None,
+        }
+
+    def begin(self, speed):
+        """Plan a run for `speed` simulated seconds per wall second, or return None if one is in progress"""
+        if not self._lock.acquire(blocking=False):
+            self.stats["overlaps"] += 1
+            return None
+
+        now = self._clock()
+        elapsed = self.interval if self._last_run is None else now - self._last_run
+        self._last_run = now
+        if speed <= 0:
+            self._credit = 0.0
+            return TickPlan(0, 1, True, False, now)
+
+        self._credit += elapsed * speed
+        due = int(self._credit)
+        if due > self.max_backlog:
+            dropped = due - self.max_backlog
+            self.stats["dropped_seconds"] += dropped
+            self._credit -= dropped
+            due = self.max_backlog
+            logger.warning(f"Simulation fell {dropped}s of simulated time behind its backlog limit; dropping them")
+
+        steps, step_seconds, emit, coalesce = due, 1, True, False
+        affordable = max(1, int(self.budget / self._step_cost)) if self._step_cost else due
+        if due > affordable:
+            self.stats["over_budget_runs"] += 1
+            if "skip_emit" in self.degrade and self._runs_without_emit < self.max_emit_gap:
+                emit = False
+                self.stats["skipped_emits"] += 1
+            if "coalesce_writes" in self.degrade:
+                coalesce = True
+                self.stats["coalesced_runs"] += 1
+            if "lower_resolution" in self.degrade:
+                step_seconds = math.ceil(due / affordable)
+                steps = due // step_seconds
+                self.stats["lowered_resolution_runs"] += 1
+            else:
+                steps = affordable
+
+        self._credit -= steps * step_seconds
+        self._runs_without_emit = 0 if emit else self._runs_without_emit + 1
+        self.stats["backlog_seconds"] = round(self._credit, 3)
+        return TickPlan(steps, step_seconds, emit, coalesce, now)
+
+    def end(self, plan):
+        """Record the run's duration and step cost and release the lock"""
+        try:
+            duration = self._clock() - plan.started
+            if plan.steps:
+                cost = duration / plan.steps
+                self._step_cost = cost if self._step_cost is None else 0.8 * self._step_cost + 0.2 * cost
+                self.stats["step_cost_ms"] = round(self._step_cost * 1000.0, 3)
+            self.stats["runs"] += 1
+            self.stats["steps"] += plan.steps
+            self.stats["simulated_seconds"] += plan.steps * plan.step_seconds
+            self.stats["last_duration_ms"] = round(duration * 1000.0, 3)
+            self.stats["max_duration_ms"] = max(self.stats["max_duration_ms"], self.stats["last_duration_ms"])
+            if duration > self.interval:
+                self.stats["overruns"] += 1
+                logger.warning(f"Simulation tick took {duration:.2f}s, longer than its {self.interval}s interval")
+        finally:
+            self._lock.release()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["running"] = self._lock.locked()
+        stats["budget_ms"] = self.budget * 1000.0
+        stats["degrade"] = list(self.degrade)
+        return stats